@@ -0,0 +1,67 @@
+# End-to-end throughput of the asyncio staged pipeline (pipeline.run_pipeline)
+# against calling receipt.process_receipt for one receipt after another, and
+# the threaded run_batch for reference, on a rendered synthetic corpus with the
+# mock Ollama server standing in for the LLM. Nothing is cached.
+#
+#   python3 benchmarks/async_pipeline.py --receipts 24 --llm-latency 1.0 --token-latency 0.01
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from synthetic_receipts import write_corpus  # noqa: E402
+
+from slipscanner.backends import MockBackend  # noqa: E402
+from slipscanner.batch import output_path_for, run_batch  # noqa: E402
+from slipscanner.items import write_items  # noqa: E402
+from slipscanner.ocr import DEFAULT_PREPROCESS, configure_tesseract  # noqa: E402
+from slipscanner.pipeline import run_pipeline  # noqa: E402
+from slipscanner.receipt import process_receipt  # noqa: E402
+
+
+def sequential(image_paths, output_dir, backend):
+    os.makedirs(output_dir, exist_ok=True)
+    start = time.perf_counter()
+    for image_path in image_paths:
+        write_items(output_path_for(image_path, output_dir), process_receipt(image_path, backend,
+                                                                             preprocess=DEFAULT_PREPROCESS))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the async pipeline against sequential processing.")
+    parser.add_argument("--receipts", type=int, default=24)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="OCR processes.")
+    parser.add_argument("--llm-concurrency", type=int, default=4)
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="Mock LLM seconds per request.")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="Mock LLM seconds per generated token.")
+    parser.add_argument("--tesseract-cmd", help="Path to the tesseract binary.")
+    args = parser.parse_args()
+
+    configure_tesseract(args.tesseract_cmd)
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = write_corpus(os.path.join(tmp, "corpus"), args.receipts, seed=args.seed)
+        image_paths = [image_path for image_path, _, _ in corpus]
+        backend = MockBackend(latency=args.llm_latency, token_latency=args.token_latency,
+                              parallel=args.llm_concurrency, pool_size=args.llm_concurrency)
+        options = {"workers": args.workers, "llm_concurrency": args.llm_concurrency, "backend": backend,
+                   "tesseract_cmd": args.tesseract_cmd, "preprocess": DEFAULT_PREPROCESS}
+        try:
+            baseline = sequential(image_paths, os.path.join(tmp, "sequential"), backend)
+            threaded = run_batch(image_paths, os.path.join(tmp, "batch"), **options)["elapsed"]
+            staged = run_pipeline(image_paths, os.path.join(tmp, "async"), **options)["elapsed"]
+        finally:
+            backend.close()
+
+    print(f"{len(image_paths)} receipts, {args.workers} OCR workers, {args.llm_concurrency} concurrent LLM calls")
+    for label, seconds in (("sequential", baseline), ("run_batch", threaded), ("async pipeline", staged)):
+        print(f"{label:<15} {seconds:7.2f} s  {len(image_paths) / seconds:6.2f} receipts/sec "
+              f"({baseline / seconds:4.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
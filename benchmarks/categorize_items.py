@@ -0,0 +1,80 @@
+# Category classifier throughput and accuracy: trains on labelled synthetic
+# brand + product + size descriptions, then categorizes unseen ones in receipt
+# sized batches (first time and remembered).
+#
+#   python3 benchmarks/categorize_items.py --train 5000 --items 5000
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from product_lookup import BRANDS, SIZES, garble  # noqa: E402
+
+from slipscanner.categories import CategoryClassifier  # noqa: E402
+
+CATEGORIES = {
+    "Dairy": ["Full Cream Milk", "Low Fat Milk", "Cheddar Cheese", "Gouda Cheese", "Butter", "Yoghurt", "Cream"],
+    "Bakery": ["White Bread", "Brown Bread", "Rusks", "Bread Rolls", "Croissants", "Muffins"],
+    "Meat": ["Chicken Breast", "Chicken Teriyaki", "Beef Mince", "Pork Chops", "Boerewors", "Lamb Chops"],
+    "Produce": ["Bananas", "Apples", "Potatoes", "Tomatoes", "Onions", "Carrots", "Mixed Vegetables"],
+    "Pantry": ["White Sugar", "Rice", "Oats", "Macaroni", "Spaghetti", "Maize Meal", "Sunflower Oil", "Baked Beans",
+               "Tomato Sauce", "Peanut Butter", "Apricot Jam"],
+    "Beverages": ["Tea Bags", "Instant Coffee", "Orange Juice", "Cola", "Sparkling Water"],
+    "Household": ["Dish Liquid", "Washing Powder", "Toilet Paper", "Bleach", "Fabric Softener"],
+}
+
+
+def labelled_items(rng, count):
+    items = []
+    for _ in range(count):
+        category = rng.choice(sorted(CATEGORIES))
+        parts = (rng.choice(BRANDS), rng.choice(CATEGORIES[category]), rng.choice(SIZES))
+        items.append((" ".join(part for part in parts if part), category))
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the local category classifier.")
+    parser.add_argument("--train", type=int, default=5000, help="Labelled items to train on.")
+    parser.add_argument("--items", type=int, default=5000, help="Items to categorize.")
+    parser.add_argument("--batch", type=int, default=40, help="Items per predict() call, roughly one receipt.")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    train = labelled_items(rng, args.train)
+    known = {description for description, _ in train}
+    test = [(garble(rng, description), category) for description, category in labelled_items(rng, args.items * 2)
+            if description not in known][:args.items]
+    batches = [test[i:i + args.batch] for i in range(0, len(test), args.batch)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        classifier = CategoryClassifier(os.path.join(tmp, "categories.npz"))
+        start = time.perf_counter()
+        classifier.learn(train)
+        learned = time.perf_counter() - start
+        classifier = CategoryClassifier(classifier.path)
+        classifier.warm_up()
+
+        start = time.perf_counter()
+        predicted = [category for batch in batches for category in classifier.predict([d for d, _ in batch])]
+        first = time.perf_counter() - start
+        start = time.perf_counter()
+        for batch in batches:
+            classifier.predict([d for d, _ in batch])
+        remembered = time.perf_counter() - start
+
+    right = sum(p == category for p, (_, category) in zip(predicted, test))
+    unsure = predicted.count("")
+    print(f"trained on {len(train)} items in {learned * 1000:.0f} ms, categorizing {len(test)} unseen garbled items")
+    print(f"first time: {len(test) / first:9.0f} items/sec    remembered: {len(test) / remembered:9.0f} items/sec")
+    print(f"right {right / len(test):.1%}, wrong {(len(test) - right - unsure) / len(test):.1%}, "
+          f"left empty {unsure / len(test):.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# Deskew round trip: renders synthetic receipt photos rotated by known angles
+# (±1…±5°), runs preprocess_image on them and measures the skew left over with
+# a fine full-resolution projection profile. Every receipt must come back
+# within one SKEW_STEP_DEGREES; exits non-zero otherwise.
+#
+#   python3 benchmarks/deskew_roundtrip.py --receipts 3
+import argparse
+import os
+import random
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from synthetic_receipts import load_font, receipt_items, receipt_rows, render_receipt  # noqa: E402
+
+from slipscanner.ocr import DEFAULT_PREPROCESS  # noqa: E402
+from slipscanner.preprocess import SKEW_STEP_DEGREES, preprocess_image  # noqa: E402
+
+ANGLES = (-5, -4, -3, -2, -1, 1, 2, 3, 4, 5)
+
+
+def residual_skew(binary, limit=2.0, step=0.05):
+    # Angle of the text lines left in a thresholded page, found independently
+    # of estimate_skew: every ink pixel at full resolution, a much finer step.
+    # The outer tenth on each side is left out, it holds the table edge the
+    # crop margin keeps rather than text.
+    pixels = np.asarray(binary)
+    height, width = pixels.shape
+    pixels = pixels[height // 10:height - height // 10, width // 10:width - width // 10]
+    ys, xs = np.nonzero(pixels == 0)
+    angles = np.arange(-limit, limit + step / 2, step)
+    offset = int(np.ceil(pixels.shape[1] * np.tan(np.radians(limit))))
+    scores = [np.dot(profile, profile) for profile in
+              (np.bincount(np.round(ys - xs * np.tan(np.radians(angle))).astype(np.int64) + offset)
+               for angle in angles)]
+    return float(angles[int(np.argmax(scores))])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that preprocess_image undoes known rotations.")
+    parser.add_argument("--receipts", type=int, default=3, help="Receipts rendered per angle.")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--noise", type=float, default=8.0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    fonts = [load_font(size) for size in (18, 22, 26)]
+    failures = 0
+    for angle in ANGLES:
+        residuals = []
+        for _ in range(args.receipts):
+            rows = receipt_rows(rng, receipt_items(rng, 5, 25))
+            photo = render_receipt(rows, rng.choice(fonts), rng, noise=args.noise, skew=angle)
+            residuals.append(residual_skew(preprocess_image(photo, **DEFAULT_PREPROCESS)))
+        worst = max(residuals, key=abs)
+        ok = abs(worst) <= SKEW_STEP_DEGREES
+        failures += not ok
+        print(f"rotated {angle:+d}°  residual {' '.join(f'{r:+.2f}' for r in residuals)}  {'ok' if ok else 'FAIL'}")
+
+    print(f"{len(ANGLES) - failures}/{len(ANGLES)} angles back within {SKEW_STEP_DEGREES}°")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+# End-to-end receipt pipeline benchmark on a synthetic corpus with known line
+# items. Times every stage (image open, OCR, prompt build, LLM via the mock
+# Ollama server, JSON parse, CSV write), and reports p50/p95 per stage,
+# throughput, peak RSS and item-level accuracy. --json writes the results for
+# comparison with --compare on a later version.
+#
+#   python3 benchmarks/end_to_end.py --receipts 30 --json results.json
+#   python3 benchmarks/end_to_end.py --corpus corpus/ --compare results.json
+import argparse
+import difflib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from synthetic_receipts import load_corpus, write_corpus  # noqa: E402
+
+from slipscanner.backends import MockBackend  # noqa: E402
+from slipscanner.items import ItemWriter, items_from_parsed  # noqa: E402
+from slipscanner.llm import complete, generate_prompt, safe_json_parse  # noqa: E402
+from slipscanner.ocr import DEFAULT_PREPROCESS, configure_tesseract, extract_text_from_image  # noqa: E402
+from slipscanner.parsing import item_section  # noqa: E402
+from slipscanner.schema import ITEMS_SCHEMA, max_item_tokens  # noqa: E402
+
+STAGES = ("open", "ocr", "prompt", "llm", "parse", "write", "total")
+DESCRIPTION_MATCH = 0.8  # difflib ratio for a description to count as correct
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[max(0, int(round(len(values) * q)) - 1)]
+
+
+def peak_rss_mb(who):
+    if resource is None:
+        return None
+    rss = resource.getrusage(who).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024  # bytes on macOS, KB on Linux
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def score_items(found, expected):
+    # An item is correct when its price matches and its description is close to
+    # an expected item's that hasn't been matched yet
+    remaining = list(expected)
+    hits = 0
+    for item in found:
+        for truth in remaining:
+            if abs(float(truth["price"]) - item.price) < 0.005 and difflib.SequenceMatcher(
+                    None, truth["description"].lower(), item.description.lower()).ratio() >= DESCRIPTION_MATCH:
+                remaining.remove(truth)
+                hits += 1
+                break
+    return hits
+
+
+def run_receipt(image_path, truth_text, backend, output_dir, preprocess, use_ocr):
+    timings = {}
+    start = time.perf_counter()
+    with Image.open(image_path) as img:
+        img.load()
+    timings["open"] = time.perf_counter() - start
+
+    stage_start = time.perf_counter()
+    text = extract_text_from_image(image_path, preprocess=preprocess) if use_ocr else truth_text
+    timings["ocr"] = time.perf_counter() - stage_start
+
+    stage_start = time.perf_counter()
+    section = item_section(text)
+    prompt = generate_prompt(section)
+    timings["prompt"] = time.perf_counter() - stage_start
+
+    stage_start = time.perf_counter()
+    response = complete(prompt, backend, options={"num_predict": max_item_tokens(section)}, format=ITEMS_SCHEMA)
+    timings["llm"] = time.perf_counter() - stage_start
+
+    stage_start = time.perf_counter()
+    try:
+        items = items_from_parsed(safe_json_parse(response))
+    except ValueError:
+        items = []
+    timings["parse"] = time.perf_counter() - stage_start
+
+    stage_start = time.perf_counter()
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    with ItemWriter(os.path.join(output_dir, stem + ".csv")) as writer:
+        writer.write_all(items)
+    timings["write"] = time.perf_counter() - stage_start
+
+    timings["total"] = time.perf_counter() - start
+    return timings, items
+
+
+def run(corpus, backend, preprocess, use_ocr):
+    durations = {stage: [] for stage in STAGES}
+    found_total = expected_total = hits_total = exact = 0
+    with tempfile.TemporaryDirectory() as output_dir:
+        start = time.perf_counter()
+        for image_path, expected, truth_text in corpus:
+            timings, items = run_receipt(image_path, truth_text, backend, output_dir, preprocess, use_ocr)
+            for stage, seconds in timings.items():
+                durations[stage].append(seconds)
+            hits = score_items(items, expected)
+            found_total += len(items)
+            expected_total += len(expected)
+            hits_total += hits
+            exact += hits == len(expected) == len(items)
+        elapsed = time.perf_counter() - start
+
+    precision = hits_total / found_total if found_total else 0.0
+    recall = hits_total / expected_total if expected_total else 0.0
+    return {
+        "stages": {stage: {"p50_ms": statistics.median(values) * 1000,
+                           "p95_ms": percentile(values, 0.95) * 1000,
+                           "mean_ms": statistics.mean(values) * 1000}
+                   for stage, values in durations.items()},
+        "receipts": len(corpus),
+        "elapsed_s": elapsed,
+        "receipts_per_sec": len(corpus) / elapsed if elapsed else 0.0,
+        "peak_rss_mb": {"self": peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+                        "children": peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None},
+        "accuracy": {"items_expected": expected_total, "items_found": found_total, "items_correct": hits_total,
+                     "precision": precision, "recall": recall,
+                     "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+                     "exact_receipts": exact / len(corpus)},
+    }
+
+
+def compare(results, baseline, tolerance):
+    # Prints the change against an earlier run, returns True if anything got
+    # slower (or less accurate) by more than tolerance
+    regressed = False
+    print(f"\nCompared with {baseline.get('revision') or 'baseline'}:")
+    for stage in STAGES:
+        for metric in ("p50_ms", "p95_ms"):
+            old = baseline["stages"].get(stage, {}).get(metric)
+            new = results["stages"][stage][metric]
+            if not old:
+                continue
+            change = (new - old) / old
+            flag = "  REGRESSION" if change > tolerance and new - old > 1.0 else ""
+            regressed |= bool(flag)
+            print(f"  {stage:<7} {metric:<7} {old:9.1f} -> {new:9.1f} ms  {change:+7.1%}{flag}")
+
+    old, new = baseline["receipts_per_sec"], results["receipts_per_sec"]
+    flag = "  REGRESSION" if new < old * (1 - tolerance) else ""
+    regressed |= bool(flag)
+    print(f"  throughput      {old:9.2f} -> {new:9.2f} receipts/sec{flag}")
+
+    old, new = baseline["accuracy"]["f1"], results["accuracy"]["f1"]
+    flag = "  REGRESSION" if new < old - 0.01 else ""
+    regressed |= bool(flag)
+    print(f"  accuracy F1     {old:9.3f} -> {new:9.3f}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the full receipt pipeline on synthetic receipts.")
+    parser.add_argument("--corpus", help="Folder written by synthetic_receipts.py (default: generate a fresh one).")
+    parser.add_argument("--receipts", type=int, default=20, help="Receipts to generate when --corpus isn't given.")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--noise", type=float, default=8.0)
+    parser.add_argument("--max-skew", type=float, default=3.0)
+    parser.add_argument("--no-ocr", action="store_true",
+                        help="Use the text each receipt was rendered from instead of running tesseract.")
+    parser.add_argument("--no-preprocess", action="store_true", help="OCR the raw image.")
+    parser.add_argument("--tesseract-cmd", help="Path to the tesseract binary.")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Mock LLM seconds before the first token.")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="Mock LLM seconds per token.")
+    parser.add_argument("--json", help="Write the results to this file.")
+    parser.add_argument("--compare", help="Results file from an earlier run to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Slowdown that counts as a regression.")
+    args = parser.parse_args()
+
+    configure_tesseract(args.tesseract_cmd)
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        if args.corpus:
+            corpus = load_corpus(args.corpus)
+        else:
+            corpus = write_corpus(corpus_dir, args.receipts, seed=args.seed, noise=args.noise,
+                                  max_skew=args.max_skew)
+        if not corpus:
+            parser.error(f"No receipts with ground truth found in {args.corpus}")
+        if args.no_ocr and any(text is None for _, _, text in corpus):
+            parser.error("--no-ocr needs the .txt files synthetic_receipts.py writes")
+
+        backend = MockBackend(latency=args.llm_latency, token_latency=args.token_latency)
+        try:
+            results = run(corpus, backend, None if args.no_preprocess else DEFAULT_PREPROCESS, not args.no_ocr)
+        finally:
+            backend.close()
+
+    results.update({
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"corpus": args.corpus, "seed": args.seed, "noise": args.noise, "max_skew": args.max_skew,
+                   "ocr": not args.no_ocr, "preprocess": not args.no_preprocess,
+                   "llm_latency": args.llm_latency, "token_latency": args.token_latency},
+    })
+
+    print(f"{results['receipts']} receipts in {results['elapsed_s']:.1f}s "
+          f"({results['receipts_per_sec']:.2f} receipts/sec)")
+    print(f"{'stage':<7} {'p50':>10} {'p95':>10}")
+    for stage, stats in results["stages"].items():
+        print(f"{stage:<7} {stats['p50_ms']:>7.1f} ms {stats['p95_ms']:>7.1f} ms")
+    rss = results["peak_rss_mb"]
+    if rss["self"] is not None:
+        print(f"peak RSS {rss['self']:.0f} MB (tesseract {rss['children']:.0f} MB)")
+    accuracy = results["accuracy"]
+    print(f"items {accuracy['items_correct']}/{accuracy['items_expected']} correct, "
+          f"precision {accuracy['precision']:.1%}, recall {accuracy['recall']:.1%}, "
+          f"exact receipts {accuracy['exact_receipts']:.1%}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+# Throughput of LLM-only parsing versus the hybrid engine (regex first, LLM
+# only for low-confidence receipts) on synthetic OCR text, with the LLM
+# replaced by a stub that sleeps for a fixed latency.
+#
+#   python3 benchmarks/hybrid_engine.py --receipts 200 --llm-latency 2.0 --noisy 0.3
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from slipscanner.hybrid import parse_hybrid  # noqa: E402
+from slipscanner.items import LineItem  # noqa: E402
+from slipscanner.parsing import item_section  # noqa: E402
+
+PRODUCTS = ["Chicken Teriyaki", "Milk 2L", "White Bread", "Bananas", "Cheddar 400g", "Coffee Beans",
+            "Rice 2kg", "Eggs 6pk", "Apples", "Yoghurt", "Orange Juice", "Pasta", "Tomatoes", "Butter"]
+
+
+def synthetic_receipt(rng, noisy):
+    items = [(rng.choice(PRODUCTS), round(rng.uniform(5, 120), 2)) for _ in range(rng.randint(3, 25))]
+    lines = ["SUPERSTORE", "12 Main Road", "Tel 021 555 0100", ""]
+    for description, price in items:
+        if noisy and rng.random() < 0.3:
+            # Shapes the regex can't read: comma decimals and wrapped descriptions
+            lines.extend([description, f"1 @ {price:.2f}".replace(".", ",")])
+        else:
+            lines.append(f"{description} {price:.2f}")
+    lines.extend(["", f"TOTAL {sum(p for _, p in items):.2f}", "CARD", "Thank you"])
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare LLM-only and hybrid receipt parsing throughput.")
+    parser.add_argument("--receipts", type=int, default=100)
+    parser.add_argument("--noisy", type=float, default=0.3, help="Fraction of receipts the regex can't fully read.")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="Seconds per stub LLM call.")
+    parser.add_argument("--concurrency", type=int, default=2, help="Concurrent LLM calls.")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    receipts = [synthetic_receipt(rng, rng.random() < args.noisy) for _ in range(args.receipts)]
+
+    def stub_llm(text):
+        time.sleep(args.llm_latency)
+        return [LineItem("stub", 0.0)]
+
+    engines = {
+        "llm": lambda text: (stub_llm(item_section(text)), True),
+        "hybrid": lambda text: parse_hybrid(text, stub_llm),
+        "hybrid (unmatched lines)": lambda text: parse_hybrid(text, stub_llm, unmatched_only=True),
+    }
+
+    print(f"{args.receipts} receipts, {args.noisy:.0%} noisy, {args.llm_latency}s stub LLM, "
+          f"{args.concurrency} concurrent calls")
+    baseline = None
+    for name, engine in engines.items():
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(engine, receipts))
+        elapsed = time.perf_counter() - start
+        skipped = sum(1 for _, used_llm in results if not used_llm)
+        throughput = len(receipts) / elapsed
+        baseline = baseline or throughput
+        print(f"{name:<26} {throughput:8.2f} receipts/sec  skipped LLM {skipped / len(receipts):6.1%}  "
+              f"speedup {throughput / baseline:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
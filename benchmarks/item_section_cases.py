@@ -0,0 +1,38 @@
+# Receipts whose item section is easy to get wrong, with the lines
+# parsing.item_section must keep. Exits non-zero if any case fails.
+#
+#   python3 benchmarks/item_section_cases.py
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from slipscanner.parsing import item_section  # noqa: E402
+
+CASES = [
+    # Item lines that start like payment lines, before and between other items
+    ("SHOP\nBread 12.00\nCash Back Voucher 10.00\nTOTAL 22.00\nCARD 22.00",
+     "SHOP\nBread 12.00\nCash Back Voucher 10.00"),
+    ("SHOP\nTel 021 555 0100\nCard - Birthday 25.00\nBread 15.00\nTOTAL 40.00\nCASH 50.00\nCHANGE 10.00",
+     "Card - Birthday 25.00\nBread 15.00"),
+    # No total line: the payment lines after the last item end the section
+    ("SHOP\nBread 15.00\nCash Back Voucher 10.00\nMilk 23.50\nCASH 50.00\nCHANGE 1.50",
+     "SHOP\nBread 15.00\nCash Back Voucher 10.00\nMilk 23.50"),
+    ("SHOP\nBread 15.00\nMilk 23.50\nSUBTOTAL 38.50\nVAT 5.02\nTOTAL 38.50",
+     "SHOP\nBread 15.00\nMilk 23.50"),
+]
+
+
+def main():
+    failures = 0
+    for text, expected in CASES:
+        section = item_section(text)
+        if section != expected:
+            failures += 1
+            print(f"FAIL {text!r}\n  expected {expected!r}\n  got      {section!r}")
+    print(f"{len(CASES) - failures}/{len(CASES)} item sections as expected")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
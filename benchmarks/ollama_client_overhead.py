@@ -0,0 +1,65 @@
+# Per-call HTTP overhead of a bare requests.post (new connection every call)
+# versus the pooled keep-alive OllamaClient, against an instant mock Ollama server.
+#
+#   python3 benchmarks/ollama_client_overhead.py --calls 500
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from slipscanner.mock_ollama import MockOllamaServer  # noqa: E402
+from slipscanner.ollama import OllamaClient  # noqa: E402
+
+PROMPT = "Text:\nMILK 2L 23.50\nBREAD 15.00\n\nOutput:\n"
+
+
+def time_calls(call, calls):
+    durations = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        call()
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+def report(name, durations):
+    durations = sorted(durations)
+    p95 = durations[int(len(durations) * 0.95) - 1]
+    print(f"{name:<28} mean {statistics.mean(durations):6.3f} ms  p50 {statistics.median(durations):6.3f} ms  "
+          f"p95 {p95:6.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-call Ollama HTTP overhead with and without pooling.")
+    parser.add_argument("--calls", type=int, default=300)
+    args = parser.parse_args()
+
+    server = MockOllamaServer().start()
+    host = server.url
+    payload = {"model": "mistral", "prompt": PROMPT, "stream": False}
+
+    def bare_post():
+        response = requests.post(host + "/api/generate", json=payload, timeout=60)
+        response.raise_for_status()
+        return response.json()
+
+    client = OllamaClient(host=host)
+
+    # Warm up both paths so imports and the first connection aren't measured
+    bare_post()
+    client.generate(PROMPT, "mistral")
+
+    report("requests.post (no pooling)", time_calls(bare_post, args.calls))
+    report("OllamaClient (keep-alive)", time_calls(lambda: client.generate(PROMPT, "mistral"), args.calls))
+
+    client.close()
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# OCR latency and line-match rate with and without the preprocessing stage.
+# The corpus is a folder of receipt images; an optional <image stem>.json next
+# to an image holds the expected [{"description", "price"}] items, otherwise the
+# number of lines that look like "<description> <price>" is reported.
+#
+#   python3 benchmarks/preprocess_ocr.py path/to/receipts --runs 3
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from slipscanner.batch import find_images  # noqa: E402
+from slipscanner.ocr import DEFAULT_PREPROCESS, configure_tesseract, extract_text_from_image  # noqa: E402
+from slipscanner.parsing import PRICE_LINE  # noqa: E402
+
+
+def matched_prices(text):
+    prices = []
+    for line in text.split("\n"):
+        match = PRICE_LINE.search(line.strip())
+        if match:
+            prices.append(float(match.group(2)))
+    return prices
+
+
+def expected_prices(image_path):
+    truth_path = os.path.splitext(image_path)[0] + ".json"
+    if not os.path.exists(truth_path):
+        return None
+    with open(truth_path) as f:
+        return [float(item["price"]) for item in json.load(f)]
+
+
+def match_rate(found, expected):
+    remaining = list(found)
+    hits = 0
+    for price in expected:
+        if price in remaining:
+            remaining.remove(price)
+            hits += 1
+    return hits / len(expected) if expected else 1.0
+
+
+def run(image_paths, preprocess, runs):
+    latencies = []
+    rates = []
+    matched_lines = 0
+    for image_path in image_paths:
+        for _ in range(runs):
+            start = time.perf_counter()
+            text = extract_text_from_image(image_path, preprocess=preprocess)
+            latencies.append(time.perf_counter() - start)
+        found = matched_prices(text)
+        matched_lines += len(found)
+        expected = expected_prices(image_path)
+        if expected is not None:
+            rates.append(match_rate(found, expected))
+
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[max(0, int(len(latencies) * 0.95) - 1)] * 1000,
+        "matched_lines": matched_lines,
+        "match_rate": statistics.mean(rates) if rates else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark OCR with and without image preprocessing.")
+    parser.add_argument("corpus", help="Folder of receipt images.")
+    parser.add_argument("--runs", type=int, default=1, help="OCR runs per image.")
+    parser.add_argument("--tesseract-cmd", help="Path to the tesseract binary.")
+    args = parser.parse_args()
+
+    configure_tesseract(args.tesseract_cmd)
+    image_paths = find_images(args.corpus)
+    if not image_paths:
+        parser.error(f"No receipt images found in {args.corpus}")
+
+    print(f"{len(image_paths)} images, {args.runs} run(s) each")
+    print(f"{'mode':<14} {'p50':>10} {'p95':>10} {'price lines':>12} {'match rate':>11}")
+    for name, preprocess in (("raw", None), ("preprocessed", DEFAULT_PREPROCESS)):
+        result = run(image_paths, preprocess, args.runs)
+        rate = f"{result['match_rate']:.1%}" if result["match_rate"] is not None else "n/a"
+        print(f"{name:<14} {result['p50_ms']:>7.0f} ms {result['p95_ms']:>7.0f} ms "
+              f"{result['matched_lines']:>12} {rate:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# Product dictionary lookups: microseconds per garbled description (first
+# lookup and remembered) and how many resolve to the right name, against a
+# synthetic dictionary of brand + product + size names.
+#
+#   python3 benchmarks/product_lookup.py --products 5000 --queries 2000
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from slipscanner.products import ProductDictionary  # noqa: E402
+
+BRANDS = ["Clover", "Albany", "Koo", "Jungle", "Tastic", "Selati", "Rama", "Lancewood", "Fatti's", "Ouma", "Nestle",
+          "Simba", "Lays", "Bakers", "Joko", "Five Roses", "Huletts", "Sasko", "Crosse", "Ina Paarman"]
+PRODUCTS = ["Chicken Teriyaki", "White Sugar", "Brown Bread", "Full Cream Milk", "Baked Beans", "Rice", "Oats",
+            "Rusks", "Butter", "Cheddar Cheese", "Tomato Sauce", "Peanut Butter", "Apricot Jam", "Tea Bags",
+            "Instant Coffee", "Macaroni", "Spaghetti", "Potato Chips", "Biscuits", "Yoghurt", "Maize Meal",
+            "Sunflower Oil", "Chicken Stock", "Mixed Vegetables", "Orange Juice", "Dish Liquid", "Washing Powder"]
+SIZES = ["", "100g", "250g", "500g", "1kg", "2kg", "5kg", "1L", "2L", "750ml", "410g", "6pk"]
+MISREADS = {"o": "0", "l": "1", "s": "5", "i": "l", "e": "c"}
+
+
+def product_names(rng, count):
+    names = set()
+    while len(names) < count:
+        names.add(" ".join(part for part in (rng.choice(BRANDS), rng.choice(PRODUCTS), rng.choice(SIZES)) if part))
+    return sorted(names)
+
+
+def garble(rng, name):
+    # Truncated words and the odd misread character, like OCR of a till slip
+    words = []
+    for word in name.split():
+        if len(word) > 5 and not any(c.isdigit() for c in word) and rng.random() < 0.4:
+            word = word[:rng.randint(3, len(word) - 1)]
+        if rng.random() < 0.3:
+            i = rng.randrange(len(word))
+            word = word[:i] + MISREADS.get(word[i].lower(), word[i]) + word[i + 1:]
+        words.append(word)
+    return " ".join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark product dictionary lookups.")
+    parser.add_argument("--products", type=int, default=5000, help="Names in the dictionary.")
+    parser.add_argument("--queries", type=int, default=2000, help="Garbled descriptions to look up.")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    names = product_names(rng, args.products)
+    queries = [(garble(rng, name), name) for name in (rng.choice(names) for _ in range(args.queries))]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        products = ProductDictionary(os.path.join(tmp, "products.sqlite3"))
+        start = time.perf_counter()
+        products.learn(names)
+        learned = time.perf_counter() - start
+
+        start = time.perf_counter()
+        found = [products.lookup(query) for query, _ in queries]
+        first = time.perf_counter() - start
+        start = time.perf_counter()
+        for query, _ in queries:
+            products.lookup(query)
+        remembered = time.perf_counter() - start
+
+    right = sum(match == name for match, (_, name) in zip(found, queries))
+    wrong = sum(match is not None and match != name for match, (_, name) in zip(found, queries))
+    print(f"{len(names)} products learned in {learned * 1000:.0f} ms, {len(queries)} garbled lookups")
+    print(f"first lookup: {first / len(queries) * 1e6:7.1f} us    remembered: {remembered / len(queries) * 1e6:5.1f} us")
+    print(f"resolved {right / len(queries):.1%}, wrong {wrong / len(queries):.1%}, "
+          f"left as is {1 - (right + wrong) / len(queries):.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# Receipts per minute when several receipts share one prompt (batch --pack),
+# on synthetic receipt text and the mock Ollama server with a prefill cost per
+# prompt token. Small receipts are where the shared instructions dominate.
+#
+#   python3 benchmarks/prompt_packing.py --receipts 48 --sizes 1 2 4 8
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from end_to_end import score_items  # noqa: E402
+from synthetic_receipts import receipt_items, receipt_rows, rows_text  # noqa: E402
+
+from slipscanner.backends import MockBackend  # noqa: E402
+from slipscanner.llm import estimate_tokens, generate_packed_prompt, generate_prompt  # noqa: E402
+from slipscanner.parsing import item_section  # noqa: E402
+from slipscanner.receipt import llm_items_packed  # noqa: E402
+
+
+def make_receipts(count, seed, min_items, max_items):
+    rng = random.Random(seed)
+    receipts = []
+    for _ in range(count):
+        items = receipt_items(rng, min_items, max_items)
+        receipts.append((item_section(rows_text(receipt_rows(rng, items))), items))
+    return receipts
+
+
+def run(receipts, backend, size):
+    hits = expected = 0
+    start = time.perf_counter()
+    for i in range(0, len(receipts), size):
+        pack = receipts[i:i + size]
+        for items, (_, truth) in zip(llm_items_packed([text for text, _ in pack], backend), pack):
+            hits += score_items(items, truth)
+            expected += len(truth)
+    elapsed = time.perf_counter() - start
+    return elapsed, hits / expected if expected else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark packing several receipts into one LLM prompt.")
+    parser.add_argument("--receipts", type=int, default=48)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 4, 8], help="Receipts per prompt to try.")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--min-items", type=int, default=2)
+    parser.add_argument("--max-items", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Mock LLM seconds per request.")
+    parser.add_argument("--prompt-token-latency", type=float, default=0.002,
+                        help="Mock LLM seconds per prompt token (prefill).")
+    parser.add_argument("--token-latency", type=float, default=0.004, help="Mock LLM seconds per generated token.")
+    args = parser.parse_args()
+
+    receipts = make_receipts(args.receipts, args.seed, args.min_items, args.max_items)
+    instructions = estimate_tokens(generate_prompt(""))
+    receipt_tokens = sum(estimate_tokens(text) for text, _ in receipts) / len(receipts)
+    print(f"{len(receipts)} receipts, ~{receipt_tokens:.0f} tokens of items each, "
+          f"~{instructions} tokens of instructions per prompt")
+
+    # One slot, like a single local model: requests run one after another
+    backend = MockBackend(latency=args.llm_latency, token_latency=args.token_latency, parallel=1,
+                          prompt_token_latency=args.prompt_token_latency)
+    try:
+        baseline = None
+        for size in args.sizes:
+            prompt_tokens = estimate_tokens(generate_packed_prompt([text for text, _ in receipts[:size]])) \
+                if size > 1 else estimate_tokens(generate_prompt(receipts[0][0]))
+            elapsed, recall = run(receipts, backend, size)
+            per_minute = len(receipts) / elapsed * 60
+            baseline = baseline or per_minute
+            print(f"pack {size:>2}: {per_minute:7.1f} receipts/min ({per_minute / baseline:4.2f}x), "
+                  f"~{prompt_tokens / size:.0f} prompt tokens per receipt, item recall {recall:.1%}")
+    finally:
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# Refinement turnaround in slipscanner_llm_mistral2.py's loop: continuing the
+# receipt's ConversationSession (only the refinement is evaluated) against
+# sending the whole refined prompt again, on the mock Ollama server with a
+# prefill cost per prompt token.
+#
+#   python3 benchmarks/refinement_session.py --items 40 --refinements 3
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from synthetic_receipts import receipt_items, receipt_rows, rows_text  # noqa: E402
+
+from slipscanner.backends import MockBackend  # noqa: E402
+from slipscanner.llm import complete, generate_prompt  # noqa: E402
+from slipscanner.schema import ITEMS_SCHEMA  # noqa: E402
+from slipscanner.session import ConversationSession  # noqa: E402
+
+REFINEMENT = """
+Refinement Instructions:
+Write every description in title case.
+
+Apply these instructions to the receipt above and output ONLY the complete corrected JSON array of line items.
+"""
+
+
+def timed(call):
+    start = time.perf_counter()
+    call()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark refinement turns with and without a session.")
+    parser.add_argument("--items", type=int, default=40, help="Line items on the receipt.")
+    parser.add_argument("--refinements", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Mock LLM seconds per request.")
+    parser.add_argument("--prompt-token-latency", type=float, default=0.002,
+                        help="Mock LLM seconds per prompt token (prefill).")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Mock LLM seconds per generated token.")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    prompt = generate_prompt(rows_text(receipt_rows(rng, receipt_items(rng, args.items, args.items))))
+    backend = MockBackend(latency=args.llm_latency, token_latency=args.token_latency,
+                          prompt_token_latency=args.prompt_token_latency)
+    try:
+        # Resending: every refinement is the growing prompt, evaluated from scratch
+        full_prompt = prompt
+        complete(full_prompt, backend, format=ITEMS_SCHEMA)
+        resend = []
+        for _ in range(args.refinements):
+            full_prompt += REFINEMENT
+            resend.append(timed(lambda: complete(full_prompt, backend, format=ITEMS_SCHEMA)))
+
+        session = ConversationSession(backend)
+        session.ask(prompt, format=ITEMS_SCHEMA)
+        continued = [timed(lambda: session.ask(REFINEMENT, format=ITEMS_SCHEMA)) for _ in range(args.refinements)]
+    finally:
+        backend.close()
+
+    print(f"{args.items} items, ~{len(prompt) // 4} prompt tokens, {args.refinements} refinements")
+    print(f"resend prompt: {statistics.mean(resend) * 1000:7.0f} ms per refinement")
+    print(f"session:       {statistics.mean(continued) * 1000:7.0f} ms per refinement "
+          f"({statistics.mean(resend) / statistics.mean(continued):.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
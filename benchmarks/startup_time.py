@@ -0,0 +1,64 @@
+# Import-to-window latency of each GUI entry point. Every script is started in
+# a fresh interpreter with Tk's mainloop patched to draw the window once, report
+# the elapsed time and exit. Needs a display.
+#
+#   python3 benchmarks/startup_time.py --runs 5
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SCRIPTS = [
+    "slipscanner.py",
+    "slipscanner_llm_mistral.py",
+    "slipscanner_llm_mistral2.py",
+    "slipscanner_llm_phi.py",
+]
+
+BOOTSTRAP = """
+import time
+start = time.perf_counter()
+import os, runpy, sys, tkinter
+
+def report_window_and_exit(self, n=0):
+    self.update()
+    print(f"{(time.perf_counter() - start) * 1000:.1f}", flush=True)
+    self.destroy()
+
+tkinter.Misc.mainloop = report_window_and_exit
+script = os.path.abspath(sys.argv[1])
+sys.argv = [script]
+sys.path.insert(0, os.path.dirname(script))
+runpy.run_path(script, run_name="__main__")
+"""
+
+
+def measure(script):
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", BOOTSTRAP, script], cwd=REPO_ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    total_ms = (time.perf_counter() - start) * 1000
+    window_ms = float(output.strip().splitlines()[-1])
+    return window_ms, total_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import-to-window latency of the GUI scripts.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("scripts", nargs="*", default=SCRIPTS)
+    args = parser.parse_args()
+
+    print(f"{'script':<30} {'import-to-window':>18} {'process start-to-window':>25}")
+    for script in args.scripts:
+        measure(script)  # warm the OS file cache
+        results = [measure(script) for _ in range(args.runs)]
+        window_ms = statistics.median(r[0] for r in results)
+        total_ms = statistics.median(r[1] for r in results)
+        print(f"{script:<30} {window_ms:>15.1f} ms {total_ms:>22.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# Synthetic receipt photos with known line items, for benchmarks that need
+# ground truth. Each receipt is written as <stem>.png with <stem>.json (the
+# expected [{"description", "price"}] items, as read by preprocess_ocr.py) and
+# <stem>.txt (the text it was rendered from).
+#
+#   python3 benchmarks/synthetic_receipts.py corpus/ --count 50 --noise 12 --max-skew 4
+import argparse
+import json
+import os
+import random
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+PRODUCTS = ["Chicken Breast", "Milk 2L", "White Bread", "Bananas", "Cheddar 400g", "Coffee Beans", "Rice 2kg",
+            "Eggs 6pk", "Apples 1.5kg", "Greek Yoghurt", "Orange Juice", "Penne Pasta", "Cherry Tomatoes",
+            "Butter 500g", "Dish Soap", "Toilet Paper 9pk", "Olive Oil", "Peanut Butter", "Frozen Peas",
+            "Muesli", "Baby Spinach", "Lamb Chops", "Birthday Card", "Sparkling Water"]
+SHOPS = [("SUPERSTORE", "12 Main Road"), ("FRESH MART", "4 Long Street"), ("CORNER SPAR", "88 Kloof Nek Rd")]
+
+# Monospaced fonts like a receipt printer's, in order of preference, with
+# Pillow's built-in font as the fallback
+FONT_NAMES = ("DejaVuSansMono.ttf", "Menlo.ttc", "Courier New.ttf", "cour.ttf", "DejaVuSans.ttf")
+
+PAPER_WIDTH = 576  # 80mm paper at ~180 DPI
+MARGIN = 24
+PAPER = 245
+TABLE = 90
+
+
+def load_font(size, font_path=None):
+    for name in ([font_path] if font_path else FONT_NAMES):
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size)
+
+
+def receipt_items(rng, min_items=3, max_items=25):
+    return [{"description": rng.choice(PRODUCTS), "price": round(rng.uniform(5, 150), 2)}
+            for _ in range(rng.randint(min_items, max_items))]
+
+
+def receipt_rows(rng, items):
+    # (left, right) text pairs, prices right-aligned like a till printout
+    shop, address = rng.choice(SHOPS)
+    rows = [(shop, ""), (address, ""), ("Tel 021 555 0100", ""),
+            (f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2025 {rng.randint(8, 20):02d}:{rng.randint(0, 59):02d}",
+             ""), ("", "")]
+    rows.extend((item["description"], f"{item['price']:.2f}") for item in items)
+    rows.extend([("", ""), ("TOTAL", f"{sum(item['price'] for item in items):.2f}"), ("CARD", ""),
+                 ("Thank you for shopping with us", "")])
+    return rows
+
+
+def rows_text(rows):
+    return "\n".join(f"{left} {right}".strip() for left, right in rows)
+
+
+def render_receipt(rows, font, rng, noise=0.0, skew=0.0):
+    line_height = int(font.size * 1.5)
+    height = MARGIN * 2 + line_height * len(rows)
+    paper = Image.new("L", (PAPER_WIDTH, height), PAPER)
+    draw = ImageDraw.Draw(paper)
+    for i, (left, right) in enumerate(rows):
+        y = MARGIN + i * line_height
+        draw.text((MARGIN, y), left, font=font, fill=20)
+        if right:
+            draw.text((PAPER_WIDTH - MARGIN - draw.textlength(right, font=font), y), right, font=font, fill=20)
+
+    # Photo of the slip lying on a darker table, slightly rotated and out of focus
+    photo = Image.new("L", (PAPER_WIDTH + 160, height + 160), TABLE)
+    photo.paste(paper, (80, 80))
+    if skew:
+        photo = photo.rotate(skew, resample=Image.BICUBIC, expand=True, fillcolor=TABLE)
+    photo = photo.filter(ImageFilter.GaussianBlur(0.6))
+    if noise:
+        pixels = np.asarray(photo, dtype=np.float32)
+        pixels += np.random.default_rng(rng.getrandbits(32)).normal(0, noise, pixels.shape)
+        photo = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+    return photo.convert("RGB")
+
+
+def write_corpus(output_dir, count, seed=7, noise=8.0, max_skew=3.0, font_sizes=(18, 22, 26), font_path=None,
+                 min_items=3, max_items=25):
+    # Returns [(image_path, items, text)]
+    os.makedirs(output_dir, exist_ok=True)
+    rng = random.Random(seed)
+    fonts = {size: load_font(size, font_path) for size in font_sizes}
+    corpus = []
+    for i in range(count):
+        items = receipt_items(rng, min_items, max_items)
+        rows = receipt_rows(rng, items)
+        image = render_receipt(rows, fonts[rng.choice(font_sizes)], rng, noise=noise,
+                               skew=rng.uniform(-max_skew, max_skew))
+
+        stem = os.path.join(output_dir, f"receipt_{i:04d}")
+        image.save(stem + ".png")
+        with open(stem + ".json", "w") as f:
+            json.dump(items, f)
+        text = rows_text(rows)
+        with open(stem + ".txt", "w") as f:
+            f.write(text)
+        corpus.append((stem + ".png", items, text))
+    return corpus
+
+
+def load_corpus(corpus_dir):
+    corpus = []
+    for name in sorted(os.listdir(corpus_dir)):
+        stem, ext = os.path.splitext(os.path.join(corpus_dir, name))
+        if ext != ".png" or not os.path.exists(stem + ".json"):
+            continue
+        with open(stem + ".json") as f:
+            items = json.load(f)
+        text = None
+        if os.path.exists(stem + ".txt"):
+            with open(stem + ".txt") as f:
+                text = f.read()
+        corpus.append((stem + ".png", items, text))
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic receipt photos with ground truth.")
+    parser.add_argument("output", help="Folder to write the corpus to.")
+    parser.add_argument("--count", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--noise", type=float, default=8.0, help="Std-dev of the Gaussian pixel noise.")
+    parser.add_argument("--max-skew", type=float, default=3.0, help="Largest rotation in degrees.")
+    parser.add_argument("--font", help="TrueType font to render with (default: a monospaced system font).")
+    args = parser.parse_args()
+
+    corpus = write_corpus(args.output, args.count, seed=args.seed, noise=args.noise, max_skew=args.max_skew,
+                          font_path=args.font)
+    print(f"Wrote {len(corpus)} receipts to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
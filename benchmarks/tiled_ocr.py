@@ -0,0 +1,65 @@
+# OCR wall time on a long till-roll receipt, read in one pass and as
+# overlapping bands with 1, 2, 4, ... workers, plus how many of the known
+# prices each reading finds. The receipt is rendered by synthetic_receipts.py.
+#
+#   python3 benchmarks/tiled_ocr.py --items 150 --runs 2
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from preprocess_ocr import match_rate, matched_prices  # noqa: E402
+from synthetic_receipts import load_font, receipt_items, receipt_rows, render_receipt  # noqa: E402
+
+from slipscanner.ocr import DEFAULT_PREPROCESS, DEFAULT_TILING  # noqa: E402
+from slipscanner.ocr import configure_tesseract, extract_text_from_image  # noqa: E402
+
+
+def run(image_path, tiling, runs):
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        text = extract_text_from_image(image_path, preprocess=DEFAULT_PREPROCESS, tiling=tiling)
+        latencies.append(time.perf_counter() - start)
+    return statistics.median(latencies), matched_prices(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tiled OCR of a long receipt.")
+    parser.add_argument("--items", type=int, default=150, help="Line items on the receipt.")
+    parser.add_argument("--runs", type=int, default=1, help="OCR runs per setting.")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--workers", type=int, nargs="+", help="Band workers to try (default: 1, 2, 4, ... cores).")
+    parser.add_argument("--tesseract-cmd", help="Path to the tesseract binary.")
+    args = parser.parse_args()
+
+    configure_tesseract(args.tesseract_cmd)
+    rng = random.Random(args.seed)
+    items = receipt_items(rng, args.items, args.items)
+    image = render_receipt(receipt_rows(rng, items), load_font(22), rng, noise=4.0)
+    expected = [item["price"] for item in items]
+
+    workers = args.workers or [1]
+    while not args.workers and workers[-1] * 2 <= (os.cpu_count() or 1):
+        workers.append(workers[-1] * 2)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        image_path = os.path.join(tmp, "long_receipt.png")
+        image.save(image_path)
+        print(f"{args.items} items, {image.width}x{image.height} px, {os.cpu_count()} cores")
+
+        baseline, found = run(image_path, None, args.runs)
+        print(f"{'one pass':<12} {baseline:7.2f} s          price match {match_rate(found, expected):.1%}")
+        for count in workers:
+            seconds, found = run(image_path, dict(DEFAULT_TILING, workers=count), args.runs)
+            print(f"{f'{count} worker(s)':<12} {seconds:7.2f} s ({baseline / seconds:4.2f}x) "
+                  f"price match {match_rate(found, expected):.1%}")
+
+
+if __name__ == "__main__":
+    main()
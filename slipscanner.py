@@ -1,53 +1,22 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox
-import pytesseract
-pytesseract.pytesseract.tesseract_cmd = "/opt/homebrew/bin/tesseract"
-from PIL import Image
-import pandas as pd
-import re
-import os
-import string
 
-def clean_description(text):
-    # Remove leading non-alphabetic characters (like $ § S Z etc.)
-    text = re.sub(r'^[^a-zA-Z]+', '', text)
+from slipscanner import ocr
+from slipscanner.items import write_items
+from slipscanner.parsing import extract_items_from_text
+from slipscanner.startup import preload_in_background
 
-    # Normalize spaces
-    text = re.sub(r'\s+', ' ', text)
-
-    # Fix common OCR character misreads generically
-    ocr_corrections = {
-        '0': 'O',  # zero to capital O
-        '1': 'l',  # one to lowercase L
-        '5': 'S',  # five to S
-        '|': 'l',
-    }
-
-    for wrong, right in ocr_corrections.items():
-        text = text.replace(wrong, right)
-
-    # Remove any trailing non-printable characters
-    text = ''.join([c for c in text if c in string.printable])
-
-    # Strip spaces and title case
-    text = text.strip().title()
-
-    return text
+ocr.configure_tesseract("/opt/homebrew/bin/tesseract")
 
 def extract_items(image_path):
     try:
+        # pytesseract and PIL are imported on first use so the window opens immediately
+        from PIL import Image
+        pytesseract = ocr.load_pytesseract()
+
         img = Image.open(image_path)
         text = pytesseract.image_to_string(img)
-
-        items = []
-        for line in text.split('\n'):
-            match = re.search(r'(.+?)\s+(\d{1,3}\.\d{2})$', line.strip())
-            if match:
-                desc = match.group(1).strip()
-                desc = clean_description(desc)
-                price = float(match.group(2))
-                items.append([desc, '', '', price])
-        return items
+        return extract_items_from_text(text)
     except Exception as e:
         messagebox.showerror("Error", f"Failed to process image:\n{e}")
         return []
@@ -67,8 +36,7 @@ def select_image():
     if not save_path:
         return
 
-    df = pd.DataFrame(items, columns=["description", "category", "units", "price"])
-    df.to_csv(save_path, index=False)
+    write_items(save_path, items)
     messagebox.showinfo("Success", f"CSV saved:\n{save_path}")
 
 # GUI Setup
@@ -82,4 +50,5 @@ label.pack(pady=20)
 button = tk.Button(app, text="Select Receipt Image", command=select_image)
 button.pack()
 
+app.after(100, preload_in_background)
 app.mainloop()
\ No newline at end of file
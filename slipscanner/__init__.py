@@ -0,0 +1,2 @@
+# Shared, GUI-free receipt scanning code used by the slipscanner scripts and the
+# `python -m slipscanner` command line.
@@ -0,0 +1,204 @@
+import threading
+
+from slipscanner.llama_server import DEFAULT_LLAMA_MODEL, LazyLlama
+from slipscanner.ollama import DEFAULT_MODEL, DEFAULT_POOL_SIZE, AsyncOllamaClient, OllamaClient, default_client
+from slipscanner.schema import grammar_for
+from slipscanner.tracing import annotate, annotate_ollama_stats
+
+BACKENDS = ("ollama", "llama-cpp", "mock")
+
+# Ollama option names that llama_cpp calls something else
+LLAMA_OPTION_NAMES = {"num_predict": "max_tokens", "repeat_last_n": "last_n_tokens_size"}
+
+
+# --- LLM backends ---
+# Everything that turns a prompt into text goes through an LLMBackend:
+#   generate(prompt, options=None, format=None) -> response text
+#   stream(prompt, options=None, format=None)   -> response fragments as they arrive
+#   name                                        -> model identity used in cache keys
+# options use Ollama's names (num_predict, temperature, ...) and format is None
+# or a JSON schema such as schema.ITEMS_SCHEMA.
+#
+# generate_turn and stream_turn continue a session.ConversationSession: history
+# is the earlier turns as text and state whatever the backend returned for the
+# last turn, which lets it skip evaluating history again. The default keeps no
+# state and evaluates everything.
+#
+# agenerate is generate for asyncio code, by default the blocking call on a
+# worker thread. aclose releases what agenerate set up, in the same event loop.
+class LLMBackend:
+    name = None
+
+    def generate(self, prompt, options=None, format=None):
+        raise NotImplementedError
+
+    def stream(self, prompt, options=None, format=None):
+        yield self.generate(prompt, options=options, format=format)
+
+    def generate_turn(self, history, prompt, state=None, options=None, format=None):
+        # -> (text, state)
+        return self.generate(history + prompt, options=options, format=format), None
+
+    def stream_turn(self, history, prompt, state=None, options=None, format=None):
+        # Yields fragments, returns the state
+        yield from self.stream(history + prompt, options=options, format=format)
+        return None
+
+    async def agenerate(self, prompt, options=None, format=None):
+        import asyncio  # only the async pipeline needs it, it's slow to import for the GUI scripts
+
+        return await asyncio.to_thread(self.generate, prompt, options, format)
+
+    async def aclose(self):
+        pass
+
+    def warm_up(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class OllamaBackend(LLMBackend):
+    def __init__(self, model=DEFAULT_MODEL, client=None, timeout=60):
+        self.name = model
+        self._client = client
+        self.timeout = timeout
+        self._async_client = None
+
+    @property
+    def client(self):
+        # The shared client (and requests) is only set up on the first call
+        return self._client or default_client()
+
+    def generate(self, prompt, options=None, format=None):
+        data = self.client.generate(prompt, self.name, options=options, timeout=self.timeout, format=format)
+        annotate_ollama_stats(data)
+        return data.get("response", "").strip()
+
+    def stream(self, prompt, options=None, format=None):
+        for data in self.client.stream(prompt, self.name, options=options, timeout=self.timeout, format=format):
+            if data.get("response"):
+                yield data["response"]
+            if data.get("done"):
+                annotate_ollama_stats(data)
+
+    # Ollama's state is the context token list of the last answer, with it
+    # only the new prompt is sent and evaluated
+    def generate_turn(self, history, prompt, state=None, options=None, format=None):
+        data = self.client.generate(prompt if state else history + prompt, self.name, options=options,
+                                    timeout=self.timeout, format=format, context=state)
+        annotate_ollama_stats(data)
+        return data.get("response", "").strip(), data.get("context")
+
+    def stream_turn(self, history, prompt, state=None, options=None, format=None):
+        context = None
+        for data in self.client.stream(prompt if state else history + prompt, self.name, options=options,
+                                       timeout=self.timeout, format=format, context=state):
+            if data.get("response"):
+                yield data["response"]
+            if data.get("done"):
+                annotate_ollama_stats(data)
+                context = data.get("context")
+        return context
+
+    # Without aiohttp installed the blocking client runs on worker threads instead
+    async def agenerate(self, prompt, options=None, format=None):
+        if self._async_client is None:
+            try:
+                self._async_client = AsyncOllamaClient(self.client.host, limit=self.client.pool_size,
+                                                       keep_alive=self.client.keep_alive, timeout=self.timeout)
+            except ImportError:
+                self._async_client = False
+        if self._async_client is False:
+            return await super().agenerate(prompt, options, format)
+        data = await self._async_client.generate(prompt, self.name, options=options, format=format)
+        annotate_ollama_stats(data)
+        return data.get("response", "").strip()
+
+    async def aclose(self):
+        if self._async_client:
+            await self._async_client.close()
+        self._async_client = None
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+
+
+class LlamaCppBackend(LLMBackend):
+    # llm: anything called like llama_cpp.Llama, by default a LazyLlama that
+    # uses the shared llama server when one is running
+    def __init__(self, model_path=DEFAULT_LLAMA_MODEL, llm=None, **llama_kwargs):
+        self.name = model_path
+        self.llm = llm or LazyLlama(model_path, **llama_kwargs)
+
+    def _options(self, options, format):
+        kwargs = {LLAMA_OPTION_NAMES.get(key, key): value for key, value in (options or {}).items()}
+        if format is not None:
+            kwargs["grammar"] = grammar_for(format)
+        return kwargs
+
+    def generate(self, prompt, options=None, format=None):
+        return self._text(self.llm(prompt, **self._options(options, format)))
+
+    def _text(self, output):
+        usage = output.get("usage") or {}
+        annotate(prompt_eval_count=usage.get("prompt_tokens"), eval_count=usage.get("completion_tokens"))
+        return output["choices"][0]["text"].strip()
+
+    # llama.cpp's state is a saved KV cache: the whole conversation is passed
+    # but only the tokens after the restored prefix are evaluated
+    def generate_turn(self, history, prompt, state=None, options=None, format=None):
+        kwargs = self._options(options, format)
+        if not hasattr(self.llm, "call_with_state"):
+            # A plain llama_cpp.Llama, which reuses the prefix it evaluated last by itself
+            return self._text(self.llm(history + prompt, **kwargs)), None
+        output, state = self.llm.call_with_state(history + prompt, state, **kwargs)
+        return self._text(output), state
+
+    def stream_turn(self, history, prompt, state=None, options=None, format=None):
+        text, state = self.generate_turn(history, prompt, state, options=options, format=format)
+        yield text
+        return state
+
+    def warm_up(self):
+        self.llm.warm_up()
+
+
+class MockBackend(OllamaBackend):
+    # An OllamaBackend talking to its own MockOllamaServer, see mock_ollama.py
+    def __init__(self, model=DEFAULT_MODEL, latency=0.0, token_latency=0.0, parallel=4, pool_size=DEFAULT_POOL_SIZE,
+                 prompt_token_latency=0.0):
+        from slipscanner.mock_ollama import MockOllamaServer
+
+        self.server = MockOllamaServer(latency=latency, token_latency=token_latency, parallel=parallel,
+                                       prompt_token_latency=prompt_token_latency).start()
+        super().__init__(model, client=OllamaClient(host=self.server.url, pool_size=pool_size))
+
+    def close(self):
+        super().close()
+        self.server.stop()
+
+
+def make_backend(name="ollama", model=None, pool_size=DEFAULT_POOL_SIZE, **mock_options):
+    # model: Ollama model name, or the GGUF path for llama-cpp
+    if name == "ollama":
+        return OllamaBackend(model or DEFAULT_MODEL, client=OllamaClient(pool_size=pool_size))
+    if name == "llama-cpp":
+        return LlamaCppBackend(model or DEFAULT_LLAMA_MODEL)
+    if name == "mock":
+        return MockBackend(model or DEFAULT_MODEL, pool_size=pool_size, **mock_options)
+    raise ValueError(f"Unknown LLM backend {name!r}, expected one of {', '.join(BACKENDS)}")
+
+
+_default_backend = None
+_default_backend_lock = threading.Lock()
+
+
+def default_backend():
+    global _default_backend
+    with _default_backend_lock:
+        if _default_backend is None:
+            _default_backend = OllamaBackend()
+        return _default_backend
@@ -0,0 +1,237 @@
+import glob
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+
+from slipscanner.backends import make_backend
+from slipscanner.items import ItemWriter
+from slipscanner.layout import extract_layout_text
+from slipscanner.ocr import configure_tesseract, extract_text_from_image
+from slipscanner.parsing import item_section
+from slipscanner.receipt import (categorize, llm_items_packed, normalize_descriptions, parse_receipt_text,
+                                 parse_receipt_text_hybrid)
+from slipscanner.tracing import Trace, percentile, stage_durations
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".tif", ".tiff", ".pdf")
+MERGED_OUTPUT_NAME = "receipts"
+
+
+def find_images(source):
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in os.listdir(source)]
+    else:
+        paths = glob.glob(source, recursive=True)
+    return sorted(p for p in paths if os.path.isfile(p) and p.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def output_path_for(image_path, output_dir, output_format="csv", root=None, keep_extension=False):
+    # The folders between root and image_path are repeated inside output_dir,
+    # keep_extension names the output scan.jpg.csv rather than scan.csv
+    name = os.path.basename(image_path)
+    if not keep_extension:
+        name = os.path.splitext(name)[0]
+    folder = os.path.relpath(os.path.dirname(os.path.abspath(image_path)), root) if root else os.curdir
+    return os.path.normpath(os.path.join(output_dir, folder, f"{name}.{output_format}"))
+
+
+def output_paths(image_paths, output_dir, output_format="csv"):
+    # {image path: output path} for a batch. Receipts with the same name in
+    # different folders keep their folders apart, and ones that only differ in
+    # extension (scan.jpg and scan.png) keep the extension in the output name.
+    if not image_paths:
+        return {}
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in image_paths])
+    paths = {path: output_path_for(path, output_dir, output_format, root) for path in image_paths}
+    taken = Counter(paths.values())
+    for path, output_path in paths.items():
+        if taken[output_path] > 1:
+            paths[path] = output_path_for(path, output_dir, output_format, root, keep_extension=True)
+    return paths
+
+
+def log_error(message):
+    print(message, file=sys.stderr)
+
+
+def traced_ocr(extract, image_path, ocr_cache, preprocess, tiling=None):
+    # Runs in an OCR process, the spans travel back with the text
+    trace = Trace()
+    with trace.activate():
+        text = extract(image_path, ocr_cache, preprocess=preprocess, tiling=tiling)
+    return text, trace.spans
+
+
+def stage_stats(traces):
+    stats = {stage: {"p50": statistics.median(values), "p95": percentile(values, 0.95)}
+             for stage, values in stage_durations(traces).items()}
+    tokens_per_sec = [s["tokens_per_sec"] for trace in traces for s in trace.spans if s.get("tokens_per_sec")]
+    if tokens_per_sec:
+        stats["llm"]["tokens_per_sec"] = statistics.median(tokens_per_sec)
+    return stats
+
+
+def run_batch(image_paths, output_dir, merge=False, workers=None, llm_concurrency=2,
+              backend=None, tesseract_cmd=None, ocr_cache=None, llm_cache=None, output_format="csv",
+              preprocess=None, trim=True, engine="llm", unmatched_only=False, layout=False, trace_writer=None,
+              chunking=None, pack=1, tiling=None, products=None, categories=None):
+    # engine: "llm" sends every receipt to the model, "hybrid" only the ones the regex parser isn't sure about
+    # backend: a backends.LLMBackend, by default a local Ollama server
+    # trace_writer: a tracing.TraceWriter that gets every finished receipt's stage timings
+    # chunking: options for chunking.parse_in_chunks, None sends each receipt in one prompt
+    # pack: receipts sent to the LLM together in one prompt (engine "llm" only), see receipt.llm_items_packed
+    # tiling: options for OCR of tall pages in bands (ocr.DEFAULT_TILING), None OCRs each page in one piece
+    # products: a products.ProductDictionary to resolve garbled descriptions with
+    # categories: a categories.CategoryClassifier to fill in the category column with
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    results = {}
+    failed = []
+    skipped_llm = []
+    traces = []
+
+    # One pooled connection per concurrent LLM call
+    owns_backend = backend is None
+    if owns_backend:
+        backend = make_backend("ollama", pool_size=llm_concurrency)
+
+    # Bounds how many OCR'd receipts can wait for an LLM slot. While it's full
+    # no more images go to the OCR pool either, which only ever has a couple
+    # per process queued, so a fast OCR pool doesn't pile up every receipt's
+    # text in memory ahead of Ollama.
+    llm_queue = threading.BoundedSemaphore(llm_concurrency * 2 * pack)
+
+    output_path = output_paths(image_paths, output_dir, output_format)
+
+    # Merged output is appended to as each receipt finishes, so rows are in completion order
+    merged_writer = None
+    if merge:
+        merged_writer = ItemWriter(os.path.join(output_dir, f"{MERGED_OUTPUT_NAME}.{output_format}"),
+                                   extra_columns=["source"])
+
+    def finish(image_path, items, trace):
+        traces.append(trace)
+        if trace_writer is not None:
+            trace_writer.write(trace)
+        if merged_writer is not None:
+            merged_writer.write_all(items, source=image_path)
+        else:
+            with ItemWriter(output_path[image_path]) as writer:
+                writer.write_all(items)
+
+    def llm_stage(image_path, ocr_text, trace):
+        try:
+            with trace.activate():
+                if engine == "hybrid":
+                    items, used_llm = parse_receipt_text_hybrid(ocr_text, backend, llm_cache=llm_cache,
+                                                                unmatched_only=unmatched_only, chunking=chunking,
+                                                                products=products, categories=categories)
+                    if not used_llm:
+                        skipped_llm.append(image_path)
+                else:
+                    items = parse_receipt_text(ocr_text, backend, llm_cache=llm_cache, trim=trim, chunking=chunking,
+                                               products=products, categories=categories)
+            finish(image_path, items, trace)
+            return items
+        finally:
+            llm_queue.release()
+
+    def llm_pack_stage(receipts):
+        # receipts: [(image_path, ocr_text, trace)] answered by one request. Every
+        # receipt's trace gets the shared spans, marked shared=True after the first
+        # so token counts aren't added up once per receipt.
+        try:
+            pack_trace = Trace()
+            with pack_trace.activate():
+                all_items = llm_items_packed([item_section(text) if trim else text for _, text, _ in receipts],
+                                             backend, llm_cache=llm_cache)
+                all_items = [categorize(normalize_descriptions(items, products), categories) for items in all_items]
+            for i, ((image_path, _, trace), items) in enumerate(zip(receipts, all_items)):
+                trace.spans.extend(dict(s, shared=True) if i else s for s in pack_trace.spans)
+                finish(image_path, items, trace)
+            return all_items
+        finally:
+            for _ in receipts:
+                llm_queue.release()
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=configure_tesseract,
+                             initargs=(tesseract_cmd,)) as ocr_pool, \
+            ThreadPoolExecutor(max_workers=llm_concurrency) as llm_pool:
+        # layout rebuilds rows from word boxes and splits off the price column geometrically
+        extract = extract_layout_text if layout else extract_text_from_image
+        pending_paths = iter(image_paths)
+        ocr_futures = {}
+        llm_futures = {}
+        waiting = []  # OCR'd receipts not yet sent, while filling a pack
+
+        def submit_ocr():
+            # Two images per OCR process: one being read, one ready to start
+            while len(ocr_futures) < 2 * workers:
+                path = next(pending_paths, None)
+                if path is None:
+                    return
+                ocr_futures[ocr_pool.submit(traced_ocr, extract, path, ocr_cache, preprocess, tiling)] = path
+
+        submit_ocr()
+        while ocr_futures:
+            done, _ = wait(ocr_futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                image_path = ocr_futures.pop(future)
+                try:
+                    ocr_text, ocr_spans = future.result()
+                except Exception as e:
+                    log_error(f"[OCR Error] {image_path}: {e}")
+                    failed.append(image_path)
+                    continue
+                if not ocr_text.strip():
+                    log_error(f"[OCR Error] {image_path}: no text extracted")
+                    failed.append(image_path)
+                    continue
+
+                trace = Trace(image_path)
+                trace.spans.extend(ocr_spans)
+                llm_queue.acquire()
+                if pack > 1:
+                    waiting.append((image_path, ocr_text, trace))
+                    if len(waiting) == pack:
+                        llm_futures[llm_pool.submit(llm_pack_stage, waiting)] = [path for path, _, _ in waiting]
+                        waiting = []
+                else:
+                    llm_futures[llm_pool.submit(llm_stage, image_path, ocr_text, trace)] = [image_path]
+            submit_ocr()
+        if waiting:
+            llm_futures[llm_pool.submit(llm_pack_stage, waiting)] = [path for path, _, _ in waiting]
+
+        for future in as_completed(llm_futures):
+            paths = llm_futures[future]
+            try:
+                items = future.result()
+            except Exception as e:
+                for image_path in paths:
+                    log_error(f"[LLM Error] {image_path}: {e}")
+                failed.extend(paths)
+                continue
+            if pack > 1:
+                results.update(zip(paths, items))
+            else:
+                results[paths[0]] = items
+
+    if owns_backend:
+        backend.close()
+    if merged_writer is not None:
+        merged_writer.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "processed": len(results),
+        "skipped_llm": len(skipped_llm),
+        "failed": failed,
+        "elapsed": elapsed,
+        "images_per_sec": len(image_paths) / elapsed if elapsed else 0.0,
+        "llm_cache": llm_cache.stats() if llm_cache is not None else None,
+        "stages": stage_stats(traces),
+    }
@@ -0,0 +1,119 @@
+import contextlib
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA_VERSION = 2
+
+
+def default_cache_dir():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.environ.get("SLIPSCANNER_CACHE_DIR") or os.path.join(base, "slipscanner")
+
+
+def default_data_dir():
+    # Things worth keeping, unlike the caches, e.g. the product dictionary
+    base = os.environ.get("XDG_DATA_HOME") or os.path.join(os.path.expanduser("~"), ".local", "share")
+    return os.environ.get("SLIPSCANNER_DATA_DIR") or os.path.join(base, "slipscanner")
+
+
+def hash_key(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(repr(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+# --- SQLite-backed LRU cache ---
+# Opens a short-lived connection per operation so one instance can be shared by
+# threads and pickled into batch worker processes. Hit/miss counters are per process.
+# A connection's own context manager only commits, closing() is what closes it.
+class DiskCache:
+    def __init__(self, path, max_bytes=64 * 1024 * 1024, ttl=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl  # seconds, None keeps entries until evicted by size
+        self.hits = 0
+        self.misses = 0
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if not self._initialized:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            # It's only a cache, so an outdated layout is simply dropped
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                conn.execute("DROP TABLE IF EXISTS entries")
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.execute("""CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+            self._initialized = True
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        with contextlib.closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT value, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self._count(hit=False)
+                return None
+            conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        self._count(hit=True)
+        return row[0]
+
+    def set(self, key, value):
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with contextlib.closing(self._connect()) as conn, conn:
+            conn.execute("INSERT OR REPLACE INTO entries (key, value, size, created_at, accessed_at) "
+                         "VALUES (?, ?, ?, ?, ?)", (key, value, size, now, now))
+            self._evict(conn)
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    def _evict(self, conn):
+        if self.ttl is not None:
+            conn.execute("DELETE FROM entries WHERE created_at < ?", (time.time() - self.ttl,))
+        # Drop least recently used entries once the newest ones fill max_bytes
+        conn.execute("""DELETE FROM entries WHERE key IN (
+            SELECT key FROM (
+                SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC) AS running_size FROM entries
+            ) WHERE running_size > ?
+        )""", (self.max_bytes,))
+
+    def clear(self):
+        with contextlib.closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM entries")
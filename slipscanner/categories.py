@@ -0,0 +1,155 @@
+import csv
+import os
+import threading
+import zlib
+
+from slipscanner.cache import default_data_dir
+from slipscanner.products import normalize_name, trigrams
+
+N_FEATURES = 2 ** 16  # hashed feature columns, a new model file picks this up
+SMOOTHING = 0.1
+MIN_CONFIDENCE = 0.6  # below this the category is left empty
+MAX_REMEMBERED = 10000  # categorized descriptions remembered before the memo is cleared
+
+
+def default_categories_path():
+    return os.path.join(default_data_dir(), "categories.npz")
+
+
+def hashed_features(normalized, n_features=N_FEATURES):
+    # Column indices of a normalized description's words and character
+    # trigrams. crc32 rather than hash() so the columns are the same in every
+    # process (hash() is salted per interpreter).
+    features = {"w " + word for word in normalized.split()} | trigrams(normalized)
+    return sorted({zlib.crc32(feature.encode()) % n_features for feature in features})
+
+
+# --- Category classifier ---
+# A multinomial naive Bayes model over hashed word and trigram features, i.e. a
+# linear model whose weights are smoothed log feature frequencies per category.
+# It's trained from exported CSVs whose category column was filled in, keeping
+# the raw counts so more exports can be added later. A batch of descriptions is
+# scored with one gather and sum over the weight matrix, and the answer for
+# each normalized description is remembered. Safe to share between threads.
+class CategoryClassifier:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._model = None  # (categories, counts, weights, bias), categories empty when nothing was learned
+        self._memo = {}  # normalized description -> category
+
+    def _load(self):
+        # Called with the lock held
+        if self._model is None:
+            import numpy as np
+
+            categories, counts = [], np.zeros((0, 0), dtype=np.float32)
+            if os.path.exists(self.path):
+                with np.load(self.path, allow_pickle=False) as data:
+                    categories, counts = [str(c) for c in data["categories"]], data["counts"]
+            self._set_model(categories, counts)
+        return self._model
+
+    def _set_model(self, categories, counts):
+        import numpy as np
+
+        weights = bias = None
+        if categories:
+            # Each row of counts is a category: [items seen, feature counts...]
+            totals = counts[:, 1:].sum(axis=1, keepdims=True)
+            weights = np.log((counts[:, 1:] + SMOOTHING) / (totals + SMOOTHING * (counts.shape[1] - 1)))
+            weights = np.ascontiguousarray(weights.T, dtype=np.float32)  # features x categories for the gather
+            bias = np.log(counts[:, 0] / counts[:, 0].sum()).astype(np.float32)
+        self._model = (categories, counts, weights, bias)
+
+    def warm_up(self):
+        # Loads the model ahead of the first receipt
+        with self._lock:
+            self._load()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._load()[0])
+
+    @property
+    def categories(self):
+        with self._lock:
+            return list(self._load()[0])
+
+    def learn(self, labelled):
+        # labelled: (description, category) pairs, the ones missing either are skipped
+        import numpy as np
+
+        rows = [(normalize_name(description or ""), (category or "").strip()) for description, category in labelled]
+        rows = [(normalized, category) for normalized, category in rows if normalized and category]
+        if not rows:
+            return 0
+
+        with self._lock:
+            categories, counts, _, _ = self._load()
+            categories = list(categories)
+            n_features = counts.shape[1] - 1 if categories else N_FEATURES
+            for _, category in rows:
+                if category not in categories:
+                    categories.append(category)
+            counts = np.vstack([counts.reshape(-1, n_features + 1),
+                                np.zeros((len(categories) - counts.shape[0], n_features + 1), dtype=np.float32)])
+
+            column = {category: i for i, category in enumerate(categories)}
+            row_features = [hashed_features(normalized, n_features) for normalized, _ in rows]
+            labels = np.array([column[category] for _, category in rows])
+            np.add.at(counts[:, 0], labels, 1)
+            np.add.at(counts, (np.repeat(labels, [len(f) for f in row_features]),
+                               np.concatenate([np.array(f, dtype=np.int64) for f in row_features]) + 1), 1)
+
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp.npz"
+            np.savez_compressed(tmp_path, categories=np.array(categories), counts=counts)
+            os.replace(tmp_path, self.path)
+            self._set_model(categories, counts)
+            self._memo.clear()
+        return len(rows)
+
+    def learn_csv(self, path):
+        # An exported CSV with description and category columns
+        with open(path, newline="", encoding="utf-8") as f:
+            return self.learn((row.get("description"), row.get("category")) for row in csv.DictReader(f))
+
+    def predict(self, descriptions):
+        # The category of each description, "" when unsure or nothing was learned
+        import numpy as np
+
+        normalized = [normalize_name(description or "") for description in descriptions]
+        with self._lock:
+            categories, counts, weights, bias = self._load()
+            if not categories:
+                return [""] * len(normalized)
+
+            names = {name for name in normalized if name}
+            if len(self._memo) + len(names) > MAX_REMEMBERED:
+                self._memo.clear()
+            todo = sorted(names - self._memo.keys())
+            if todo:
+                row_features = [hashed_features(name, weights.shape[0]) for name in todo]
+                lengths = np.array([len(f) for f in row_features])
+                columns = np.concatenate([np.array(f, dtype=np.int64) for f in row_features])
+                # Sum each description's weight rows: one gather, one segmented sum
+                scores = np.add.reduceat(weights[columns], np.concatenate(([0], np.cumsum(lengths)[:-1])), axis=0)
+                scores += bias
+                scores -= scores.max(axis=1, keepdims=True)
+                confidence = 1 / np.exp(scores).sum(axis=1)  # softmax probability of the best category
+                best = scores.argmax(axis=1)
+                for name, index, p in zip(todo, best.tolist(), confidence.tolist()):
+                    self._memo[name] = categories[index] if p >= MIN_CONFIDENCE else ""
+            return [self._memo.get(name, "") for name in normalized]
+
+    def categorize_items(self, items):
+        # Fills in the category of items that don't have one, in place
+        missing = [item for item in items if not item.category]
+        for item, category in zip(missing, self.predict([item.description for item in missing])):
+            item.category = category
+        return items
+
+
+def default_categories():
+    return CategoryClassifier(default_categories_path())
@@ -0,0 +1,90 @@
+import contextvars
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from slipscanner.tracing import span
+
+LINE_PRICE = re.compile(r'(\d+)[.,](\d{2})\b')
+
+# Options for parse_in_chunks. phi-2 has a 2048 token context: ~400 tokens of
+# receipt lines plus the prompt template and the JSON answer fit comfortably.
+DEFAULT_CHUNKING = {
+    "max_lines": 30,
+    "max_tokens": 400,
+    "overlap": 3,
+    "concurrency": 2,
+}
+
+
+def line_windows(lines, max_lines=30, max_tokens=400, overlap=3):
+    # (start, end) windows over lines, each within max_lines and roughly
+    # max_tokens, with the last overlap lines repeated at the start of the next
+    # so an item cut at a boundary is complete in at least one window
+    windows = []
+    start = 0
+    while start < len(lines):
+        end = start
+        tokens = 0
+        while end < len(lines) and end - start < max_lines:
+            line_tokens = len(lines[end]) // 4 + 1
+            if end > start and tokens + line_tokens > max_tokens:
+                break
+            tokens += line_tokens
+            end += 1
+        windows.append((start, end))
+        if end >= len(lines):
+            break
+        start = max(end - overlap, start + 1)
+    return windows
+
+
+def line_prices(lines):
+    prices = []
+    for line in lines:
+        found = LINE_PRICE.findall(line)
+        if found:
+            prices.append(round(float(".".join(found[-1])), 2))
+    return prices
+
+
+def merge_chunk_items(chunk_items, overlaps):
+    # chunk_items[i] are the items parsed from window i and overlaps[i] the lines
+    # window i + 1 shares with it. Items come back in receipt order, so only the
+    # leading items of window i + 1, as many as there are priced shared lines,
+    # can be repeats; one of them is dropped while its price is both on a
+    # shared line and in window i's items. Items further into the window are
+    # always kept. This is a best effort: an identical purchase on both sides of
+    # the shared lines, or a leading item the model skipped, can still cost or
+    # add an item at a boundary.
+    merged = list(chunk_items[0]) if chunk_items else []
+    for i in range(1, len(chunk_items)):
+        shared_prices = line_prices(overlaps[i - 1])
+        shared = Counter(shared_prices)
+        previous = Counter(round(item.price, 2) for item in chunk_items[i - 1])
+        budget = {price: min(count, previous[price]) for price, count in shared.items()}
+        for position, item in enumerate(chunk_items[i]):
+            price = round(item.price, 2)
+            if position < len(shared_prices) and budget.get(price):
+                budget[price] -= 1
+                continue
+            merged.append(item)
+    return merged
+
+
+def parse_in_chunks(text, parse_with_llm, max_lines=30, max_tokens=400, overlap=3, concurrency=2):
+    # Splits text into overlapping line windows, runs parse_with_llm(chunk_text)
+    # on up to concurrency windows at once and merges the items in receipt order.
+    # Short receipts are a single window and a single call.
+    lines = [line for line in text.split('\n') if line.strip()]
+    windows = line_windows(lines, max_lines, max_tokens, overlap)
+    if len(windows) <= 1:
+        return parse_with_llm(text)
+
+    chunks = ['\n'.join(lines[start:end]) for start, end in windows]
+    overlaps = [lines[windows[i + 1][0]:windows[i][1]] for i in range(len(windows) - 1)]
+    with span("chunks", count=len(chunks)), ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        # Each call gets a copy of the caller's context so its spans land in the same trace
+        futures = [pool.submit(contextvars.copy_context().run, parse_with_llm, chunk) for chunk in chunks]
+        chunk_items = [future.result() for future in futures]
+    return merge_chunk_items(chunk_items, overlaps)
@@ -0,0 +1,373 @@
+import argparse
+import os
+import sys
+
+from slipscanner.backends import BACKENDS
+from slipscanner.llama_server import DEFAULT_LLAMA_MODEL
+
+
+def make_cli_backend(args):
+    from slipscanner.backends import make_backend
+
+    mock_options = {}
+    if args.backend == "mock":
+        mock_options = {"latency": args.mock_latency, "token_latency": args.mock_token_latency,
+                        "prompt_token_latency": args.mock_prompt_token_latency}
+    return make_backend(args.backend, args.model, pool_size=args.llm_concurrency, **mock_options)
+
+
+def receipt_options(args):
+    # The run_batch/run_watch keyword arguments that add_receipt_arguments' options map to
+    from slipscanner.categories import default_categories
+    from slipscanner.llm import default_llm_cache
+    from slipscanner.ocr import DEFAULT_PREPROCESS, DEFAULT_TILING, default_ocr_cache
+    from slipscanner.products import default_products
+
+    categories = None
+    if not args.no_categories:
+        categories = default_categories()
+        categories.warm_up()
+
+    # The OCR processes already keep every core busy with a receipt each, tall
+    # pages only get their bands read in parallel with the cores left over
+    tiling = None
+    if not args.no_tile:
+        tiling = dict(DEFAULT_TILING, workers=max(1, (os.cpu_count() or 1) // max(1, args.workers)))
+
+    return {
+        "workers": args.workers,
+        "llm_concurrency": args.llm_concurrency,
+        "tesseract_cmd": args.tesseract_cmd,
+        "ocr_cache": None if args.no_cache else default_ocr_cache(),
+        "llm_cache": None if args.no_cache else default_llm_cache(),
+        "output_format": args.format,
+        "preprocess": None if args.no_preprocess else DEFAULT_PREPROCESS,
+        "trim": not args.no_trim,
+        "layout": args.layout,
+        "tiling": tiling,
+        "products": None if args.no_products else default_products(),
+        "categories": categories,
+    }
+
+
+def gui_options(argv=None):
+    # The GUI scripts' counterpart of receipt_options, from flags in argv (sys.argv by
+    # default): --no-cache, --no-preprocess, --no-trim, --layout, --no-tile,
+    # --no-products and --no-categories. The scripts pass the options on as they
+    # are, so every GUI takes the same flags.
+    from slipscanner.categories import default_categories
+    from slipscanner.llm import default_llm_cache
+    from slipscanner.ocr import DEFAULT_PREPROCESS, DEFAULT_TILING, default_ocr_cache
+    from slipscanner.products import default_products
+
+    argv = sys.argv if argv is None else argv
+    return {
+        # Re-scans of the same photo reuse the cached OCR text and LLM response, --no-cache always re-runs them
+        "ocr_cache": None if "--no-cache" in argv else default_ocr_cache(),
+        "llm_cache": None if "--no-cache" in argv else default_llm_cache(),
+        # Photos are cropped, downscaled, deskewed and thresholded before OCR, --no-preprocess OCRs the raw image
+        "preprocess": None if "--no-preprocess" in argv else DEFAULT_PREPROCESS,
+        # Only the detected item section of the OCR text is sent to the LLM, --no-trim sends all of it
+        "trim": "--no-trim" not in argv,
+        # --layout rebuilds rows from tesseract's word boxes and splits off the right-aligned price column
+        "layout": "--layout" in argv,
+        # Pages taller than ~13cm (long till rolls) are OCR'd as overlapping bands in parallel, --no-tile for one pass
+        "tiling": None if "--no-tile" in argv else DEFAULT_TILING,
+        # Descriptions are resolved against the product names learned with `python -m slipscanner products learn`,
+        # --no-products keeps the LLM's descriptions
+        "products": None if "--no-products" in argv else default_products(),
+        # The category column is filled in by the classifier trained with `python -m slipscanner categories learn`,
+        # --no-categories leaves it empty
+        "categories": None if "--no-categories" in argv else default_categories(),
+    }
+
+
+def gui_ocr(options, show_error):
+    # extract_text_from_image for a GUI script with gui_options' options: a
+    # failure is reported with show_error(title, message) and gives ""
+    from slipscanner.layout import extract_layout_text
+    from slipscanner.ocr import extract_text_from_image
+
+    extract = extract_layout_text if options["layout"] else extract_text_from_image
+
+    def extract_text(image_path):
+        try:
+            return extract(image_path, cache=options["ocr_cache"], preprocess=options["preprocess"],
+                           tiling=options["tiling"])
+        except Exception as e:
+            show_error("OCR Error", f"Failed to extract text from image:\n{e}")
+            return ""
+    return extract_text
+
+
+def run_batch_command(args):
+    from slipscanner.batch import find_images, run_batch
+    from slipscanner.chunking import DEFAULT_CHUNKING
+    from slipscanner.tracing import TraceWriter, format_duration
+
+    if args.pack > 1 and (args.engine == "hybrid" or args.chunk_lines):
+        print("--pack can't be combined with --engine hybrid or --chunk-lines", file=sys.stderr)
+        return 2
+    if args.use_async and (args.engine == "hybrid" or args.chunk_lines or args.pack > 1):
+        print("--async can't be combined with --engine hybrid, --chunk-lines or --pack", file=sys.stderr)
+        return 2
+
+    image_paths = find_images(args.source)
+    if not image_paths:
+        print(f"No receipt images found in {args.source}", file=sys.stderr)
+        return 1
+
+    backend = make_cli_backend(args)
+    trace_writer = TraceWriter(args.metrics) if args.metrics else None
+
+    print(f"Processing {len(image_paths)} images with {args.workers} OCR workers "
+          f"and {args.llm_concurrency} concurrent LLM calls ({args.backend} backend)...")
+    try:
+        if args.use_async:
+            from slipscanner.pipeline import run_pipeline
+
+            stats = run_pipeline(image_paths, args.output, merge=args.merge, backend=backend,
+                                 trace_writer=trace_writer, **receipt_options(args))
+        else:
+            stats = run_batch(image_paths, args.output, merge=args.merge, backend=backend,
+                              engine=args.engine,
+                              unmatched_only=args.unmatched_only,
+                              trace_writer=trace_writer,
+                              chunking=dict(DEFAULT_CHUNKING, max_lines=args.chunk_lines) if args.chunk_lines else None,
+                              pack=max(1, args.pack),
+                              **receipt_options(args))
+    finally:
+        backend.close()
+        if trace_writer is not None:
+            trace_writer.close()
+
+    print(f"Done: {stats['processed']} processed, {len(stats['failed'])} failed "
+          f"in {stats['elapsed']:.1f}s ({stats['images_per_sec']:.2f} images/sec)")
+    if args.engine == "hybrid" and stats["processed"]:
+        print(f"Hybrid engine: {stats['skipped_llm']} of {stats['processed']} receipts "
+              f"({stats['skipped_llm'] / stats['processed']:.0%}) skipped LLM inference")
+    if stats["stages"]:
+        print("Stages (p50/p95): " + ", ".join(
+            f"{stage} {format_duration(s['p50'])}/{format_duration(s['p95'])}" for stage, s in stats["stages"].items()))
+        if "tokens_per_sec" in stats["stages"].get("llm", {}):
+            print(f"LLM generation: {stats['stages']['llm']['tokens_per_sec']:.1f} tokens/sec (median)")
+    if stats["llm_cache"]:
+        print(f"LLM cache: {stats['llm_cache']['hits']} hits, {stats['llm_cache']['misses']} misses")
+    return 1 if stats["failed"] else 0
+
+
+def run_watch_command(args):
+    import signal
+    import threading
+
+    from slipscanner.jobs import JobQueue
+    from slipscanner.tracing import TraceWriter
+    from slipscanner.watch import QUEUE_NAME, run_watch
+
+    if not os.path.isdir(args.folder):
+        print(f"{args.folder} is not a directory", file=sys.stderr)
+        return 1
+
+    queue = JobQueue(args.queue or os.path.join(args.output, QUEUE_NAME), max_attempts=args.max_attempts,
+                     retry_delay=args.retry_delay)
+    if args.retry_failed:
+        queue.retry_failed()
+    counts = queue.counts()
+    if any(counts.values()):
+        print("Resuming: " + ", ".join(f"{count} {state}" for state, count in counts.items()))
+
+    # Ctrl-C or SIGTERM lets the receipts being processed finish, the rest stay queued
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    backend = make_cli_backend(args)
+    trace_writer = TraceWriter(args.metrics) if args.metrics else None
+    print(f"Watching {args.folder} with {args.workers} OCR workers and {args.llm_concurrency} concurrent LLM calls "
+          f"({args.backend} backend), writing to {args.output}. Press Ctrl-C to stop.")
+    try:
+        counts = run_watch(args.folder, args.output, stop, queue=queue, backend=backend, poll=args.poll,
+                           poll_interval=args.poll_interval, trace_writer=trace_writer, **receipt_options(args))
+    except KeyboardInterrupt:
+        counts = queue.counts()
+    finally:
+        backend.close()
+        if trace_writer is not None:
+            trace_writer.close()
+
+    print("Stopped: " + ", ".join(f"{count} {state}" for state, count in counts.items()))
+    for path, error in queue.failures():
+        print(f"  failed: {path}: {error}", file=sys.stderr)
+    return 0
+
+
+def run_products_command(args):
+    from slipscanner.products import ProductDictionary, default_products_path
+
+    products = ProductDictionary(args.path or default_products_path())
+    if args.action == "learn":
+        for path in args.items:
+            print(f"{path}: {products.learn_csv(path)} descriptions")
+        print(f"{len(products)} products in {products.path}")
+    else:
+        for description in args.items:
+            print(f"{description} -> {products.lookup(description) or '(no match)'}")
+    return 0
+
+
+def run_categories_command(args):
+    from slipscanner.categories import CategoryClassifier, default_categories_path
+
+    classifier = CategoryClassifier(args.path or default_categories_path())
+    if args.action == "learn":
+        for path in args.items:
+            print(f"{path}: {classifier.learn_csv(path)} labelled items")
+        print(f"{len(classifier)} categories in {classifier.path}: {', '.join(classifier.categories)}")
+    else:
+        for description, category in zip(args.items, classifier.predict(args.items)):
+            print(f"{description} -> {category or '(unsure)'}")
+    return 0
+
+
+def run_llama_server_command(args):
+    from slipscanner.llama_server import DEFAULT_SOCKET_PATH, serve
+
+    args.socket = args.socket or DEFAULT_SOCKET_PATH
+
+    print(f"Loading {args.model} and listening on {args.socket}...")
+    try:
+        serve(args.model, args.socket)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def run_mock_ollama_command(args):
+    from slipscanner.mock_ollama import MockOllamaServer
+
+    server = MockOllamaServer(args.host, args.port, latency=args.latency, token_latency=args.token_latency,
+                              parallel=args.parallel, prompt_token_latency=args.prompt_token_latency)
+    print(f"Mock Ollama listening on {server.url} (set OLLAMA_HOST={server.url} to use it)...")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def add_receipt_arguments(parser):
+    # Options shared by the batch and watch commands, see receipt_options
+    parser.add_argument("--format", choices=["csv", "jsonl"], default="csv", help="Output file format.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Number of OCR processes (default: number of CPU cores).")
+    parser.add_argument("--llm-concurrency", type=int, default=2,
+                        help="Maximum number of in-flight LLM requests.")
+    parser.add_argument("--backend", choices=BACKENDS, default="ollama",
+                        help="LLM backend: a local Ollama server, llama.cpp, or an in-process mock Ollama server.")
+    parser.add_argument("--model", help="Ollama model name, or the GGUF file for llama-cpp.")
+    parser.add_argument("--mock-latency", type=float, default=0.0,
+                        help="With --backend mock, seconds before the first token.")
+    parser.add_argument("--mock-token-latency", type=float, default=0.0,
+                        help="With --backend mock, seconds per generated token.")
+    parser.add_argument("--mock-prompt-token-latency", type=float, default=0.0,
+                        help="With --backend mock, seconds per prompt token before the first token.")
+    parser.add_argument("--tesseract-cmd", help="Path to the tesseract binary.")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always re-run OCR and the LLM instead of using cached results.")
+    parser.add_argument("--no-preprocess", action="store_true",
+                        help="OCR the raw photo instead of a cropped, deskewed, thresholded copy.")
+    parser.add_argument("--no-trim", action="store_true",
+                        help="Send the whole OCR text to the LLM instead of only the detected item section.")
+    parser.add_argument("--no-tile", action="store_true",
+                        help="OCR tall pages (long till rolls) in one pass instead of overlapping bands.")
+    parser.add_argument("--no-products", action="store_true",
+                        help="Keep the LLM's descriptions instead of resolving them against the learned product "
+                             "dictionary.")
+    parser.add_argument("--no-categories", action="store_true",
+                        help="Leave the category column empty instead of filling it in with the learned classifier.")
+    parser.add_argument("--layout", action="store_true",
+                        help="Use tesseract's word boxes to rebuild rows and split off the right-aligned price column.")
+    parser.add_argument("--metrics",
+                        help="Write per-receipt stage timings and token counts: JSON lines, or Prometheus text if the "
+                             "file name ends in .prom.")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="slipscanner", description="Convert receipt photos to CSV.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    batch = commands.add_parser("batch", help="Process a folder or glob of receipt images without the GUI.")
+    batch.add_argument("source", help="Directory or glob pattern (e.g. 'slips/**/*.jpg') of receipt images.")
+    batch.add_argument("-o", "--output", default="out", help="Output directory for the CSV/JSONL files.")
+    batch.add_argument("--merge", action="store_true",
+                       help="Write a single merged file with a source column instead of one file per receipt.")
+    batch.add_argument("--engine", choices=["llm", "hybrid"], default="llm",
+                       help="'hybrid' parses with the regex parser first and only calls the LLM on low-confidence "
+                            "receipts.")
+    batch.add_argument("--unmatched-only", action="store_true",
+                       help="With --engine hybrid, only send the lines the regex parser couldn't read to the LLM.")
+    batch.add_argument("--chunk-lines", type=int, default=0,
+                       help="Send long receipts as overlapping windows of at most this many lines, parsed "
+                            "concurrently (default: one prompt per receipt).")
+    batch.add_argument("--pack", type=int, default=1,
+                       help="Send this many receipts to the LLM in one prompt, so the instructions are evaluated "
+                            "once per pack instead of once per receipt.")
+    batch.add_argument("--async", dest="use_async", action="store_true",
+                       help="Run OCR, LLM calls and parsing as asyncio stages with bounded queues between them "
+                            "(uses aiohttp for Ollama when installed).")
+    add_receipt_arguments(batch)
+    batch.set_defaults(handler=run_batch_command)
+
+    watch = commands.add_parser("watch", help="Process receipt images as they are dropped into a folder.")
+    watch.add_argument("folder", help="Folder the scanners save receipt images to.")
+    watch.add_argument("-o", "--output", default="out", help="Output directory for the CSV/JSONL files.")
+    watch.add_argument("--queue", help="Job queue file (default: jobs.sqlite3 in the output directory).")
+    watch.add_argument("--poll", action="store_true",
+                       help="Scan the folder every --poll-interval seconds instead of using inotify (e.g. for "
+                            "network shares).")
+    watch.add_argument("--poll-interval", type=float, default=2.0, help="Seconds between scans with --poll.")
+    watch.add_argument("--max-attempts", type=int, default=3, help="Tries per receipt before it's marked failed.")
+    watch.add_argument("--retry-delay", type=float, default=30.0,
+                       help="Seconds before a failed receipt is retried, doubled for every further try.")
+    watch.add_argument("--retry-failed", action="store_true", help="Queue the receipts that failed before again.")
+    add_receipt_arguments(watch)
+    watch.set_defaults(handler=run_watch_command)
+
+    products = commands.add_parser("products", help="Learn product names from exported CSVs, or look one up.")
+    products.add_argument("action", choices=["learn", "lookup"])
+    products.add_argument("items", nargs="+", help="CSV files to learn from, or descriptions to look up.")
+    products.add_argument("--path", help="Product dictionary file (default: products.sqlite3 in the data directory).")
+    products.set_defaults(handler=run_products_command)
+
+    categories = commands.add_parser("categories",
+                                     help="Train the category classifier on labelled CSVs, or categorize descriptions.")
+    categories.add_argument("action", choices=["learn", "predict"])
+    categories.add_argument("items", nargs="+",
+                            help="CSV files with a filled-in category column, or descriptions to categorize.")
+    categories.add_argument("--path", help="Classifier file (default: categories.npz in the data directory).")
+    categories.set_defaults(handler=run_categories_command)
+
+    llama_server = commands.add_parser("llama-server",
+                                       help="Keep a llama.cpp model loaded and share it over a Unix socket.")
+    llama_server.add_argument("--model", default=DEFAULT_LLAMA_MODEL, help="Path to the GGUF model file.")
+    llama_server.add_argument("--socket", default=None, help="Unix socket path to listen on.")
+    llama_server.set_defaults(handler=run_llama_server_command)
+
+    mock_ollama = commands.add_parser("mock-ollama",
+                                      help="Serve a stand-in for Ollama's /api/generate for offline benchmarks.")
+    mock_ollama.add_argument("--host", default="127.0.0.1", help="Address to listen on.")
+    mock_ollama.add_argument("--port", type=int, default=11435, help="Port to listen on.")
+    mock_ollama.add_argument("--latency", type=float, default=0.0, help="Seconds before the first token.")
+    mock_ollama.add_argument("--token-latency", type=float, default=0.0, help="Seconds per generated token.")
+    mock_ollama.add_argument("--prompt-token-latency", type=float, default=0.0,
+                             help="Seconds per prompt token before the first token.")
+    mock_ollama.add_argument("--parallel", type=int, default=4,
+                             help="Requests generated at once, like OLLAMA_NUM_PARALLEL.")
+    mock_ollama.set_defaults(handler=run_mock_ollama_command)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
@@ -0,0 +1,63 @@
+import re
+
+from slipscanner.parsing import PRICE_LINE, extract_items_from_text, item_section
+from slipscanner.tracing import span
+
+# Amounts may group thousands ("1,234.56", "1.234,56", "1 234.56")
+TOTAL_LINE = re.compile(r'^\W*(grand\s+)?total\b.*?(\d{1,3}(?:[,. ]\d{3})+|\d+)[.,](\d{2})\s*[A-Za-z*#]?$',
+                        re.IGNORECASE)
+# "Total Savings 2.00", "Total VAT 11.02", ... aren't what was paid
+NOT_TOTAL = re.compile(r'^\W*total\W+(savings?|saved|discounts?|tax|vat|items?|qty|quantity|points)\b', re.IGNORECASE)
+DEFAULT_CONFIDENCE_THRESHOLD = 0.9
+TOTAL_TOLERANCE = 0.011  # rounding on per-line prices
+
+
+def detect_total(text):
+    # The grand total if there is one, otherwise the last total line: a total
+    # printed earlier is usually one before discounts or of part of the items
+    total = None
+    for line in text.split('\n'):
+        match = TOTAL_LINE.search(line.strip())
+        if match and not NOT_TOTAL.search(line.strip()):
+            units = re.sub(r'\D', '', match.group(2))
+            total = float(f"{units}.{match.group(3)}")
+            if match.group(1):
+                return total
+    return total
+
+
+def unmatched_lines(section):
+    return [line for line in section.split('\n') if line.strip() and not PRICE_LINE.search(line.strip())]
+
+
+def score_regex_parse(ocr_text, section, items):
+    # 1.0 when the regex prices add up to the receipt's TOTAL line. Without that
+    # agreement the score is the share of item-section lines the regex matched,
+    # halved, because lines it can't see may still hide items.
+    if not items:
+        return 0.0
+    total = detect_total(ocr_text)
+    if total is not None and abs(sum(item.price for item in items) - total) <= TOTAL_TOLERANCE:
+        return 1.0
+    section_lines = [line for line in section.split('\n') if line.strip()]
+    return 0.5 * len(items) / max(len(section_lines), 1)
+
+
+def parse_hybrid(ocr_text, parse_with_llm, threshold=DEFAULT_CONFIDENCE_THRESHOLD, unmatched_only=False):
+    # Runs the zero-cost regex parser first and only calls parse_with_llm(text)
+    # for receipts it isn't confident about. With unmatched_only, just the lines
+    # the regex couldn't read are sent and the results are appended to its items.
+    # Returns (items, used_llm).
+    with span("regex") as record:
+        section = item_section(ocr_text)
+        items = extract_items_from_text(section)
+        confidence = score_regex_parse(ocr_text, section, items)
+        if record is not None:
+            record["confidence"] = confidence
+    if confidence >= threshold:
+        return items, False
+
+    leftover = unmatched_lines(section)
+    if unmatched_only and items and leftover:
+        return items + parse_with_llm('\n'.join(leftover)), True
+    return parse_with_llm(section), True
@@ -0,0 +1,88 @@
+import csv
+import io
+import json
+import os
+import threading
+
+COLUMNS = ["description", "category", "units", "price"]
+
+
+# --- Row model ---
+# A receipt can have hundreds of items and a batch thousands of receipts, so
+# items are plain slotted objects rather than DataFrame rows.
+class LineItem:
+    __slots__ = ("description", "category", "units", "price")
+
+    def __init__(self, description, price=0, category="", units=""):
+        self.description = description
+        self.category = category
+        self.units = units
+        self.price = price
+
+    @classmethod
+    def from_parsed(cls, item):
+        return cls(item.get("description", ""), item.get("price", 0))
+
+    def as_row(self):
+        return [self.description, self.category, self.units, self.price]
+
+    def __eq__(self, other):
+        return isinstance(other, LineItem) and self.as_row() == other.as_row()
+
+    def __repr__(self):
+        return f"LineItem({self.description!r}, {self.price!r}, category={self.category!r}, units={self.units!r})"
+
+
+def items_from_parsed(parsed):
+    return [LineItem.from_parsed(item) for item in parsed if isinstance(item, dict)]
+
+
+def csv_line(row):
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerow(row)
+    return buffer.getvalue()
+
+
+# --- Streaming writers ---
+# Appends rows to a .csv or .jsonl file as they are produced, flushing each one
+# so a crashed batch keeps everything written so far. Safe to share between threads.
+class ItemWriter:
+    def __init__(self, path, extra_columns=()):
+        self.path = path
+        self.extra_columns = list(extra_columns)
+        self.columns = self.extra_columns + COLUMNS
+        self.jsonl = path.lower().endswith(".jsonl")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        if not self.jsonl:
+            self._csv = csv.writer(self._file)
+            self._csv.writerow(self.columns)
+
+    def write(self, item, **extra):
+        values = [extra.get(column, "") for column in self.extra_columns] + item.as_row()
+        with self._lock:
+            if self.jsonl:
+                self._file.write(json.dumps(dict(zip(self.columns, values))) + "\n")
+            else:
+                self._csv.writerow(values)
+            self._file.flush()
+
+    def write_all(self, items, **extra):
+        for item in items:
+            self.write(item, **extra)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_items(path, items):
+    with ItemWriter(path) as writer:
+        writer.write_all(items)
@@ -0,0 +1,146 @@
+import os
+import sqlite3
+import time
+
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 30  # seconds before the first retry, doubled for every further one
+
+STATES = ("pending", "running", "done", "failed")
+
+
+# --- Durable job queue ---
+# One row per receipt image in a SQLite file next to the output, so a restarted
+# watcher picks up where it stopped: finished receipts stay done, receipts that
+# were being processed when it died are pending again. A file that changes
+# (same name, new size or modification time) is queued again. Like DiskCache,
+# every operation opens its own connection, so one instance can be shared by
+# threads.
+class JobQueue:
+    def __init__(self, path, max_attempts=MAX_ATTEMPTS, retry_delay=RETRY_DELAY):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._initialized = False
+
+    def _connect(self):
+        if not self._initialized:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Autocommit, transactions are started explicitly where a read and a write must be atomic
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime INTEGER NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                not_before REAL NOT NULL DEFAULT 0,
+                error TEXT,
+                output TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, not_before)")
+            self._initialized = True
+        return conn
+
+    def enqueue(self, path):
+        # True if path is new or changed since it was last queued
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return False
+        now = time.time()
+        conn = self._connect()
+        try:
+            cursor = conn.execute("""INSERT INTO jobs (path, size, mtime, state, created_at, updated_at)
+                                     VALUES (?, ?, ?, 'pending', ?, ?)
+                                     ON CONFLICT(path) DO UPDATE SET
+                                         size = excluded.size, mtime = excluded.mtime, state = 'pending',
+                                         attempts = 0, not_before = 0, error = NULL, updated_at = excluded.updated_at
+                                     WHERE size != excluded.size OR mtime != excluded.mtime""",
+                                  (os.path.abspath(path), st.st_size, st.st_mtime_ns, now, now))
+            return cursor.rowcount > 0
+        finally:
+            conn.close()
+
+    def claim(self):
+        # Marks the oldest pending job that's due as running and returns its path, or None
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("""SELECT path FROM jobs WHERE state = 'pending' AND not_before <= ?
+                                  ORDER BY created_at LIMIT 1""", (now,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE jobs SET state = 'running', updated_at = ? WHERE path = ?", (now, row[0]))
+            conn.execute("COMMIT")
+            return row[0] if row else None
+        finally:
+            conn.close()
+
+    def complete(self, path, output):
+        self._update("UPDATE jobs SET state = 'done', output = ?, error = NULL, updated_at = ? "
+                     "WHERE path = ? AND state = 'running'", (output, time.time(), path))
+
+    def fail(self, path, error):
+        # Retried after retry_delay, 2 * retry_delay, ... until max_attempts, then failed for good.
+        # Returns True if the job will be retried.
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT attempts FROM jobs WHERE path = ? AND state = 'running'", (path,)).fetchone()
+            retry = False
+            if row is not None:
+                attempts = row[0] + 1
+                retry = attempts < self.max_attempts
+                conn.execute("UPDATE jobs SET state = ?, attempts = ?, not_before = ?, error = ?, updated_at = ? "
+                             "WHERE path = ?", ("pending" if retry else "failed", attempts,
+                                                now + self.retry_delay * 2 ** (attempts - 1), str(error), now, path))
+            conn.execute("COMMIT")
+            return retry
+        finally:
+            conn.close()
+
+    def recover(self):
+        # Jobs left running by a process that died are pending again, returns how many
+        return self._update("UPDATE jobs SET state = 'pending', updated_at = ? WHERE state = 'running'",
+                            (time.time(),))
+
+    def retry_failed(self):
+        return self._update("UPDATE jobs SET state = 'pending', attempts = 0, not_before = 0, updated_at = ? "
+                            "WHERE state = 'failed'", (time.time(),))
+
+    def _update(self, sql, params):
+        conn = self._connect()
+        try:
+            return conn.execute(sql, params).rowcount
+        finally:
+            conn.close()
+
+    def output_owner(self, output):
+        # The image whose output this is (or will be again once it's reprocessed), or None
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT path FROM jobs WHERE output = ?", (output,)).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else None
+
+    def counts(self):
+        conn = self._connect()
+        try:
+            counts = dict(conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+        finally:
+            conn.close()
+        return {state: counts.get(state, 0) for state in STATES}
+
+    def failures(self):
+        # [(path, error)] of the jobs that failed for good
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT path, error FROM jobs WHERE state = 'failed' ORDER BY path").fetchall()
+        finally:
+            conn.close()
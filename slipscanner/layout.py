@@ -0,0 +1,78 @@
+import re
+import statistics
+
+from slipscanner.ocr import extract_words_from_image
+
+PRICE_TOKEN = re.compile(r'^[R$€£]?(\d{1,5})[.,](\d{2})[A-Za-z*#]?$')
+FLAG_TOKEN = re.compile(r'^[A-Za-z*#]$')  # VAT/tax markers printed after the price
+COLUMN_TOLERANCE = 0.08  # of the page width
+
+
+# --- Rows from word boxes ---
+def group_rows(words):
+    # Words whose vertical centres are within half a typical word height of
+    # the row's centre belong to the same printed line
+    if not words:
+        return []
+    line_height = statistics.median(word["height"] for word in words) or 1
+    rows = []
+    for word in sorted(words, key=lambda w: w["top"] + w["height"] / 2):
+        center = word["top"] + word["height"] / 2
+        if rows and abs(center - rows[-1]["center"]) <= line_height / 2:
+            row = rows[-1]
+            row["words"].append(word)
+            row["center"] += (center - row["center"]) / len(row["words"])
+        else:
+            rows.append({"center": center, "words": [word]})
+    return [sorted(row["words"], key=lambda w: w["left"]) for row in rows]
+
+
+def _price_candidate(row):
+    # Index of the row's last token if it looks like a price, skipping a lone VAT flag
+    index = len(row) - 1
+    if index > 0 and FLAG_TOKEN.match(row[index]["text"]):
+        index -= 1
+    return index if PRICE_TOKEN.match(row[index]["text"]) else None
+
+
+def split_price_column(rows, page_width=None):
+    # The price column is where the right edges of trailing price-like tokens
+    # line up; a number that ends well left of it (e.g. "@ 20.00/kg") isn't a price
+    candidates = [(row, _price_candidate(row)) for row in rows]
+    right_edges = [row[i]["left"] + row[i]["width"] for row, i in candidates if i is not None]
+    if right_edges:
+        page_width = page_width or max(w["left"] + w["width"] for row in rows for w in row)
+        column_right = statistics.median(right_edges)
+        tolerance = COLUMN_TOLERANCE * page_width
+
+    structured = []
+    for row, index in candidates:
+        price = None
+        words = row
+        if index is not None and abs(row[index]["left"] + row[index]["width"] - column_right) <= tolerance:
+            match = PRICE_TOKEN.match(row[index]["text"])
+            price = f"{int(match.group(1))}.{match.group(2)}"
+            words = row[:index]
+        structured.append({
+            "description": " ".join(word["text"] for word in words),
+            "price": price,
+            "conf": min(word["conf"] for word in row),
+        })
+    return structured
+
+
+def rows_to_text(rows):
+    # Compact "description  price" lines, the format the regex parser and prompts already expect
+    lines = []
+    for row in rows:
+        if row["price"] is not None:
+            lines.append(f"{row['description']}  {row['price']}".strip())
+        elif row["description"]:
+            lines.append(row["description"])
+    return "\n".join(lines)
+
+
+def extract_layout_text(image_path, cache=None, lang=None, config="", preprocess=None, tiling=None):
+    words = extract_words_from_image(image_path, cache=cache, lang=lang, config=config, preprocess=preprocess,
+                                     tiling=tiling)
+    return rows_to_text(split_price_column(group_rows(words)))
@@ -0,0 +1,197 @@
+import functools
+import json
+import os
+import socket
+import socketserver
+import stat
+import tempfile
+import threading
+
+DEFAULT_LLAMA_MODEL = "models/phi-2.Q4_K_M.gguf"
+# Without a per-user runtime directory the socket goes in a directory of our own
+# under the shared temp dir, which nobody else can put a socket into
+PRIVATE_SOCKET_DIR = os.path.join(tempfile.gettempdir(), f"slipscanner-{getattr(os, 'getuid', lambda: 0)()}")
+DEFAULT_SOCKET_PATH = (os.environ.get("SLIPSCANNER_LLAMA_SOCKET")
+                       or os.path.join(os.environ.get("XDG_RUNTIME_DIR") or PRIVATE_SOCKET_DIR,
+                                       "slipscanner-llama.sock"))
+
+
+def owned(st):
+    return not hasattr(os, "getuid") or st.st_uid == os.getuid()
+
+
+def private_socket_dir_ok(socket_path, create=False):
+    # False if socket_path is in PRIVATE_SOCKET_DIR and that isn't a 0700
+    # directory of ours (someone else made it first). Other locations are the
+    # user's choice and aren't checked.
+    folder = os.path.dirname(socket_path)
+    if folder != PRIVATE_SOCKET_DIR:
+        return True
+    if create:
+        try:
+            os.mkdir(folder, 0o700)
+        except FileExistsError:
+            pass
+    try:
+        st = os.lstat(folder)
+    except FileNotFoundError:
+        return False
+    return stat.S_ISDIR(st.st_mode) and owned(st) and stat.S_IMODE(st.st_mode) == 0o700
+
+
+def load_llama(model_path, **llama_kwargs):
+    from llama_cpp import Llama
+    return Llama(model_path=model_path, **llama_kwargs)
+
+
+@functools.lru_cache(maxsize=8)
+def _compile_grammar(gbnf):
+    from llama_cpp import LlamaGrammar
+    return LlamaGrammar.from_string(gbnf, verbose=False)
+
+
+def compile_options(options):
+    # A grammar travels as GBNF text (it has to cross the socket as JSON) and
+    # is compiled once per process where the model actually runs
+    if isinstance(options.get("grammar"), str):
+        options = dict(options, grammar=_compile_grammar(options["grammar"]))
+    return options
+
+
+# --- Server ---
+# Keeps one copy of the GGUF weights mapped and answers newline-delimited JSON
+# requests ({"prompt", "options"} -> {"output"} or {"error"}) over a Unix socket.
+# options are llama_cpp call arguments, with "grammar" given as GBNF text.
+class LlamaRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                # llama.cpp contexts aren't thread-safe, requests take turns
+                with self.server.model_lock:
+                    reply = {"output": self.server.llm(request["prompt"], **compile_options(request.get("options", {})))}
+            except Exception as e:
+                reply = {"error": str(e)}
+            self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+
+
+class LlamaServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, llm, socket_path=DEFAULT_SOCKET_PATH):
+        self.llm = llm
+        self.model_lock = threading.Lock()
+        self.socket_path = socket_path
+        if not private_socket_dir_ok(socket_path, create=True):
+            raise RuntimeError(f"{os.path.dirname(socket_path)} isn't a private directory of this user")
+        if os.path.lexists(socket_path):
+            if server_is_running(socket_path):
+                raise RuntimeError(f"A llama server is already listening on {socket_path}")
+            st = os.lstat(socket_path)
+            if not (stat.S_ISSOCK(st.st_mode) and owned(st)):
+                raise RuntimeError(f"{socket_path} exists and isn't a socket of this user, not replacing it")
+            os.unlink(socket_path)  # left behind by a server that didn't shut down cleanly
+        super().__init__(socket_path, LlamaRequestHandler)
+        st = os.lstat(socket_path)
+        self._socket_id = (st.st_dev, st.st_ino)
+
+    def server_close(self):
+        super().server_close()
+        # Only our own socket, not one a newer server has bound in its place
+        try:
+            st = os.lstat(self.socket_path)
+        except FileNotFoundError:
+            return
+        if (st.st_dev, st.st_ino) == self._socket_id:
+            os.unlink(self.socket_path)
+
+
+def server_is_running(socket_path=DEFAULT_SOCKET_PATH):
+    if not hasattr(socket, "AF_UNIX"):
+        return False
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            return False
+    return True
+
+
+def serve(model_path, socket_path=DEFAULT_SOCKET_PATH, **llama_kwargs):
+    server = LlamaServer(load_llama(model_path, **llama_kwargs), socket_path)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+# --- Client ---
+# Drop-in for a llama_cpp.Llama instance: uses the shared server when one is
+# running and otherwise loads the model into this process on first use.
+class LazyLlama:
+    def __init__(self, model_path, socket_path=DEFAULT_SOCKET_PATH, **llama_kwargs):
+        self.model_path = model_path
+        self.socket_path = socket_path
+        self.llama_kwargs = llama_kwargs
+        self._local_llm = None
+        self._load_lock = threading.Lock()
+        self._call_lock = threading.Lock()  # llama.cpp contexts aren't thread-safe
+
+    def __call__(self, prompt, **options):
+        if self._local_llm is None:
+            output = self._call_server(prompt, options)
+            if output is not None:
+                return output
+        llm = self._local()
+        with self._call_lock:
+            return llm(prompt, **compile_options(options))
+
+    def call_with_state(self, prompt, state=None, **options):
+        # -> (output, state) for a conversation: state is a llama_cpp.LlamaState
+        # saved after the previous turn, restored first so only the part of
+        # prompt past it is evaluated. The shared server keeps no per-caller
+        # state (None), though llama.cpp still skips the prefix it evaluated last.
+        if self._local_llm is None:
+            output = self._call_server(prompt, options)
+            if output is not None:
+                return output, None
+        llm = self._local()
+        with self._call_lock:
+            if state is not None:
+                llm.load_state(state)
+            output = llm(prompt, **compile_options(options))
+            return output, llm.save_state()
+
+    def warm_up(self):
+        # Loads the weights ahead of the first prompt unless a server already has them
+        if self._local_llm is None and not server_is_running(self.socket_path):
+            self._local()
+
+    def _call_server(self, prompt, options):
+        # Receipts are only sent to a socket in a directory nobody else could have put it in
+        if not hasattr(socket, "AF_UNIX") or not private_socket_dir_ok(self.socket_path):
+            return None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            return None
+
+        try:
+            with sock, sock.makefile("rwb") as stream:
+                stream.write(json.dumps({"prompt": prompt, "options": options}).encode("utf-8") + b"\n")
+                stream.flush()
+                reply = json.loads(stream.readline())
+        except (OSError, ValueError):
+            # The server went away mid-request (empty or cut-off reply), answer in-process instead
+            return None
+        if "error" in reply:
+            raise RuntimeError(reply["error"])
+        return reply["output"]
+
+    def _local(self):
+        with self._load_lock:
+            if self._local_llm is None:
+                self._local_llm = load_llama(self.model_path, **self.llama_kwargs)
+            return self._local_llm
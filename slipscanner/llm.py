@@ -0,0 +1,253 @@
+import hashlib
+import json
+import os
+import re
+
+from slipscanner.backends import OllamaBackend, default_backend
+from slipscanner.cache import DiskCache, default_cache_dir, hash_key
+from slipscanner.ollama import DEFAULT_MODEL
+from slipscanner.tracing import annotate
+
+LLM_CACHE_MAX_BYTES = 32 * 1024 * 1024
+LLM_CACHE_TTL = 7 * 24 * 60 * 60
+
+
+def estimate_tokens(text):
+    # Rough count for English text with typical BPE tokenizers
+    return len(text) // 4
+
+
+# --- Prompt Template ---
+# complete_words=False leaves truncated words to a products.ProductDictionary
+def generate_prompt(text, complete_words=True):
+    completion = ('Where possible, complete truncated words, such as "tyaki" to "Teriyaki" and "Chick" to "Chicken"\n'
+                  if complete_words else "")
+    return f"""
+You are a receipt parser. The input text is from pytesseract OCR scanner.
+The receipt likely contains logos and shop information which you can ignore, isolate the line item section first.
+Cleanup and extract line items from the text below. Output as JSON array.
+Each item should have: description, price (as float).
+There could be multiple items with the same values, dont try to merge them.
+Ensure that the final line item count matches the original count.
+{completion}
+Text:
+{text}
+
+Output:
+"""
+
+
+def generate_packed_prompt(texts):
+    # One prompt for several receipts. The instructions are paid for once and
+    # each receipt is tagged with its id (R1, R2, ...) so the answer can be split back.
+    sections = "\n\n".join(f"### {receipt_id}\n{text}" for receipt_id, text in zip(packed_ids(len(texts)), texts))
+    return f"""
+You are a receipt parser. The input text is from pytesseract OCR scanner.
+Below are several receipts, each starting with a "### <id>" line. They are separate purchases, never mix their items.
+Cleanup and extract the line items of every receipt. Output as a JSON object that maps each receipt id to its JSON array of items.
+Each item should have: description, price (as float).
+There could be multiple items with the same values, dont try to merge them.
+Ensure that each receipt's line item count matches the original count.
+Where possible, complete truncated words, such as "tyaki" to "Teriyaki" and "Chick" to "Chicken"
+
+Receipts:
+{sections}
+
+Output:
+"""
+
+
+def packed_ids(count):
+    return [f"R{i + 1}" for i in range(count)]
+
+
+# --- Response cache ---
+def default_llm_cache():
+    return DiskCache(os.path.join(default_cache_dir(), "llm.sqlite3"), max_bytes=LLM_CACHE_MAX_BYTES, ttl=LLM_CACHE_TTL)
+
+
+def llm_cache_key(model, prompt, options, format=None):
+    return hash_key(model, hashlib.sha256(prompt.encode("utf-8")).hexdigest(), sorted((options or {}).items()),
+                    json.dumps(format, sort_keys=True))
+
+
+def memoize_llm_call(cache, model, prompt, options, call, format=None, valid=None):
+    # Identical prompt + model + sampling options (+ output format) is answered from disk without inference.
+    # valid(response) False keeps an answer (e.g. one cut off by the token cap) out of the cache.
+    if cache is None:
+        return call()
+
+    key = llm_cache_key(model, prompt, options, format)
+    response = cache.get(key)
+    if response is not None and (valid is None or valid(response)):
+        annotate(cached=True)
+        return response
+
+    response = call()
+    if response and (valid is None or valid(response)):
+        cache.set(key, response)
+    return response
+
+
+# --- Completion ---
+# backend: any backends.LLMBackend, the default is the local Ollama server
+def complete(prompt, backend=None, options=None, format=None, cache=None, valid=None):
+    backend = backend or default_backend()
+    return memoize_llm_call(cache, backend.name, prompt, options,
+                            lambda: backend.generate(prompt, options=options, format=format), format=format,
+                            valid=valid)
+
+
+async def acomplete(prompt, backend=None, options=None, format=None, cache=None, valid=None):
+    # complete for asyncio code, the backend's agenerate doesn't block the event loop
+    backend = backend or default_backend()
+    key = llm_cache_key(backend.name, prompt, options, format) if cache is not None else None
+    if key is not None:
+        response = cache.get(key)
+        if response is not None and (valid is None or valid(response)):
+            annotate(cached=True)
+            return response
+
+    response = await backend.agenerate(prompt, options=options, format=format)
+    if key is not None and response and (valid is None or valid(response)):
+        cache.set(key, response)
+    return response
+
+
+def stream_completion(prompt, backend=None, options=None, format=None, cache=None):
+    # Yields response fragments as the backend delivers them
+    backend = backend or default_backend()
+    key = llm_cache_key(backend.name, prompt, options, format)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            annotate(cached=True)
+            yield cached
+            return
+
+    chunks = []
+    for chunk in backend.stream(prompt, options=options, format=format):
+        chunks.append(chunk)
+        yield chunk
+
+    response_text = "".join(chunks).strip()
+    if cache is not None and response_text:
+        cache.set(key, response_text)
+
+
+def call_ollama(prompt, model=DEFAULT_MODEL, timeout=60, options=None, cache=None, client=None, format=None):
+    return complete(prompt, OllamaBackend(model, client=client, timeout=timeout), options=options, format=format,
+                    cache=cache)
+
+
+def stream_ollama(prompt, model=DEFAULT_MODEL, timeout=60, options=None, cache=None, client=None, format=None):
+    yield from stream_completion(prompt, OllamaBackend(model, client=client, timeout=timeout), options=options,
+                                 format=format, cache=cache)
+
+
+# --- JSON Parse ---
+def safe_json_parse(response):
+    # Schema-constrained output is already valid, only free-form output needs repairs
+    try:
+        parsed = json.loads(response)
+        if isinstance(parsed, list):
+            return parsed
+    except ValueError:
+        pass
+
+    # Find JSON array using regex
+    match = re.search(r'(\[\s*{.*?}\s*\])', response, re.DOTALL)
+    if not match:
+        raise ValueError("No JSON array found in response.")
+
+    # Fix common LLM issues
+    cleaned = match.group(1).strip()
+    cleaned = re.sub(r',\s*([\]}])', r'\1', cleaned)
+    cleaned = re.sub(r'"\s*,\s*"', '", "', cleaned)
+
+    return json.loads(cleaned)
+
+
+def parses(response):
+    # True if safe_json_parse can read an item array from response
+    try:
+        safe_json_parse(response)
+    except ValueError:
+        return False
+    return True
+
+
+def split_packed_response(response, receipt_ids):
+    # {"R1": [...], "R2": [...]} -> one item list per id, None for a receipt the
+    # answer left out or garbled so the caller can retry it on its own
+    try:
+        parsed = json.loads(response)
+    except ValueError:
+        parsed = {}
+        for receipt_id in receipt_ids:
+            match = re.search(r'"%s"\s*:\s*(\[.*?\])\s*[,}]' % re.escape(receipt_id), response, re.DOTALL)
+            if match:
+                try:
+                    parsed[receipt_id] = safe_json_parse(match.group(1))
+                except ValueError:
+                    pass
+    if not isinstance(parsed, dict):
+        parsed = {}
+    return [parsed.get(receipt_id) if isinstance(parsed.get(receipt_id), list) else None
+            for receipt_id in receipt_ids]
+
+
+# --- Incremental JSON Parse ---
+class JSONItemStream:
+    # Scans streamed LLM output and returns every top-level {...} object as
+    # soon as its closing brace arrives, without waiting for the whole array.
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.current = []
+        self.skipped = 0  # objects that still weren't valid JSON after cleanup
+
+    def feed(self, chunk):
+        items = []
+        for char in chunk:
+            if self.depth == 0:
+                if char == "{":
+                    self.depth = 1
+                    self.current = [char]
+                continue
+
+            self.current.append(char)
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == "{":
+                self.depth += 1
+            elif char == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    item = self._parse("".join(self.current))
+                    if item is not None:
+                        items.append(item)
+        return items
+
+    def _parse(self, text):
+        cleaned = re.sub(r',\s*([\]}])', r'\1', text)
+        try:
+            item = json.loads(cleaned)
+        except ValueError:
+            self.skipped += 1
+            return None
+        return item if isinstance(item, dict) else None
+
+
+def iter_json_items(chunks):
+    parser = JSONItemStream()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
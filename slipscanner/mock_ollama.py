@@ -0,0 +1,184 @@
+import itertools
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from slipscanner.parsing import extract_items_from_text, item_section
+
+CHARS_PER_TOKEN = 4
+MAX_CONVERSATIONS = 256  # contexts the mock remembers, oldest forgotten first
+PROMPT_TEXT = re.compile(r"Text:\s*\n(.*?)\n\s*Output:", re.DOTALL)
+PACKED_TEXT = re.compile(r"Receipts:\s*\n(.*?)\n\s*Output:", re.DOTALL)
+RECEIPT_TAG = re.compile(r"^### (\S+)$", re.MULTILINE)
+
+
+def receipt_items(text):
+    return [{"description": item.description, "price": item.price}
+            for item in extract_items_from_text(item_section(text))]
+
+
+def items_response(request):
+    # Answers like a well-behaved model: the regex parser's reading of the
+    # receipt in the prompt, as a compact JSON item array, or for a packed
+    # prompt an object with one array per receipt id
+    prompt = request.get("prompt", "")
+    packed = PACKED_TEXT.search(prompt)
+    if packed:
+        parts = RECEIPT_TAG.split(packed.group(1))[1:]
+        answer = {receipt_id: receipt_items(text) for receipt_id, text in zip(parts[::2], parts[1::2])}
+    else:
+        match = PROMPT_TEXT.search(prompt)
+        answer = receipt_items(match.group(1) if match else prompt)
+    return json.dumps(answer, separators=(",", ":"))
+
+
+def split_tokens(text):
+    return [text[i:i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)]
+
+
+# --- Mock Ollama server ---
+# Speaks Ollama's /api/generate wire format (JSON, or NDJSON when streaming)
+# so throughput and concurrency can be measured without a model.
+#   latency:              seconds before the first token (per request)
+#   prompt_token_latency: seconds per prompt token, added to latency (prefill)
+#   token_latency:        seconds per generated token
+#   parallel:             requests generated at once, like OLLAMA_NUM_PARALLEL;
+#                         the rest wait for a slot
+#   respond:              request dict -> response text
+# Answers carry a context like Ollama's. A request that passes it back only
+# pays prefill for its own prompt, but is answered with the whole conversation.
+class MockOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # allows keep-alive
+    disable_nagle_algorithm = True  # otherwise delayed ACKs add ~40ms to every reused connection
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path != "/api/generate":
+            self._send_json(404, {"error": f"unknown endpoint {self.path}"})
+            return
+        try:
+            request = json.loads(body)
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        server = self.server
+        start = time.perf_counter()
+        conversation = server.conversation(request.get("context")) + request.get("prompt", "")
+        with server.slots:
+            queued = time.perf_counter() - start
+            tokens = split_tokens(server.respond(dict(request, prompt=conversation)))
+            num_predict = (request.get("options") or {}).get("num_predict")
+            done_reason = "stop"
+            if num_predict is not None and 0 <= num_predict < len(tokens):
+                tokens = tokens[:num_predict]
+                done_reason = "length"
+
+            prompt_tokens = len(request.get("prompt", "")) // CHARS_PER_TOKEN
+            prompt_eval_duration = server.latency + server.prompt_token_latency * prompt_tokens
+            time.sleep(prompt_eval_duration)
+            eval_start = time.perf_counter()
+            if request.get("stream", True):
+                try:
+                    self._stream(request, tokens)
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+                    return  # client went away mid-stream, Ollama stops generating too
+            else:
+                time.sleep(server.token_latency * len(tokens))
+            eval_duration = time.perf_counter() - eval_start
+
+        with server.stats_lock:
+            server.requests += 1
+
+        final = {
+            "model": request.get("model", ""),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "response": "" if request.get("stream", True) else "".join(tokens),
+            "done": True,
+            "done_reason": done_reason,
+            "total_duration": int((time.perf_counter() - start) * 1e9),
+            "load_duration": int(queued * 1e9),
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(prompt_eval_duration * 1e9),
+            "eval_count": len(tokens),
+            "eval_duration": int(eval_duration * 1e9),
+            "context": server.save_conversation(conversation + "\n" + "".join(tokens) + "\n\n"),
+        }
+        if request.get("stream", True):
+            self._write_chunk(json.dumps(final).encode("utf-8") + b"\n")
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            self._send_json(200, final)
+
+    def _stream(self, request, tokens):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for token in tokens:
+            time.sleep(self.server.token_latency)
+            message = {"model": request.get("model", ""), "response": token, "done": False}
+            self._write_chunk(json.dumps(message).encode("utf-8") + b"\n")
+
+    def _write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _send_json(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, token_latency=0.0, parallel=4,
+                 respond=items_response, prompt_token_latency=0.0):
+        self.latency = latency
+        self.prompt_token_latency = prompt_token_latency
+        self.token_latency = token_latency
+        self.slots = threading.BoundedSemaphore(parallel)
+        self.respond = respond
+        self.requests = 0
+        self.stats_lock = threading.Lock()
+        self.conversations = {}
+        self._context_ids = itertools.count(1)
+        super().__init__((host, port), MockOllamaHandler)
+
+    def conversation(self, context):
+        # Text of the conversation a context came from, "" for an unknown one
+        with self.stats_lock:
+            return self.conversations.get(context[0], "") if context else ""
+
+    def save_conversation(self, text):
+        # A one-token stand-in for the real context tokens
+        with self.stats_lock:
+            context_id = next(self._context_ids)
+            self.conversations[context_id] = text
+            if len(self.conversations) > MAX_CONVERSATIONS:
+                del self.conversations[next(iter(self.conversations))]
+        return [context_id]
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        # Serves from a daemon thread, for use inside a benchmark or test process
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,163 @@
+import functools
+import hashlib
+import json
+import os
+import sys
+
+from slipscanner.cache import DiskCache, default_cache_dir, hash_key
+from slipscanner.tracing import annotate, span
+
+# Homebrew installs tesseract outside the PATH that macOS GUI apps get
+HOMEBREW_TESSERACT = "/opt/homebrew/bin/tesseract"
+OCR_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Options for preprocess.preprocess_image. Receipt paper is ~80mm wide and
+# tesseract reads best at ~300 DPI, so a 12MP phone photo carries several
+# times more pixels than OCR needs.
+DEFAULT_PREPROCESS = {
+    "target_dpi": 300,
+    "receipt_width_mm": 80,
+    "crop": True,
+    "deskew": True,
+    "threshold": True,
+}
+
+# Options for tiling.tiled_words, used on pages taller than a band. A till-roll
+# line is ~35px at 300 DPI, so a band holds ~45 lines and the overlap ~4 lines,
+# every line is whole in at least one band. workers is how many bands are OCR'd
+# at once, None for one per CPU core.
+DEFAULT_TILING = {
+    "band_height": 1600,
+    "overlap": 160,
+    "workers": None,
+}
+
+_tesseract_cmd = None
+
+
+def configure_tesseract(tesseract_cmd=None):
+    global _tesseract_cmd
+    tesseract_cmd = tesseract_cmd or os.environ.get("TESSERACT_CMD")
+    if not tesseract_cmd and os.path.exists(HOMEBREW_TESSERACT):
+        tesseract_cmd = HOMEBREW_TESSERACT
+    if tesseract_cmd:
+        _tesseract_cmd = tesseract_cmd
+        if "pytesseract" in sys.modules:
+            sys.modules["pytesseract"].pytesseract.tesseract_cmd = tesseract_cmd
+
+
+def load_pytesseract():
+    # Imported on first use: pytesseract pulls in pandas and numpy when they're
+    # installed, which adds the better part of a second to startup
+    import pytesseract
+    if _tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = _tesseract_cmd
+    return pytesseract
+
+
+@functools.lru_cache(maxsize=None)
+def _tesseract_version(tesseract_cmd):
+    return str(load_pytesseract().get_tesseract_version())
+
+
+def tesseract_version():
+    return _tesseract_version(load_pytesseract().pytesseract.tesseract_cmd)
+
+
+def default_ocr_cache():
+    return DiskCache(os.path.join(default_cache_dir(), "ocr.sqlite3"), max_bytes=OCR_CACHE_MAX_BYTES)
+
+
+def _run_cached_ocr(image_path, cache, mode, lang, config, preprocess, run, tiling=None):
+    with span("ocr", mode=mode):
+        return _ocr(image_path, cache, mode, lang, config, preprocess, run, tiling)
+
+
+def _ocr(image_path, cache, mode, lang, config, preprocess, run, tiling=None):
+    # preprocess: options for preprocess_image (e.g. DEFAULT_PREPROCESS), None OCRs the raw image
+    # tiling: options for tiling.tiled_words (e.g. DEFAULT_TILING), None OCRs each page in one piece
+    # run: list of page images -> result
+    with open(image_path, "rb") as f:
+        image_bytes = f.read()
+
+    # Same photo + same tesseract build/settings always gives the same result.
+    # How many threads OCR the tiles doesn't change it, so workers isn't part of the key.
+    key = None
+    if cache is not None:
+        tiling_key = [sorted((k, v) for k, v in tiling.items() if k != "workers")] if tiling else []
+        key = hash_key(hashlib.sha256(image_bytes).hexdigest(), tesseract_version(), mode, lang, config,
+                       sorted((preprocess or {}).items()), *tiling_key)
+        result = cache.get(key)
+        if result is not None:
+            annotate(cached=True)
+            return result
+
+    from slipscanner.tiling import open_pages
+
+    pages = open_pages(image_bytes)
+    if preprocess is not None:
+        from slipscanner.preprocess import preprocess_image
+        pages = [preprocess_image(page, **preprocess) for page in pages]
+    if len(pages) > 1:
+        annotate(pages=len(pages))
+    result = run(pages)
+
+    if cache is not None:
+        cache.set(key, result)
+    return result
+
+
+def _read_words(img, lang, config):
+    # Word boxes from tesseract's TSV output, "line" is its (block, paragraph, line) numbering
+    pytesseract = load_pytesseract()
+    data = pytesseract.image_to_data(img, lang=lang, config=config, output_type=pytesseract.Output.DICT)
+    words = []
+    for i, text in enumerate(data["text"]):
+        # conf -1 marks page/block/line entries rather than words
+        if text.strip() and float(data["conf"][i]) >= 0:
+            words.append({"text": text.strip(), "left": data["left"][i], "top": data["top"][i],
+                          "width": data["width"][i], "height": data["height"][i],
+                          "conf": float(data["conf"][i]),
+                          "line": (data["block_num"][i], data["par_num"][i], data["line_num"][i])})
+    return words
+
+
+def _page_words(page, lang, config, tiling):
+    if not tiling:
+        return _read_words(page, lang, config)
+    from slipscanner.tiling import tiled_words
+
+    return tiled_words(page, lambda band: _read_words(band, lang, config), **tiling)
+
+
+def extract_text_from_image(image_path, cache=None, lang=None, config="", preprocess=None, tiling=None):
+    # Pages taller than a band are OCR'd as overlapping bands in parallel
+    def run(pages):
+        from slipscanner.tiling import band_boxes, words_to_text
+
+        texts = []
+        for page in pages:
+            bands = len(band_boxes(page.height, tiling["band_height"], tiling["overlap"])) if tiling else 1
+            if bands > 1:
+                annotate(bands=bands)
+                texts.append(words_to_text(_page_words(page, lang, config, tiling)))
+            else:
+                texts.append(load_pytesseract().image_to_string(page, lang=lang, config=config))
+        return "\n".join(texts)
+
+    return _run_cached_ocr(image_path, cache, "text", lang, config, preprocess, run, tiling)
+
+
+def extract_words_from_image(image_path, cache=None, lang=None, config="", preprocess=None, tiling=None):
+    # Word boxes: [{"text", "left", "top", "width", "height", "conf"}], pages stacked top to bottom
+    def run(pages):
+        words = []
+        offset = 0
+        for page in pages:
+            for word in _page_words(page, lang, config, tiling):
+                words.append({key: value for key, value in word.items() if key != "line"})
+                words[-1]["top"] += offset
+            offset += page.height
+        return json.dumps(words)
+
+    return json.loads(_run_cached_ocr(image_path, cache, "words", lang, config, preprocess, run, tiling))
@@ -0,0 +1,137 @@
+import json
+import os
+import threading
+
+DEFAULT_HOST = os.environ.get("OLLAMA_HOST", "http://localhost:11434")
+DEFAULT_MODEL = "mistral"
+DEFAULT_KEEP_ALIVE = "30m"  # keep the model loaded between receipts
+DEFAULT_POOL_SIZE = 4
+
+
+def generate_payload(prompt, model, options, stream, format=None, context=None, keep_alive=None):
+    payload = {"model": model, "prompt": prompt, "stream": stream}
+    if options:
+        payload["options"] = options
+    if format is not None:
+        payload["format"] = format  # "json" or a JSON schema the output must match
+    if context is not None:
+        payload["context"] = context  # tokens of the earlier turns, continued without evaluating them again
+    if keep_alive is not None:
+        payload["keep_alive"] = keep_alive
+    return payload
+
+
+# --- Pooled Ollama client ---
+# One Session per client so back-to-back calls reuse the same TCP connection
+# instead of paying connection setup every time. Only connection failures and
+# 502/503/504 are retried, a generation that timed out is never sent again.
+class OllamaClient:
+    def __init__(self, host=DEFAULT_HOST, pool_size=DEFAULT_POOL_SIZE, retries=3, backoff_factor=0.25,
+                 keep_alive=DEFAULT_KEEP_ALIVE, timeout=60):
+        # requests is only imported once a client is needed, keeping GUI startup fast
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        if "://" not in host:
+            host = "http://" + host
+        self.host = host.rstrip("/")
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+
+        retry = Retry(total=retries, connect=retries, read=False, status=retries, backoff_factor=backoff_factor,
+                      status_forcelist=(502, 503, 504), allowed_methods=frozenset({"POST"}),
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _payload(self, prompt, model, options, stream, format=None, context=None):
+        return generate_payload(prompt, model, options, stream, format, context, self.keep_alive)
+
+    def generate(self, prompt, model, options=None, timeout=None, format=None, context=None):
+        response = self.session.post(self.host + "/api/generate",
+                                     json=self._payload(prompt, model, options, stream=False, format=format,
+                                                        context=context),
+                                     timeout=timeout or self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def stream(self, prompt, model, options=None, timeout=None, format=None, context=None):
+        # Yields each NDJSON message, the timeout applies between chunks
+        with self.session.post(self.host + "/api/generate",
+                               json=self._payload(prompt, model, options, stream=True, format=format,
+                                                  context=context),
+                               stream=True, timeout=timeout or self.timeout) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get("error"):
+                    raise RuntimeError(data["error"])
+                yield data
+                if data.get("done"):
+                    break
+
+    def close(self):
+        self.session.close()
+
+
+# --- Async Ollama client ---
+# The same /api/generate call for asyncio code (pipeline.py), on an aiohttp
+# session whose connector allows at most limit connections. Needs the optional
+# aiohttp package; create it inside the running event loop and close it there.
+class AsyncOllamaClient:
+    def __init__(self, host=DEFAULT_HOST, limit=DEFAULT_POOL_SIZE, keep_alive=DEFAULT_KEEP_ALIVE, timeout=60,
+                 retries=3, backoff_factor=0.25):
+        import aiohttp
+
+        if "://" not in host:
+            host = "http://" + host
+        self.host = host.rstrip("/")
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self._aiohttp = aiohttp
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=limit))
+
+    async def generate(self, prompt, model, options=None, timeout=None, format=None, context=None):
+        # Like OllamaClient, only failures to connect and 502/503/504 are retried. A
+        # connection lost once the request is out (ServerDisconnectedError, a reset
+        # mid-generation) is raised, sending it again would re-run the whole generation.
+        import asyncio
+
+        payload = generate_payload(prompt, model, options, False, format, context, self.keep_alive)
+        client_timeout = self._aiohttp.ClientTimeout(total=timeout or self.timeout)
+        for attempt in range(self.retries + 1):
+            try:
+                async with self.session.post(self.host + "/api/generate", json=payload,
+                                             timeout=client_timeout) as response:
+                    if response.status in (502, 503, 504) and attempt < self.retries:
+                        await asyncio.sleep(self.backoff_factor * 2 ** attempt)
+                        continue
+                    response.raise_for_status()
+                    return await response.json(content_type=None)
+            except self._aiohttp.ClientConnectorError:
+                if attempt == self.retries:
+                    raise
+                await asyncio.sleep(self.backoff_factor * 2 ** attempt)
+
+    async def close(self):
+        await self.session.close()
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def default_client():
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = OllamaClient()
+        return _default_client
@@ -0,0 +1,105 @@
+import re
+import string
+
+from slipscanner.items import LineItem
+
+# "<description> <price>" with the price as the last thing on the line
+PRICE_LINE = re.compile(r'(.+?)\s+(\d{1,3}\.\d{2})$')
+
+# Looser variant for locating the item block: also accepts comma decimals and
+# a trailing VAT flag or currency marker such as "12,99 A" or "4.50*"
+PRICED_LINE = re.compile(r'\d+[.,]\d{2}\s*[A-Za-z*#]?$')
+# Totals and payment lines start with their keyword, which keeps items like "Birthday Card 25.00" in
+TOTALS_START = re.compile(r'^\W*(sub\s*-?\s*total|total|balance|amount\s+due|to\s+pay)\b', re.IGNORECASE)
+# Items can start with these too ("Cash Back Voucher 10.00", "Card - Birthday 25.00"),
+# so they only end the items when neither a total nor a priced item follows
+PAYMENT_START = re.compile(r'^\W*(change|cash|card|tender(ed)?|vat|tax|payment)\b', re.IGNORECASE)
+SECTION_END = re.compile(f'{TOTALS_START.pattern}|{PAYMENT_START.pattern}', re.IGNORECASE)
+HEADER_LINE = re.compile(r'\b(tel|phone|fax|vat\s*(no|reg)|reg\s*no|www\.|\.com|invoice|receipt|till|cashier)\b',
+                         re.IGNORECASE)
+
+
+# Digits OCR commonly reads in place of letters. Only applied to words that are
+# mostly letters ("Ch0c", "5ugar"), so sizes and codes like "500g", "2L", "A4"
+# or "X100" are kept as printed.
+OCR_MISREADS = str.maketrans({'0': 'O', '1': 'l', '5': 'S'})
+QUANTITY = re.compile(r'^\d+([.,]\d+)?(g|kg|mg|ml|cl|l|lt|pk|pcs?|x)$', re.IGNORECASE)
+
+
+# --- Regex item parser ---
+def correct_misreads(word):
+    word = word.replace('|', 'l')
+    letters = sum(c.isalpha() for c in word)
+    digits = [c for c in word if c.isdigit()]
+    if digits and letters >= 2 * len(digits) and all(c in '015' for c in digits) and not QUANTITY.match(word):
+        return word.translate(OCR_MISREADS)
+    return word
+
+
+def clean_description(text):
+    # Normalize spaces
+    text = re.sub(r'\s+', ' ', text.strip())
+
+    # Fix common OCR character misreads, but only inside words
+    text = ' '.join(correct_misreads(word) for word in text.split(' '))
+
+    # Remove leading non-alphabetic characters (like $ § S Z etc.)
+    text = re.sub(r'^[^a-zA-Z]+', '', text)
+
+    # Remove any trailing non-printable characters
+    text = ''.join([c for c in text if c in string.printable])
+
+    # Strip spaces and title case
+    text = text.strip().title()
+
+    return text
+
+
+def extract_items_from_text(text):
+    items = []
+    for line in text.split('\n'):
+        match = PRICE_LINE.search(line.strip())
+        if match:
+            desc = clean_description(match.group(1).strip())
+            items.append(LineItem(desc, float(match.group(2))))
+    return items
+
+
+# --- Item section detection ---
+def more_items_follow(lines, start):
+    # True if a totals line or a priced item line comes after start, i.e. a
+    # payment-looking line before it is still an item
+    for line in lines[start:]:
+        line = line.strip()
+        if TOTALS_START.search(line) or (PRICED_LINE.search(line) and not PAYMENT_START.search(line)):
+            return True
+    return False
+
+
+def item_section(text):
+    # Trims OCR text to the block between the shop header and the totals: from
+    # just above the first priced line to the first total line after it. Without
+    # a total line, a payment/tax line that no priced item follows ends it.
+    # Falls back to the full text when no priced line is found.
+    lines = text.split('\n')
+    priced = [i for i, line in enumerate(lines) if PRICED_LINE.search(line.strip())]
+    if not priced:
+        return text
+
+    start = priced[0]
+    # Keep a description that wrapped onto the line above its price
+    previous = lines[start - 1].strip() if start > 0 else ""
+    if previous and not HEADER_LINE.search(previous) and not SECTION_END.search(previous):
+        start -= 1
+
+    end = None
+    for i in range(priced[0], len(lines)):
+        line = lines[i].strip()
+        if TOTALS_START.search(line) or (PAYMENT_START.search(line) and not more_items_follow(lines, i + 1)):
+            end = i
+            break
+    if end is None or end <= priced[0]:
+        # No totals block: keep one line after the last price for weight/variant details
+        end = min(len(lines), priced[-1] + 2)
+
+    return '\n'.join(line for line in lines[start:end] if line.strip())
@@ -0,0 +1,152 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from slipscanner.backends import make_backend
+from slipscanner.batch import MERGED_OUTPUT_NAME, log_error, output_paths, stage_stats, traced_ocr
+from slipscanner.items import ItemWriter, items_from_parsed
+from slipscanner.layout import extract_layout_text
+from slipscanner.llm import acomplete, parses, safe_json_parse
+from slipscanner.ocr import configure_tesseract, extract_text_from_image
+from slipscanner.parsing import item_section
+from slipscanner.receipt import categorize, default_prompt, normalize_descriptions
+from slipscanner.schema import ITEMS_SCHEMA, max_item_tokens, retry_item_tokens
+from slipscanner.tracing import Trace, span
+
+
+# --- Async staged pipeline ---
+# OCR -> LLM -> parse/write as three stages joined by bounded asyncio queues.
+# workers OCR tasks keep the process pool busy, llm_concurrency LLM tasks each
+# have one request in flight (on an aiohttp session when aiohttp is installed)
+# and a single task parses and writes the answers. A full queue makes the stage
+# before it wait, so OCR never runs more than a few receipts ahead of the LLM.
+async def pipeline(image_paths, output_dir, merge=False, workers=None, llm_concurrency=2, backend=None,
+                   tesseract_cmd=None, ocr_cache=None, llm_cache=None, output_format="csv", preprocess=None,
+                   trim=True, layout=False, tiling=None, products=None, categories=None, prompt=None,
+                   trace_writer=None):
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    prompt = prompt or default_prompt(products)
+    extract = extract_layout_text if layout else extract_text_from_image
+    results = {}
+    failed = []
+    traces = []
+
+    owns_backend = backend is None
+    if owns_backend:
+        backend = make_backend("ollama", pool_size=llm_concurrency)
+
+    output_path = output_paths(image_paths, output_dir, output_format)
+    merged_writer = None
+    if merge:
+        merged_writer = ItemWriter(os.path.join(output_dir, f"{MERGED_OUTPUT_NAME}.{output_format}"),
+                                   extra_columns=["source"])
+
+    loop = asyncio.get_running_loop()
+    ocr_done = asyncio.Queue(maxsize=llm_concurrency * 2)  # OCR'd receipts waiting for an LLM task
+    llm_done = asyncio.Queue(maxsize=llm_concurrency * 2)  # answers waiting to be parsed and written
+    pending_paths = iter(image_paths)
+
+    async def ocr_stage(ocr_pool):
+        # Every OCR task takes the next image until none are left
+        for image_path in pending_paths:
+            try:
+                ocr_text, ocr_spans = await loop.run_in_executor(ocr_pool, traced_ocr, extract, image_path,
+                                                                 ocr_cache, preprocess, tiling)
+            except Exception as e:
+                log_error(f"[OCR Error] {image_path}: {e}")
+                failed.append(image_path)
+                continue
+            if not ocr_text.strip():
+                log_error(f"[OCR Error] {image_path}: no text extracted")
+                failed.append(image_path)
+                continue
+            trace = Trace(image_path)
+            trace.spans.extend(ocr_spans)
+            await ocr_done.put((image_path, ocr_text, trace))
+
+    async def llm_stage():
+        while (receipt := await ocr_done.get()) is not None:
+            image_path, ocr_text, trace = receipt
+            try:
+                with trace.activate():
+                    text = item_section(ocr_text) if trim else ocr_text
+                    with span("prompt"):
+                        llm_prompt = prompt(text)
+                    with span("llm"):
+                        response = await acomplete(llm_prompt, backend, options={"num_predict": max_item_tokens(text)},
+                                                   format=ITEMS_SCHEMA, cache=llm_cache, valid=parses)
+                    if not parses(response):
+                        # Cut off by the cap, ask again with a larger one (see receipt.llm_items)
+                        with span("llm", retry=True):
+                            response = await acomplete(llm_prompt, backend,
+                                                       options={"num_predict": retry_item_tokens(text)},
+                                                       format=ITEMS_SCHEMA, cache=llm_cache, valid=parses)
+            except Exception as e:
+                log_error(f"[LLM Error] {image_path}: {e}")
+                failed.append(image_path)
+                continue
+            await llm_done.put((image_path, response, trace))
+
+    def write(image_path, items):
+        if merged_writer is not None:
+            merged_writer.write_all(items, source=image_path)
+        else:
+            with ItemWriter(output_path[image_path]) as writer:
+                writer.write_all(items)
+
+    async def parse_stage():
+        while (answer := await llm_done.get()) is not None:
+            image_path, response, trace = answer
+            try:
+                with trace.activate():
+                    with span("parse"):
+                        items = items_from_parsed(safe_json_parse(response))
+                    items = categorize(normalize_descriptions(items, products), categories)
+                    with span("write"):
+                        write(image_path, items)
+            except Exception as e:
+                log_error(f"[Parse Error] {image_path}: {e}")
+                failed.append(image_path)
+                continue
+            results[image_path] = items
+            traces.append(trace)
+            if trace_writer is not None:
+                trace_writer.write(trace)
+
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=configure_tesseract,
+                                 initargs=(tesseract_cmd,)) as ocr_pool:
+            llm_tasks = [asyncio.create_task(llm_stage()) for _ in range(llm_concurrency)]
+            parse_task = asyncio.create_task(parse_stage())
+            await asyncio.gather(*(ocr_stage(ocr_pool) for _ in range(workers)))
+            # One end marker per consumer, after everything before it
+            for _ in llm_tasks:
+                await ocr_done.put(None)
+            await asyncio.gather(*llm_tasks)
+            await llm_done.put(None)
+            await parse_task
+    finally:
+        await backend.aclose()
+        if owns_backend:
+            backend.close()
+        if merged_writer is not None:
+            merged_writer.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "processed": len(results),
+        "skipped_llm": 0,
+        "failed": failed,
+        "elapsed": elapsed,
+        "images_per_sec": len(image_paths) / elapsed if elapsed else 0.0,
+        "llm_cache": llm_cache.stats() if llm_cache is not None else None,
+        "stages": stage_stats(traces),
+    }
+
+
+def run_pipeline(image_paths, output_dir, **options):
+    # Blocking entry point with run_batch's return value, see pipeline for the options
+    return asyncio.run(pipeline(image_paths, output_dir, **options))
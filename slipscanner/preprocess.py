@@ -0,0 +1,127 @@
+import numpy as np
+from PIL import Image
+
+MAX_SKEW_DEGREES = 6.0
+SKEW_STEP_DEGREES = 0.25
+THRESHOLD_WINDOW = 31  # px, about two text lines at 300 DPI
+THRESHOLD_OFFSET = 10  # how much darker than its neighbourhood a pixel must be to count as ink
+ANALYSIS_WIDTH = 400  # crop and skew are estimated on a thumbnail this wide
+SKEW_INK_WINDOW = 15  # thumbnail px, ink is what's darker than its surroundings by THRESHOLD_OFFSET
+
+
+def preprocess_image(img, target_dpi=300, receipt_width_mm=80, crop=True, deskew=True, threshold=True):
+    gray = img.convert("L")
+
+    if crop:
+        gray = gray.crop(find_receipt_box(gray))
+
+    # Only ever downscale, upscaling a small scan doesn't add detail. A page of
+    # known resolution (tiling.open_pages) is scaled by its DPI, anything else
+    # (photos) by assuming the crop is one receipt_width_mm wide slip, which a
+    # full A4 page or flatbed scan isn't.
+    scan_dpi = img.info.get("scan_dpi")
+    if scan_dpi:
+        target_width = int(gray.width * target_dpi / scan_dpi)
+    else:
+        target_width = int(receipt_width_mm / 25.4 * target_dpi)
+    if gray.width > target_width:
+        target_height = max(1, round(gray.height * target_width / gray.width))
+        gray = gray.resize((target_width, target_height), Image.LANCZOS, reducing_gap=3.0)
+
+    if deskew:
+        angle = estimate_skew(gray)
+        if abs(angle) >= SKEW_STEP_DEGREES:
+            gray = gray.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+
+    if threshold:
+        gray = adaptive_threshold(gray)
+    return gray
+
+
+def _thumbnail(gray):
+    scale = min(1.0, ANALYSIS_WIDTH / gray.width)
+    size = (max(1, round(gray.width * scale)), max(1, round(gray.height * scale)))
+    return np.asarray(gray.resize(size, Image.BILINEAR), dtype=np.float32), scale
+
+
+def otsu_threshold(pixels):
+    histogram = np.bincount(pixels.astype(np.uint8).ravel(), minlength=256).astype(np.float64)
+    levels = np.arange(256)
+    weight_dark = np.cumsum(histogram)
+    weight_light = weight_dark[-1] - weight_dark
+    sum_dark = np.cumsum(histogram * levels)
+    mean_dark = sum_dark / np.maximum(weight_dark, 1)
+    mean_light = (sum_dark[-1] - sum_dark) / np.maximum(weight_light, 1)
+    between_class_variance = weight_dark * weight_light * (mean_dark - mean_light) ** 2
+    return int(np.argmax(between_class_variance))
+
+
+def find_receipt_box(gray, min_fill=0.5, margin=0.01):
+    # The slip is the large bright region of the photo: keep the columns that
+    # are mostly paper-white, then the rows that are paper within those columns
+    pixels, scale = _thumbnail(gray)
+    paper = pixels > otsu_threshold(pixels)
+
+    column_fill = paper.mean(axis=0)
+    columns = np.flatnonzero(column_fill > min_fill * column_fill.max())
+    if columns.size == 0:
+        return (0, 0, gray.width, gray.height)
+    rows = np.flatnonzero(paper[:, columns[0]:columns[-1] + 1].mean(axis=1) > min_fill)
+    if rows.size == 0:
+        return (0, 0, gray.width, gray.height)
+
+    pad_x = margin * pixels.shape[1]
+    pad_y = margin * pixels.shape[0]
+    left = max(0, int((columns[0] - pad_x) / scale))
+    right = min(gray.width, int((columns[-1] + 1 + pad_x) / scale))
+    top = max(0, int((rows[0] - pad_y) / scale))
+    bottom = min(gray.height, int((rows[-1] + 1 + pad_y) / scale))
+
+    # A box that small is more likely a glare patch than the receipt
+    if (right - left) * (bottom - top) < 0.05 * gray.width * gray.height:
+        return (0, 0, gray.width, gray.height)
+    return (left, top, right, bottom)
+
+
+def estimate_skew(gray):
+    # Projection profile: text lines give the sharpest row histogram of ink
+    # pixels when projected along the true baseline angle. Small rotations are
+    # approximated by a shear, so every candidate angle is a single bincount.
+    # Ink is only looked for on the paper: the table around a photographed slip
+    # (or the corners a crop of a rotated slip keeps) would swamp the text.
+    pixels, _ = _thumbnail(gray)
+    paper = box_mean(pixels, 3 * SKEW_INK_WINDOW) > otsu_threshold(pixels)
+    ink = (pixels < box_mean(pixels, SKEW_INK_WINDOW) - THRESHOLD_OFFSET) & paper
+    ys, xs = np.nonzero(ink)
+    if ys.size < 50:
+        return 0.0
+
+    angles = np.arange(-MAX_SKEW_DEGREES, MAX_SKEW_DEGREES + SKEW_STEP_DEGREES / 2, SKEW_STEP_DEGREES)
+    offset = int(np.ceil(pixels.shape[1] * np.tan(np.radians(MAX_SKEW_DEGREES))))
+    scores = np.empty(angles.size)
+    for i, angle in enumerate(angles):
+        projected = np.round(ys - xs * np.tan(np.radians(angle))).astype(np.int64) + offset
+        profile = np.bincount(projected)
+        scores[i] = np.dot(profile, profile)
+    return float(angles[np.argmax(scores)])
+
+
+def box_mean(pixels, window):
+    # Mean of the window x window neighbourhood of every pixel, via an integral image
+    half = window // 2
+    padded = np.pad(pixels, half + 1, mode="edge")
+    integral = padded.cumsum(axis=0).cumsum(axis=1)
+
+    height, width = pixels.shape
+    y0, x0 = np.ogrid[0:height, 0:width]
+    y1, x1 = y0 + window, x0 + window
+    local_sum = integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+    return local_sum / (window * window)
+
+
+def adaptive_threshold(gray, window=THRESHOLD_WINDOW, offset=THRESHOLD_OFFSET):
+    # Compare each pixel with its local mean, which copes with shadows and
+    # uneven lighting that defeat a global cut-off
+    pixels = np.asarray(gray, dtype=np.float32)
+    binary = np.where(pixels < box_mean(pixels, window) - offset, 0, 255).astype(np.uint8)
+    return Image.fromarray(binary, mode="L")
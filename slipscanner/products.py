@@ -0,0 +1,211 @@
+import csv
+import functools
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+
+from slipscanner.cache import default_data_dir
+from slipscanner.parsing import correct_misreads
+
+MIN_SCORE = 0.75  # below this an OCR description is left as it is
+MAX_CANDIDATES = 8  # names sharing the most trigrams with a query that get scored
+MIN_QUERY_LENGTH = 3
+MIN_TRUNCATED_LENGTH = 4  # shorter words ("egg", "tea") are taken as they are, not as the start of a longer one
+MAX_REMEMBERED = 10000  # lookups remembered before the memo is cleared
+
+WORD = re.compile(r"[a-z0-9]+")
+
+
+def default_products_path():
+    return os.path.join(default_data_dir(), "products.sqlite3")
+
+
+def normalize_name(text):
+    return " ".join(WORD.findall(text.lower()))
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+# Receipts repeat the same words over and over
+word_trigrams = functools.lru_cache(maxsize=65536)(trigrams)
+
+
+def dice(a, b):
+    return 2 * len(a & b) / (len(a) + len(b)) if a or b else 0.0
+
+
+def features(normalized):
+    # (trigrams, words, words with digits) of a normalized name, what match_score compares
+    words = normalized.split()
+    return trigrams(normalized), words, frozenset(w for w in words if not w.isalpha())
+
+
+def is_abbreviation(short, word):
+    # "tyaki" for "teriyaki": same first letter, the rest in order
+    if not short or short[0] != word[0]:
+        return False
+    letters = iter(word)
+    return all(c in letters for c in short)
+
+
+def word_score(q, n, known_words=frozenset()):
+    # How well query word q stands for name word n. A word that's a known word
+    # itself (it's in some learned name) is never taken for a truncated longer
+    # one, and a truncated or abbreviated word only scores what it covers of
+    # the whole word, so "egg" doesn't become "eggplant".
+    if q == n:
+        return 1.0
+    score = dice(word_trigrams(q), word_trigrams(n))
+    if MIN_TRUNCATED_LENGTH <= len(q) < len(n) and q not in known_words:
+        if n.startswith(q):
+            score = max(score, 0.5 + 0.5 * len(q) / len(n))
+        elif is_abbreviation(q, n):
+            score = max(score, 0.4 + 0.5 * len(q) / len(n))
+    return score
+
+
+def match_score(query, name, known_words=frozenset()):
+    # query and name are features(). Words with digits (sizes, codes) must be
+    # identical. Otherwise the best of whole-name trigram similarity and a
+    # word-by-word match in which an OCR-truncated word can stand for the word
+    # it starts ("chick tyaki" -> "chicken teriyaki"), see word_score.
+    query_grams, query_words, query_codes = query
+    name_grams, name_words, name_codes = name
+    if query_codes != name_codes:
+        return 0.0
+
+    score = dice(query_grams, name_grams)
+    if len(query_words) == len(name_words):
+        word_scores = [word_score(q, n, known_words) for q, n in zip(query_words, name_words)]
+        score = max(score, sum(word_scores) / len(word_scores))
+    return score
+
+
+# --- Product dictionary ---
+# Product names learned from exported CSVs, kept in SQLite and indexed in
+# memory by character trigram. A garbled or truncated OCR description is looked
+# up by scoring only the few names that share the most trigrams with it, so a
+# lookup stays in the microseconds with thousands of products. Safe to share
+# between threads.
+class ProductDictionary:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._names = None  # normalized -> [name, times seen, features()]
+        self._index = {}  # trigram -> normalized names
+        self._words = set()  # every word of a learned name
+        self._matches = {}  # normalized query -> name or None
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("""CREATE TABLE IF NOT EXISTS products (
+            normalized TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            count INTEGER NOT NULL
+        )""")
+        return conn
+
+    def _load(self):
+        # Called with the lock held
+        if self._names is None:
+            self._names = {}
+            if os.path.exists(self.path):
+                conn = self._connect()
+                try:
+                    for normalized, name, count in conn.execute("SELECT normalized, name, count FROM products"):
+                        self._add(normalized, name, count)
+                finally:
+                    conn.close()
+        return self._names
+
+    def _add(self, normalized, name, count):
+        if normalized in self._names:
+            self._names[normalized][1] += count
+            return
+        entry = self._names[normalized] = [name, count, features(normalized)]
+        self._words.update(entry[2][1])
+        for gram in entry[2][0]:
+            self._index.setdefault(gram, []).append(normalized)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._load())
+
+    def learn(self, descriptions):
+        # Adds (or counts again) every non-empty description
+        seen = Counter()
+        names = {}
+        for description in descriptions:
+            normalized = normalize_name(description or "")
+            if len(normalized) >= MIN_QUERY_LENGTH:
+                seen[normalized] += 1
+                names.setdefault(normalized, description.strip())
+        if not seen:
+            return 0
+
+        with self._lock:
+            self._load()
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.executemany("""INSERT INTO products (normalized, name, count) VALUES (?, ?, ?)
+                                        ON CONFLICT(normalized) DO UPDATE SET count = count + excluded.count""",
+                                     [(normalized, names[normalized], count) for normalized, count in seen.items()])
+            finally:
+                conn.close()
+            for normalized, count in seen.items():
+                self._add(normalized, names[normalized], count)
+            self._matches.clear()
+        return len(seen)
+
+    def learn_csv(self, path):
+        # An exported CSV with a description column (any other columns are ignored)
+        with open(path, newline="", encoding="utf-8") as f:
+            return self.learn(row.get("description", "") for row in csv.DictReader(f))
+
+    def lookup(self, description):
+        # The learned name description most likely is, or None
+        query = normalize_name(" ".join(correct_misreads(word) for word in description.split()))
+        if len(query) < MIN_QUERY_LENGTH:
+            return None
+        with self._lock:
+            if query not in self._matches:
+                if len(self._matches) >= MAX_REMEMBERED:
+                    self._matches.clear()
+                self._matches[query] = self._best_match(query)
+            return self._matches[query]
+
+    def _best_match(self, query):
+        names = self._load()
+        if query in names:
+            return names[query][0]
+
+        query_features = features(query)
+        shared = Counter()
+        for gram in query_features[0]:
+            shared.update(self._index.get(gram, ()))
+        best, best_key = None, (MIN_SCORE, 0)
+        for normalized, _ in shared.most_common(MAX_CANDIDATES):
+            name, count, name_features = names[normalized]
+            key = (match_score(query_features, name_features, self._words), count)
+            if key >= best_key:
+                best, best_key = name, key
+        return best
+
+    def normalize_items(self, items):
+        # Replaces each item's description with its learned name, in place
+        for item in items:
+            name = self.lookup(item.description)
+            if name:
+                item.description = name
+        return items
+
+
+def default_products():
+    return ProductDictionary(default_products_path())
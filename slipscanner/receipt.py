@@ -0,0 +1,109 @@
+import functools
+
+from slipscanner.chunking import parse_in_chunks
+from slipscanner.hybrid import parse_hybrid
+from slipscanner.items import items_from_parsed
+from slipscanner.llm import (complete, generate_packed_prompt, generate_prompt, packed_ids, parses, safe_json_parse,
+                             split_packed_response)
+from slipscanner.ocr import extract_text_from_image
+from slipscanner.parsing import item_section
+from slipscanner.schema import ITEMS_SCHEMA, max_item_tokens, packed_items_schema, retry_item_tokens
+from slipscanner.tracing import span
+
+# backend is a backends.LLMBackend (None uses the local Ollama server), prompt
+# builds the prompt from the receipt text and chunking holds the options for
+# chunking.parse_in_chunks (e.g. DEFAULT_CHUNKING), None sends the text in one prompt.
+# products is a products.ProductDictionary that descriptions are looked up in
+# afterwards, when it has entries the default prompt stops asking the model to
+# complete truncated words. categories is a categories.CategoryClassifier that
+# fills in the empty category of each item.
+
+
+def default_prompt(products=None):
+    if products is not None and len(products):
+        return functools.partial(generate_prompt, complete_words=False)
+    return generate_prompt
+
+
+def normalize_descriptions(items, products):
+    if products is None:
+        return items
+    with span("products"):
+        return products.normalize_items(items)
+
+
+def categorize(items, categories):
+    if categories is None:
+        return items
+    with span("categories"):
+        return categories.categorize_items(items)
+
+
+def llm_items(text, backend=None, llm_cache=None, prompt=generate_prompt, chunking=None):
+    if chunking is not None:
+        return parse_in_chunks(text, lambda chunk: llm_items(chunk, backend, llm_cache, prompt), **chunking)
+
+    # The schema makes the backend emit a valid item array, and the token cap
+    # stops generation from running past the items that can possibly be in text
+    with span("prompt"):
+        llm_prompt = prompt(text)
+    with span("llm"):
+        llm_response = complete(llm_prompt, backend, options={"num_predict": max_item_tokens(text)},
+                                format=ITEMS_SCHEMA, cache=llm_cache, valid=parses)
+    if not parses(llm_response):
+        # An array cut off by the cap doesn't parse, ask again with a larger one. Always
+        # an explicit cap: without num_predict llama.cpp stops after 16 tokens.
+        with span("llm", retry=True):
+            llm_response = complete(llm_prompt, backend, options={"num_predict": retry_item_tokens(text)},
+                                    format=ITEMS_SCHEMA, cache=llm_cache, valid=parses)
+    with span("parse"):
+        return items_from_parsed(safe_json_parse(llm_response))
+
+
+def llm_items_packed(texts, backend=None, llm_cache=None):
+    # Items for several receipts from one request, see llm.generate_packed_prompt.
+    # A receipt missing from the answer is parsed again on its own.
+    if len(texts) == 1:
+        return [llm_items(texts[0], backend, llm_cache)]
+
+    receipt_ids = packed_ids(len(texts))
+    with span("prompt", packed=len(texts)):
+        llm_prompt = generate_packed_prompt(texts)
+    with span("llm", packed=len(texts)):
+        num_predict = sum(max_item_tokens(text) + 4 for text in texts)
+        # An answer with a receipt missing or cut off isn't cached
+        llm_response = complete(llm_prompt, backend, options={"num_predict": num_predict},
+                                format=packed_items_schema(receipt_ids), cache=llm_cache,
+                                valid=lambda response: None not in split_packed_response(response, receipt_ids))
+    with span("parse", packed=len(texts)):
+        parsed = split_packed_response(llm_response, receipt_ids)
+        results = [items_from_parsed(items) if items is not None else None for items in parsed]
+    return [items if items is not None else llm_items(text, backend, llm_cache)
+            for text, items in zip(texts, results)]
+
+
+def parse_receipt_text(ocr_text, backend=None, llm_cache=None, trim=True, prompt=None, chunking=None, products=None,
+                       categories=None):
+    # trim sends only the detected item block instead of the whole OCR dump
+    items = llm_items(item_section(ocr_text) if trim else ocr_text, backend, llm_cache=llm_cache,
+                      prompt=prompt or default_prompt(products), chunking=chunking)
+    return categorize(normalize_descriptions(items, products), categories)
+
+
+def parse_receipt_text_hybrid(ocr_text, backend=None, llm_cache=None, unmatched_only=False, prompt=None,
+                              chunking=None, products=None, categories=None):
+    # Returns (items, used_llm), see hybrid.parse_hybrid
+    prompt = prompt or default_prompt(products)
+    items, used_llm = parse_hybrid(ocr_text, lambda text: llm_items(text, backend, llm_cache=llm_cache, prompt=prompt,
+                                                                    chunking=chunking),
+                                   unmatched_only=unmatched_only)
+    return categorize(normalize_descriptions(items, products), categories), used_llm
+
+
+def process_receipt(image_path, backend=None, ocr_cache=None, llm_cache=None, preprocess=None, trim=True,
+                    chunking=None, tiling=None, products=None, categories=None):
+    ocr_text = extract_text_from_image(image_path, cache=ocr_cache, preprocess=preprocess, tiling=tiling)
+    if not ocr_text.strip():
+        return []
+    return parse_receipt_text(ocr_text, backend, llm_cache=llm_cache, trim=trim, chunking=chunking, products=products,
+                              categories=categories)
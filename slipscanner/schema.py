@@ -0,0 +1,73 @@
+# Output constraints for the item array, so backends produce valid JSON on the
+# first pass instead of relying on safe_json_parse to repair it.
+ITEMS_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "description": {"type": "string"},
+            "price": {"type": "number"},
+        },
+        "required": ["description", "price"],
+        "additionalProperties": False,
+    },
+}
+
+# Same shape as a llama.cpp grammar. Whitespace is limited to one character
+# between tokens, which also keeps the model from spending tokens on indentation.
+ITEMS_RULES = r'''
+items  ::= "[" ws ( item ( ws "," ws item )* )? ws "]"
+item   ::= "{" ws "\"description\"" ws ":" ws string ws "," ws "\"price\"" ws ":" ws number ws "}"
+string ::= "\"" ( [^"\\\x7F\x00-\x1F] | "\\" ["\\/bfnrt] )* "\""
+number ::= "-"? [0-9]+ ( "." [0-9]+ )?
+ws     ::= [ \n]?
+'''
+ITEMS_GBNF = "root   ::= items" + ITEMS_RULES
+
+
+# Several receipts answered in one request: {"<receipt id>": [items], ...}
+def packed_items_schema(receipt_ids):
+    return {
+        "type": "object",
+        "properties": {receipt_id: ITEMS_SCHEMA for receipt_id in receipt_ids},
+        "required": list(receipt_ids),
+        "additionalProperties": False,
+    }
+
+
+def packed_items_gbnf(receipt_ids):
+    # The ids are written in order, so each array follows its own receipt's tag
+    members = ' ws "," ws '.join(f'"\\"{receipt_id}\\"" ws ":" ws items' for receipt_id in receipt_ids)
+    return f'root   ::= "{{" ws {members} ws "}}"' + ITEMS_RULES
+
+
+def grammar_for(format):
+    # llama.cpp grammar for an output format passed to a backend
+    if format == ITEMS_SCHEMA:
+        return ITEMS_GBNF
+    receipt_ids = list(format.get("properties", {})) if isinstance(format, dict) else []
+    if receipt_ids and format == packed_items_schema(receipt_ids):
+        return packed_items_gbnf(receipt_ids)
+    raise ValueError("No llama.cpp grammar for this output format")
+
+# A compact item such as {"description": "Chicken Teriyaki", "price": 45.99},
+# costs ~14 tokens of JSON syntax plus roughly one token per 3 characters of text
+TOKENS_PER_ITEM = 14
+CHARS_PER_TOKEN = 3
+MIN_ITEM_TOKENS = 64
+# Completed words ("Chick" -> "Chicken") and OCR junk that tokenizes poorly make
+# answers longer than the estimate, so the cap leaves room on top of it
+TOKEN_HEADROOM = 1.5
+
+
+def max_item_tokens(text):
+    # Upper bound on the output tokens needed for the items in text, used to
+    # cap generation instead of a fixed, much larger limit
+    lines = [line for line in text.split("\n") if line.strip()]
+    budget = sum(TOKENS_PER_ITEM + len(line) // CHARS_PER_TOKEN for line in lines) + 8
+    return max(MIN_ITEM_TOKENS, int(budget * TOKEN_HEADROOM))
+
+
+def retry_item_tokens(text):
+    # Cap for asking again after an answer ran into max_item_tokens
+    return 2 * max_item_tokens(text)
@@ -0,0 +1,79 @@
+from slipscanner.backends import default_backend
+from slipscanner.llm import llm_cache_key
+from slipscanner.tracing import annotate
+
+
+# --- Conversation sessions ---
+# One conversation with a backend, e.g. a receipt's generate/refine loop. Each
+# turn sends only the new message and the backend continues from the prefix
+# state it returned for the previous turn (Ollama's context tokens, a llama.cpp
+# saved state), so the receipt prompt isn't evaluated again on every
+# refinement. Without a state (a backend that keeps none, an answer from the
+# cache) the earlier turns are resent as text.
+class ConversationSession:
+    def __init__(self, backend=None, system=None, cache=None):
+        self.backend = backend or default_backend()
+        self.system = system  # put in front of the first turn
+        self.cache = cache
+        self.history = ""  # earlier turns as text
+        self.state = None
+        self.turns = 0
+
+    def _turn_prompt(self, prompt):
+        if self.turns == 0 and self.system:
+            return self.system + "\n\nUser: " + prompt
+        return prompt
+
+    def _cache_key(self, prompt, options, format):
+        return llm_cache_key(self.backend.name, self.history + prompt, options, format)
+
+    def _record(self, prompt, response, state):
+        self.history += f"{prompt}\n{response}\n\n"
+        self.state = state
+        self.turns += 1
+
+    def ask(self, prompt, options=None, format=None):
+        prompt = self._turn_prompt(prompt)
+        key = self._cache_key(prompt, options, format) if self.cache is not None else None
+        response = self.cache.get(key) if key else None
+        if response is not None:
+            annotate(cached=True)
+            state = None
+        else:
+            response, state = self.backend.generate_turn(self.history, prompt, self.state, options=options,
+                                                         format=format)
+            if key and response:
+                self.cache.set(key, response)
+        self._record(prompt, response, state)
+        return response
+
+    def stream(self, prompt, options=None, format=None):
+        # Yields response fragments. A turn that isn't read to the end (the
+        # stream was closed) isn't added to the conversation.
+        prompt = self._turn_prompt(prompt)
+        key = self._cache_key(prompt, options, format) if self.cache is not None else None
+        response = self.cache.get(key) if key else None
+        if response is not None:
+            annotate(cached=True)
+            yield response
+            self._record(prompt, response, None)
+            return
+
+        chunks = []
+        turn = self.backend.stream_turn(self.history, prompt, self.state, options=options, format=format)
+        try:
+            while True:
+                try:
+                    chunk = next(turn)
+                except StopIteration as done:
+                    state = done.value
+                    break
+                chunks.append(chunk)
+                yield chunk
+        finally:
+            turn.close()
+
+        response = "".join(chunks).strip()
+        if key and response:
+            self.cache.set(key, response)
+        self._record(prompt, response, state)
@@ -0,0 +1,19 @@
+import importlib
+import threading
+
+HEAVY_MODULES = ("PIL.Image", "pytesseract", "requests", "slipscanner.preprocess")
+
+
+def preload_in_background(modules=HEAVY_MODULES, then=None):
+    # Imports the heavy modules on a daemon thread once the window is up, so
+    # neither the window nor the first click has to wait for them
+    def load():
+        for name in modules:
+            try:
+                importlib.import_module(name)
+            except ImportError:
+                pass
+        if then is not None:
+            then()
+
+    threading.Thread(target=load, daemon=True).start()
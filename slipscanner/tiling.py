@@ -0,0 +1,98 @@
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageSequence
+
+
+PDF_DPI = 300
+
+
+# --- Pages ---
+def open_pages(image_bytes):
+    # Every page of a scan: TIFF/GIF frames, PDF pages (needs pdf2image and
+    # poppler) or the single image of anything else. Pages whose resolution is
+    # known (PDF pages, TIFF scans) carry it as info["scan_dpi"]; the DPI in
+    # photos is whatever the camera wrote and isn't trusted.
+    if image_bytes[:5] == b"%PDF-":
+        try:
+            from pdf2image import convert_from_bytes
+        except ImportError:
+            raise ValueError("PDF receipts need the pdf2image package (and poppler) installed")
+        pages = convert_from_bytes(image_bytes, dpi=PDF_DPI)
+        for page in pages:
+            page.info["scan_dpi"] = PDF_DPI
+        return pages
+
+    img = Image.open(io.BytesIO(image_bytes))
+    pages = [img] if getattr(img, "n_frames", 1) <= 1 else [frame.copy() for frame in ImageSequence.Iterator(img)]
+    if img.format == "TIFF":
+        for page in pages:
+            if page.info.get("dpi"):
+                page.info["scan_dpi"] = float(page.info["dpi"][0])
+    return pages
+
+
+# --- Bands ---
+def band_boxes(height, band_height=1600, overlap=160):
+    # [(top, bottom, own_top, own_bottom)] bands overlapping by overlap px. A line
+    # belongs to the band whose own range holds its centre, which splits each
+    # overlap down the middle, so a line cut off at a band's edge is always
+    # taken from the neighbouring band where it's whole.
+    tops = [0]
+    while tops[-1] + band_height + overlap < height:
+        tops.append(tops[-1] + band_height)
+
+    boxes = []
+    for i, top in enumerate(tops):
+        last = i == len(tops) - 1
+        boxes.append((top, height if last else top + band_height + overlap,
+                      0 if i == 0 else top + overlap // 2,
+                      height if last else tops[i + 1] + overlap // 2))
+    return boxes
+
+
+def tiled_words(img, read_words, band_height=1600, overlap=160, workers=None):
+    # read_words(band image) -> word dicts with "top", "height" and a "line" id
+    # (tesseract's block/paragraph/line numbers). Bands are read concurrently:
+    # pytesseract runs tesseract as a subprocess, so threads already put every
+    # band on its own core. Returns the kept words in page coordinates, with the
+    # band index prepended to "line".
+    boxes = band_boxes(img.height, band_height, overlap)
+    bands = [img.crop((0, top, img.width, bottom)) for top, bottom, _, _ in boxes]
+    workers = min(len(bands), workers or os.cpu_count() or 1)
+    if workers <= 1:
+        results = [read_words(band) for band in bands]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(read_words, bands))
+
+    kept = []
+    for index, ((top, _, own_top, own_bottom), words) in enumerate(zip(boxes, results)):
+        lines = {}
+        for word in words:
+            lines.setdefault(tuple(word["line"]), []).append(word)
+        for line_id, line_words in lines.items():
+            centre = top + sum(w["top"] + w["height"] / 2 for w in line_words) / len(line_words)
+            if own_top <= centre < own_bottom:
+                kept.extend(dict(w, top=w["top"] + top, line=(index,) + line_id) for w in line_words)
+    return kept
+
+
+def words_to_text(words):
+    # Lines in reading order with a blank line between tesseract's blocks, like
+    # image_to_string. Block numbers restart in every band, so a band boundary
+    # isn't taken as a new block.
+    lines = {}
+    for word in words:
+        lines.setdefault(tuple(word["line"]), []).append(word)
+
+    text_lines = []
+    previous = None
+    for line_id in sorted(lines):
+        band, block = line_id[0], line_id[1]
+        if previous is not None and band == previous[0] and block != previous[1]:
+            text_lines.append("")
+        previous = (band, block)
+        text_lines.append(" ".join(w["text"] for w in sorted(lines[line_id], key=lambda w: w["left"])))
+    return "\n".join(text_lines)
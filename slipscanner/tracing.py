@@ -0,0 +1,220 @@
+import collections
+import contextlib
+import contextvars
+import json
+import os
+import statistics
+import threading
+import time
+
+METRICS_WINDOW = 1000  # receipts the Prometheus quantiles are taken over
+STAGE_LABELS = {"ocr": "OCR", "prompt": "prompt", "llm": "LLM", "parse": "parse", "regex": "regex"}
+
+_current_trace = contextvars.ContextVar("slipscanner_trace", default=None)
+_current_span = contextvars.ContextVar("slipscanner_span", default=None)
+
+
+# --- Traces ---
+# A Trace collects the stages of one receipt as spans: {"stage", "start",
+# "duration"} plus whatever the stage annotates (cached, prompt_eval_count,
+# eval_count, eval_duration, tokens_per_sec). Library code opens spans with
+# span() and annotate(), which do nothing unless a trace is active in the
+# calling thread, so untraced callers pay almost nothing.
+class Trace:
+    def __init__(self, name=""):
+        self.name = name
+        self.spans = []
+
+    @contextlib.contextmanager
+    def activate(self):
+        # Each thread working on the receipt activates the trace for itself
+        token = _current_trace.set(self)
+        try:
+            yield self
+        finally:
+            _current_trace.reset(token)
+
+    def total(self):
+        return sum(s["duration"] for s in self.spans)
+
+    def as_dict(self):
+        return {"name": self.name, "total": self.total(), "spans": self.spans}
+
+    def summary(self):
+        # Stage timings and token counts for the GUI scripts' status line or chat
+        # log, e.g. "OCR 1.2s · LLM 38.1s (412 tokens, 10.8 tok/s)"
+        parts = []
+        for s in self.spans:
+            part = f"{STAGE_LABELS.get(s['stage'], s['stage'])} {format_duration(s['duration'])}"
+            if s.get("cached"):
+                part += " (cached)"
+            elif s.get("eval_count"):
+                part += f" ({s['eval_count']} tokens"
+                if s.get("tokens_per_sec"):
+                    part += f", {s['tokens_per_sec']:.1f} tok/s"
+                part += ")"
+            parts.append(part)
+        return " · ".join(parts)
+
+
+def format_duration(seconds):
+    return f"{seconds * 1000:.0f}ms" if seconds < 1 else f"{seconds:.1f}s"
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextlib.contextmanager
+def span(stage, **attrs):
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    record = dict(attrs, stage=stage, start=time.time())
+    token = _current_span.set(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["duration"] = time.perf_counter() - start
+        _current_span.reset(token)
+        if record.get("eval_count") and "tokens_per_sec" not in record:
+            # Generation time when the backend reports it, otherwise the whole call
+            seconds = record.get("eval_duration") or record["duration"]
+            record["tokens_per_sec"] = record["eval_count"] / seconds if seconds else 0.0
+        trace.spans.append(record)
+
+
+def annotate(**attrs):
+    record = _current_span.get()
+    if record is not None:
+        record.update((key, value) for key, value in attrs.items() if value is not None)
+
+
+def annotate_ollama_stats(data):
+    # Counts and durations (ns) from Ollama's final /api/generate message
+    annotate(prompt_eval_count=data.get("prompt_eval_count"), eval_count=data.get("eval_count"),
+             eval_duration=data["eval_duration"] / 1e9 if data.get("eval_duration") else None)
+
+
+# --- Export ---
+def stage_durations(traces):
+    durations = {}
+    for trace in traces:
+        for s in trace.spans:
+            durations.setdefault(s["stage"], []).append(s["duration"])
+    return durations
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[max(0, int(round(len(values) * q)) - 1)]
+
+
+class MetricsSummary:
+    # Running totals of finished traces for prometheus_text, so a long-lived
+    # process needn't keep every trace. Stage quantiles and the median speed
+    # are over the latest window receipts, sums and counts over all of them.
+    def __init__(self, window=METRICS_WINDOW):
+        self.stages = {}  # stage -> [sum, count, recent durations]
+        self.llm_totals = dict.fromkeys(("prompt_eval_count", "eval_count", "eval_duration"), 0)
+        self.cache_hits = 0
+        self.tokens_per_sec = collections.deque(maxlen=window)
+        self.window = window
+
+    def add(self, trace):
+        for s in trace.spans:
+            stage = self.stages.setdefault(s["stage"], [0.0, 0, collections.deque(maxlen=self.window)])
+            stage[0] += s["duration"]
+            stage[1] += 1
+            stage[2].append(s["duration"])
+            # A packed request's span is in every receipt's trace, its tokens count once
+            if s["stage"] == "llm" and not s.get("shared"):
+                for key in self.llm_totals:
+                    self.llm_totals[key] += s.get(key) or 0
+                self.cache_hits += bool(s.get("cached"))
+                if s.get("tokens_per_sec"):
+                    self.tokens_per_sec.append(s["tokens_per_sec"])
+
+
+def prometheus_text(traces, prefix="slipscanner"):
+    # Prometheus text exposition format, e.g. for node_exporter's textfile collector.
+    # traces: a list of Traces or a MetricsSummary of them
+    summary = traces
+    if not isinstance(summary, MetricsSummary):
+        summary = MetricsSummary()
+        for trace in traces:
+            summary.add(trace)
+
+    lines = [f"# HELP {prefix}_stage_duration_seconds Time spent in each pipeline stage per receipt.",
+             f"# TYPE {prefix}_stage_duration_seconds summary"]
+    for stage, (total, count, recent) in sorted(summary.stages.items()):
+        for q in (0.5, 0.95):
+            lines.append(f'{prefix}_stage_duration_seconds{{stage="{stage}",quantile="{q}"}} '
+                         f"{percentile(recent, q):.6f}")
+        lines.append(f'{prefix}_stage_duration_seconds_sum{{stage="{stage}"}} {total:.6f}')
+        lines.append(f'{prefix}_stage_duration_seconds_count{{stage="{stage}"}} {count}')
+
+    counters = (
+        ("llm_prompt_tokens_total", "Prompt tokens evaluated by the LLM.", "prompt_eval_count"),
+        ("llm_eval_tokens_total", "Tokens generated by the LLM.", "eval_count"),
+        ("llm_eval_seconds_total", "Time the LLM spent generating tokens.", "eval_duration"),
+    )
+    for name, help_text, key in counters:
+        lines.append(f"# HELP {prefix}_{name} {help_text}")
+        lines.append(f"# TYPE {prefix}_{name} counter")
+        lines.append(f"{prefix}_{name} {summary.llm_totals[key]}")
+    lines.append(f"# HELP {prefix}_llm_cache_hits_total LLM calls answered from the response cache.")
+    lines.append(f"# TYPE {prefix}_llm_cache_hits_total counter")
+    lines.append(f"{prefix}_llm_cache_hits_total {summary.cache_hits}")
+
+    if summary.tokens_per_sec:
+        lines.append(f"# HELP {prefix}_llm_tokens_per_second Median LLM generation speed.")
+        lines.append(f"# TYPE {prefix}_llm_tokens_per_second gauge")
+        lines.append(f"{prefix}_llm_tokens_per_second {statistics.median(summary.tokens_per_sec):.3f}")
+    return "\n".join(lines) + "\n"
+
+
+class TraceWriter:
+    # Streams one JSON line per finished receipt, or with a .prom path keeps
+    # running totals and rewrites the Prometheus text after every receipt, so a
+    # scraper sees a long-running watch daemon's numbers as they change.
+    # Safe to share between threads.
+    def __init__(self, path):
+        self.path = path
+        self.prometheus = path.endswith(".prom")
+        self.summary = MetricsSummary() if self.prometheus else None
+        self._lock = threading.Lock()
+        self._file = None if self.prometheus else open(path, "w", encoding="utf-8")
+
+    def write(self, trace):
+        with self._lock:
+            if self._file is not None:
+                self._file.write(json.dumps(trace.as_dict()) + "\n")
+                self._file.flush()
+            elif self.prometheus:
+                self.summary.add(trace)
+                self._write_prometheus()
+
+    def _write_prometheus(self):
+        # Replaced in one step, a scraper never reads half a file
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(prometheus_text(self.summary))
+        os.replace(tmp_path, self.path)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            elif self.prometheus:
+                self._write_prometheus()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
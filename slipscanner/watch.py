@@ -0,0 +1,236 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import signal
+import struct
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from slipscanner.backends import make_backend
+from slipscanner.batch import IMAGE_EXTENSIONS, find_images, log_error, output_path_for, traced_ocr
+from slipscanner.items import ItemWriter
+from slipscanner.jobs import JobQueue
+from slipscanner.layout import extract_layout_text
+from slipscanner.ocr import configure_tesseract, extract_text_from_image
+from slipscanner.receipt import parse_receipt_text
+from slipscanner.tracing import Trace
+
+QUEUE_NAME = "jobs.sqlite3"  # kept in the output directory
+
+# inotify(7) event bits
+IN_CLOSE_WRITE = 0x08
+IN_MOVED_TO = 0x80
+IN_Q_OVERFLOW = 0x4000
+INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+
+def is_receipt_image(path):
+    name = os.path.basename(path)
+    return not name.startswith(".") and name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+# --- Watching ---
+def inotify_paths(folder, stop, timeout=1.0, ready=None):
+    # Yields files as they are finished in folder: closed after writing or
+    # moved in. Linux only, raises OSError where inotify isn't available.
+    # If the kernel's event queue overflows, every image in folder is yielded
+    # again, enqueue skips the ones it already has.
+    # ready() is called once the watch is in place.
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    if not hasattr(libc, "inotify_init1"):
+        raise OSError("inotify is not available")
+    fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    if fd < 0:
+        raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+    try:
+        if libc.inotify_add_watch(fd, os.fsencode(folder), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            raise OSError(ctypes.get_errno(), f"can't watch {folder}")
+        if ready is not None:
+            ready()
+        while not stop.is_set():
+            if not select.select([fd], [], [], timeout)[0]:
+                continue
+            data = os.read(fd, 64 * 1024)
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                name = data[offset + INOTIFY_EVENT.size:offset + INOTIFY_EVENT.size + length].rstrip(b"\0")
+                offset += INOTIFY_EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    log_error(f"[Watch] inotify events dropped, rescanning {folder}")
+                    yield from find_images(folder)
+                elif name:
+                    yield os.path.join(folder, os.fsdecode(name))
+    finally:
+        os.close(fd)
+
+
+def polled_paths(folder, stop, interval=2.0, ready=None):
+    # Yields files that are new or changed in folder, once their size and
+    # modification time have held still for one interval (the scanner is done
+    # writing). Works on any OS and on network shares inotify can't see.
+    if ready is not None:
+        ready()  # every file is seen from the first listing on
+    previous = {}
+    reported = {}
+    while True:
+        current = {}
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        st = entry.stat()
+                        current[entry.path] = (st.st_size, st.st_mtime_ns)
+                except FileNotFoundError:
+                    pass
+        for path, signature in current.items():
+            if previous.get(path) == signature and reported.get(path) != signature:
+                reported[path] = signature
+                yield path
+        previous = current
+        if stop.wait(interval):
+            return
+
+
+def watch_paths(folder, stop, poll=False, interval=2.0, ready=None):
+    if not poll:
+        try:
+            yield from inotify_paths(folder, stop, ready=ready)
+            return
+        except OSError as e:
+            log_error(f"[Watch] inotify unavailable ({e}), polling {folder} every {interval:g}s")
+    yield from polled_paths(folder, stop, interval, ready=ready)
+
+
+def init_ocr_worker(tesseract_cmd):
+    # Ctrl-C stops the daemon, which lets the receipts being OCR'd finish
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    configure_tesseract(tesseract_cmd)
+
+
+def write_output(path, items):
+    # Written under a temporary name and renamed, so a receipt killed halfway
+    # leaves no output that looks finished
+    root, ext = os.path.splitext(path)
+    tmp_path = f"{root}.tmp{ext}"
+    with ItemWriter(tmp_path) as writer:
+        writer.write_all(items)
+    os.replace(tmp_path, path)
+
+
+# --- Daemon ---
+def run_watch(folder, output_dir, stop, queue=None, workers=None, llm_concurrency=2, backend=None,
+              tesseract_cmd=None, ocr_cache=None, llm_cache=None, output_format="csv", preprocess=None, trim=True,
+              layout=False, tiling=None, products=None, categories=None, poll=False, poll_interval=2.0,
+              trace_writer=None):
+    # Processes every receipt image in folder and every one that arrives later,
+    # until stop (a threading.Event) is set. Jobs go through queue (a
+    # jobs.JobQueue, by default jobs.sqlite3 in output_dir), so a restart
+    # resumes without redoing finished receipts. OCR runs in a pool of workers
+    # processes and at most llm_concurrency receipts wait on the LLM at once.
+    # Returns the queue's job counts.
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    queue = queue or JobQueue(os.path.join(output_dir, QUEUE_NAME))
+    owns_backend = backend is None
+    if owns_backend:
+        backend = make_backend("ollama", pool_size=llm_concurrency)
+
+    recovered = queue.recover()
+    if recovered:
+        log_error(f"[Watch] {recovered} interrupted receipt(s) queued again")
+
+    wake = threading.Event()
+    watching = threading.Event()
+    naming = threading.Lock()
+    reserved = {}  # output path -> image being written to it, until its job is complete
+    llm_slots = threading.BoundedSemaphore(llm_concurrency)
+    extract = extract_layout_text if layout else extract_text_from_image
+
+    def watcher():
+        try:
+            for path in watch_paths(folder, stop, poll=poll, interval=poll_interval, ready=watching.set):
+                if is_receipt_image(path) and queue.enqueue(path):
+                    wake.set()
+        finally:
+            watching.set()
+
+    def output_for(image_path):
+        # scan.csv, unless another image (scan.jpg next to scan.png) already has
+        # it, then scan.png.csv
+        output_path = output_path_for(image_path, output_dir, output_format)
+        with naming:
+            owner = reserved.get(output_path) or queue.output_owner(output_path)
+            if owner not in (None, image_path):
+                output_path = output_path_for(image_path, output_dir, output_format, keep_extension=True)
+            reserved[output_path] = image_path
+        return output_path
+
+    def release(image_path):
+        # Once the job is complete the queue knows the output's owner
+        with naming:
+            for output_path in [path for path, owner in reserved.items() if owner == image_path]:
+                del reserved[output_path]
+
+    def process(ocr_pool, image_path):
+        trace = Trace(image_path)
+        ocr_text, ocr_spans = ocr_pool.submit(traced_ocr, extract, image_path, ocr_cache, preprocess,
+                                              tiling).result()
+        trace.spans.extend(ocr_spans)
+        if not ocr_text.strip():
+            raise ValueError("no text extracted")
+        with llm_slots, trace.activate():
+            items = parse_receipt_text(ocr_text, backend, llm_cache=llm_cache, trim=trim, products=products,
+                                       categories=categories)
+        output_path = output_for(image_path)
+        write_output(output_path, items)
+        if trace_writer is not None:
+            trace_writer.write(trace)
+        return output_path, items, trace
+
+    def worker(ocr_pool):
+        while not stop.is_set():
+            image_path = queue.claim()
+            if image_path is None:
+                # Nothing due: wait for the watcher, or for a retry to come due
+                wake.wait(1.0)
+                wake.clear()
+                continue
+            try:
+                output_path, items, trace = process(ocr_pool, image_path)
+            except Exception as e:
+                retry = queue.fail(image_path, e)
+                release(image_path)
+                log_error(f"[{'Retry' if retry else 'Failed'}] {image_path}: {e}")
+                continue
+            queue.complete(image_path, output_path)
+            release(image_path)
+            print(f"[Done] {image_path} -> {output_path} ({len(items)} items, {trace.total():.1f}s)", flush=True)
+
+    # The folder is watched before it's listed, so a file finished in between is
+    # seen by one or the other (or both, enqueue ignores the repeat)
+    threading.Thread(target=watcher, daemon=True).start()
+    watching.wait()
+    # Anything dropped in while the daemon wasn't running
+    for path in find_images(folder):
+        if is_receipt_image(path):
+            queue.enqueue(path)
+
+    # Enough threads to keep every OCR process busy while others wait on the LLM
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_ocr_worker,
+                             initargs=(tesseract_cmd,)) as ocr_pool:
+        threads = [threading.Thread(target=worker, args=(ocr_pool,)) for _ in range(workers + llm_concurrency)]
+        for thread in threads:
+            thread.start()
+        try:
+            while not stop.wait(1.0):
+                pass
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    if owns_backend:
+        backend.close()
+    return queue.counts()
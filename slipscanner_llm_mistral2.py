@@ -1,15 +1,26 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, scrolledtext
-import pytesseract
-from PIL import Image
-import pandas as pd
-import json
-import re
-import requests
-import threading
+import contextlib
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+from slipscanner import llm, ocr
+from slipscanner.backends import OllamaBackend
+from slipscanner.cli import gui_ocr, gui_options
+from slipscanner.items import COLUMNS, ItemWriter, LineItem, csv_line, items_from_parsed, write_items
+from slipscanner.parsing import item_section
+from slipscanner.schema import ITEMS_SCHEMA, max_item_tokens
+from slipscanner.session import ConversationSession
+from slipscanner.startup import preload_in_background
+from slipscanner.tracing import Trace, span
 
 # --- Tesseract config ---
-pytesseract.pytesseract.tesseract_cmd = "/opt/homebrew/bin/tesseract"
+ocr.configure_tesseract()
+
+options = gui_options()
+llm_cache, trim = options["llm_cache"], options["trim"]
+products, categories = options["products"], options["categories"]
 
 # --- Prompt Templates ---
 PROMPT_TEMPLATES = {
@@ -38,89 +49,174 @@ Output:
 """
 }
 
+# Sent as the next turn of the receipt's conversation, see refinement_job
+REFINEMENT_TEMPLATE = """
+Refinement Instructions:
+{refinement}
+
+Apply these instructions to the receipt above and output ONLY the complete corrected JSON array of line items.
+"""
+
 selected_template_name = "Default (Receipt Parser)"
 last_ocr_text = None
-generated_df = None
-last_prompt = None  # tracks the last full prompt sent to LLM
+last_image = None  # image the refine loop works on
+generated_items = {}  # image path -> LineItems for every receipt generated since the queue was last idle
+last_prompt = None  # tracks the last full prompt sent to LLM, refinements included
 
 
-def select_receipt_image():
-    global last_ocr_text, last_prompt
-    file_path = filedialog.askopenfilename(filetypes=[("Image files", "*.jpg *.jpeg *.png")])
-    if not file_path:
-        chat_log.insert(tk.END, "[System] No image selected.\n", "system")
-        return False
+# --- Background work ---
+# Tk may only be used from the main thread. OCR and LLM calls run on the worker
+# pools and hand every UI update to ui(), which queues it for drain_ui_queue()
+# to run on the Tk thread.
+UI_POLL_MS = 30
+UI_BATCH = 200  # updates applied per poll, so a fast stream can't starve input events
 
-    chat_log.insert(tk.END, "[System] Running OCR...\n", "system")
-    last_ocr_text = extract_text_from_image(file_path)
-    if not last_ocr_text.strip():
-        messagebox.showerror("OCR Error", "No text was extracted from the selected image.")
-        last_ocr_text = None
-        return False
+ui_queue = queue.Queue()
+ocr_pool = ThreadPoolExecutor(max_workers=2)
+llm_pool = ThreadPoolExecutor(max_workers=1)  # one generation at a time, streams share the chat log marks
+pending_jobs = set()  # only touched on the Tk thread
+cancel_epoch = 0  # bumped by Cancel, jobs submitted before that stop at their next check
+
+
+def ui(func, *args):
+    ui_queue.put((func, args))
 
-    # Reset last prompt since new OCR text
-    last_prompt = PROMPT_TEMPLATES[selected_template_name].replace("{text}", last_ocr_text)
-
-    # Show OCR Text window
-    ocr_window = tk.Toplevel(app)
-    ocr_window.title("OCR Result")
-    ocr_window.geometry("600x400")
-    ocr_text_widget = tk.Text(ocr_window, wrap=tk.WORD)
-    ocr_text_widget.pack(expand=True, fill=tk.BOTH)
-    ocr_text_widget.insert(tk.END, last_ocr_text)
-    ocr_text_widget.config(state=tk.DISABLED)
-    tk.Button(ocr_window, text="Close", command=ocr_window.destroy).pack(pady=5)
-
-    # Show Prompt window
-    prompt_window = tk.Toplevel(app)
-    prompt_window.title("Prompt Sent to LLM")
-    prompt_window.geometry("600x400")
-    prompt_text_widget = tk.Text(prompt_window, wrap=tk.WORD)
-    prompt_text_widget.pack(expand=True, fill=tk.BOTH)
-    prompt_text_widget.insert(tk.END, last_prompt)
-    prompt_text_widget.config(state=tk.DISABLED)
-    tk.Button(prompt_window, text="Close", command=prompt_window.destroy).pack(pady=5)
-
-    # Enable buttons now
-    generate_button.config(state=tk.NORMAL)
-    refine_button.config(state=tk.NORMAL)
-    export_button.config(state=tk.DISABLED)  # no CSV generated yet
 
+def drain_ui_queue():
+    for _ in range(UI_BATCH):
+        try:
+            func, args = ui_queue.get_nowait()
+        except queue.Empty:
+            break
+        try:
+            func(*args)
+        except Exception as e:
+            chat_log.insert(tk.END, f"[Error]: {e}\n", "error")
+    app.after(UI_POLL_MS, drain_ui_queue)
+
+
+def submit(pool, job, *args):
+    # job(cancelled, *args) runs on the pool, cancelled() turns true once Cancel is pressed
+    epoch = cancel_epoch
+
+    def cancelled():
+        return epoch != cancel_epoch
+
+    def run():
+        if cancelled():
+            return
+        try:
+            job(cancelled, *args)
+        except Exception as e:
+            ui(chat_log.insert, tk.END, f"[Error]: {e}\n", "error")
+
+    future = pool.submit(run)
+    pending_jobs.add(future)
+    future.add_done_callback(lambda f: ui(job_done, f))
+    update_buttons()
+    return future
+
+
+def job_done(future):
+    pending_jobs.discard(future)
+    update_buttons()
+
+
+def cancel_work():
+    # Drops queued images and stops a streaming generation at the next chunk.
+    # A running tesseract or non-streamed LLM call finishes, but its result is discarded.
+    global cancel_epoch
+    if not pending_jobs:
+        return
+    cancel_epoch += 1
+    for future in list(pending_jobs):
+        future.cancel()
+    chat_log.insert(tk.END, "[System] Cancelled.\n", "system")
+    chat_log.see(tk.END)
+
+
+def update_buttons():
+    busy = bool(pending_jobs)
+    generate_button.config(state=tk.DISABLED if busy else tk.NORMAL)
+    refine_button.config(state=tk.NORMAL if last_ocr_text and not busy else tk.DISABLED)
+    export_button.config(state=tk.NORMAL if generated_items else tk.DISABLED)
+    cancel_button.config(state=tk.NORMAL if busy else tk.DISABLED)
+
+
+# --- Receipt Queue ---
+def select_receipt_image(generate=False):
+    # Several images can be picked at once (or added while others are still
+    # running), each is OCR'd in the background and, in a batch, parsed in turn
+    file_paths = filedialog.askopenfilenames(filetypes=[("Image files", "*.jpg *.jpeg *.png *.tif *.tiff *.pdf")])
+    if not file_paths:
+        chat_log.insert(tk.END, "[System] No image selected.\n", "system")
+        return False
+
+    if not pending_jobs:
+        generated_items.clear()
+    batch = len(file_paths) > 1
+    if batch:
+        chat_log.insert(tk.END, f"[System] Queued {len(file_paths)} images.\n", "system")
+    for file_path in file_paths:
+        chat_log.insert(tk.END, f"[System] Running OCR on {os.path.basename(file_path)}...\n", "system")
+        submit(ocr_pool, ocr_job, file_path, batch, generate or batch)
+    chat_log.see(tk.END)
     return True
 
 
-def generate_csv_workflow():
-    global last_ocr_text, last_prompt, generated_df
-    if not last_ocr_text:
-        if not select_receipt_image():
+def ocr_job(cancelled, file_path, batch, generate):
+    trace = Trace(file_path)
+    with trace.activate():
+        ocr_text = extract_text_from_image(file_path)
+        if cancelled():
+            return
+        if not ocr_text.strip():
+            ui(messagebox.showerror, "OCR Error", f"No text was extracted from {os.path.basename(file_path)}.")
             return
 
-    prompt = last_prompt
-    set_ui_state(True)
+        with span("prompt"):
+            prompt_text = item_section(ocr_text) if trim else ocr_text
+            prompt = PROMPT_TEMPLATES[selected_template_name].replace("{text}", prompt_text)
+    ui(ocr_finished, file_path, ocr_text, prompt_text, prompt, trace, batch, generate)
 
-    def threaded_call():
-        try:
-            response = call_ollama(prompt)
-            chat_log.insert(tk.END, f"[LLM]:\n{response}\n", "llm")
-            parsed = safe_json_parse(response)
-            if not parsed:
-                return
 
-            generated_df = pd.DataFrame([[item.get("description", ""), "", "", item.get("price", 0)] for item in parsed],
-                                        columns=["description", "category", "units", "price"])
+def ocr_finished(file_path, ocr_text, prompt_text, prompt, trace, batch, generate):
+    global last_image, last_ocr_text, last_prompt
+    last_image, last_ocr_text, last_prompt = file_path, ocr_text, prompt
+
+    if trim:
+        chat_log.insert(tk.END, f"[System] Sending only the item section: ~{llm.estimate_tokens(prompt_text)} "
+                                f"of ~{llm.estimate_tokens(ocr_text)} OCR tokens.\n", "system")
+    log_trace(trace)
+
+    if not batch:
+        show_text_window("OCR Result", ocr_text)
+        show_text_window("Prompt Sent to LLM", prompt)
+    if generate:
+        submit(llm_pool, generation_job, file_path, ocr_text, prompt, f"[LLM - {os.path.basename(file_path)}]")
+    update_buttons()
 
-            csv_preview = generated_df.to_csv(index=False)
-            chat_log.insert(tk.END, f"[CSV Preview]:\n{csv_preview}\n", "llm")
-            export_button.config(state=tk.NORMAL)
 
-        finally:
-            set_ui_state(False)
+def show_text_window(title, text):
+    window = tk.Toplevel(app)
+    window.title(title)
+    window.geometry("600x400")
+    text_widget = tk.Text(window, wrap=tk.WORD)
+    text_widget.pack(expand=True, fill=tk.BOTH)
+    text_widget.insert(tk.END, text)
+    text_widget.config(state=tk.DISABLED)
+    tk.Button(window, text="Close", command=window.destroy).pack(pady=5)
+
+
+def generate_csv_workflow():
+    if not last_ocr_text:
+        select_receipt_image(generate=True)
+        return
 
-    threading.Thread(target=threaded_call, daemon=True).start()
+    submit(llm_pool, generation_job, last_image, last_ocr_text, last_prompt, "[LLM]")
 
 
 def refine_prompt_and_regenerate():
-    global last_ocr_text, last_prompt, generated_df
     if not last_ocr_text or not last_prompt:
         messagebox.showinfo("Info", "Please select an image and generate results first before refining.")
         return
@@ -131,107 +227,158 @@ def refine_prompt_and_regenerate():
         return
 
     chat_log.insert(tk.END, f"\n[You - refinement]:\n{user_refinement}\n", "user")
-    chat_log.insert(tk.END, "[System] Generating a merged prompt...\n", "system")
-    set_ui_state(True)
+    refinement = REFINEMENT_TEMPLATE.replace("{refinement}", user_refinement)
+    # Later generations of this receipt from scratch keep the refinement
+    set_last_prompt(last_prompt + "\n" + refinement)
+    submit(llm_pool, refinement_job, last_image, last_ocr_text, last_prompt, refinement)
+
+
+def refinement_job(cancelled, file_path, ocr_text, full_prompt, refinement):
+    # Continues the receipt's session, so only the refinement is evaluated.
+    # Without one (nothing generated yet) the full refined prompt starts it.
+    session = sessions.get(file_path)
+    if session is None or not session.turns:
+        generation_job(cancelled, file_path, ocr_text, full_prompt, "[LLM - refined]")
+        return
+    ui(chat_log.insert, tk.END, "[System] Refining in this receipt's session, earlier turns aren't re-evaluated.\n",
+       "system")
+    generation_job(cancelled, file_path, ocr_text, refinement, "[LLM - refined]", session=session)
 
-    def run_refinement():
-        global last_prompt, generated_df
 
-        try:
-            # Ask the LLM to merge the prompts intelligently
-            merge_request = f"""You are an AI prompt engineer. Merge the following prompts into one effective prompt that improves the receipt parsing task. Keep formatting intact.
-
-Previous Prompt:
-{last_prompt}
-
-Refinement Instructions:
-{user_refinement}
-
-Respond ONLY with the merged prompt text."""
-            merged_prompt = call_ollama(merge_request)
-
-            # Show merged prompt in new window
-            merged_window = tk.Toplevel(app)
-            merged_window.title("Merged Prompt")
-            merged_window.geometry("600x400")
-            merged_widget = tk.Text(merged_window, wrap=tk.WORD)
-            merged_widget.pack(expand=True, fill=tk.BOTH)
-            merged_widget.insert(tk.END, merged_prompt)
-            merged_widget.config(state=tk.DISABLED)
-            tk.Button(merged_window, text="Close", command=merged_window.destroy).pack(pady=5)
-
-            # Save it for future refinements
-            last_prompt = merged_prompt
-
-            # Now use it to regenerate results
-            response = call_ollama(merged_prompt)
-            chat_log.insert(tk.END, f"[LLM - refined]:\n{response}\n", "llm")
-            parsed = safe_json_parse(response)
-            if parsed:
-                generated_df = pd.DataFrame([[item.get("description", ""), "", "", item.get("price", 0)] for item in parsed],
-                                            columns=["description", "category", "units", "price"])
-                csv_preview = generated_df.to_csv(index=False)
-                chat_log.insert(tk.END, f"[CSV Preview]:\n{csv_preview}\n", "llm")
-                export_button.config(state=tk.NORMAL)
-
-        finally:
-            set_ui_state(False)
-            chat_log.see(tk.END)
-
-    threading.Thread(target=run_refinement, daemon=True).start()
+def set_last_prompt(prompt):
+    global last_prompt
+    last_prompt = prompt
 
 
 # --- OCR Extraction ---
-def extract_text_from_image(image_path):
-    try:
-        img = Image.open(image_path)
-        return pytesseract.image_to_string(img)
-    except Exception as e:
-        messagebox.showerror("OCR Error", f"Failed to extract text from image:\n{e}")
-        return ""
+extract_text_from_image = gui_ocr(options, lambda *error: ui(messagebox.showerror, *error))
 
 
 # --- JSON Parse ---
 def safe_json_parse(response):
     try:
-        match = re.search(r'(\[\s*{.*?}\s*\])', response, re.DOTALL)
-        if not match:
-            raise ValueError("No JSON array found.")
-        json_part = match.group(1)
-        cleaned = re.sub(r',\s*([\]}])', r'\1', json_part.strip())
-        cleaned = re.sub(r'"\s*,\s*"', '", "', cleaned)
-        return json.loads(cleaned)
+        return llm.safe_json_parse(response)
     except Exception as e:
-        messagebox.showerror("Parse Error", f"Could not decode LLM output:\n{e}\n\nRaw output:\n{response}")
+        ui(messagebox.showerror, "Parse Error", f"Could not decode LLM output:\n{e}\n\nRaw output:\n{response}")
         return []
 
 
 # --- LLM Interaction ---
+# Local Ollama server (OLLAMA_HOST), any other backends.LLMBackend works here too
+backend = OllamaBackend("mistral")
+
 SYSTEM_PROMPT = """You are an assistant for parsing receipts. If the user says things like 'generate the CSV', respond with __COMMAND__:generate_csv. Otherwise, answer naturally."""
 
 
-def call_ollama(prompt, model="mistral"):
+# image path -> ConversationSession of the receipt's generate/refine turns, only
+# used on the LLM worker. The oldest are dropped past MAX_SESSIONS.
+MAX_SESSIONS = 20
+sessions = {}
+
+
+def new_session(file_path):
+    sessions.pop(file_path, None)
+    while len(sessions) >= MAX_SESSIONS:
+        del sessions[next(iter(sessions))]
+    sessions[file_path] = ConversationSession(backend, system=SYSTEM_PROMPT, cache=llm_cache)
+    return sessions[file_path]
+
+
+def call_ollama(prompt):
+    import requests
+
     try:
         prompt = SYSTEM_PROMPT + "\n\nUser: " + prompt
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json={"model": model, "prompt": prompt, "stream": False},
-            timeout=60
-        )
-        response.raise_for_status()
-        return response.json().get("response", "").strip()
+        return llm.complete(prompt, backend, cache=llm_cache)
     except requests.exceptions.ConnectionError:
-        messagebox.showerror("Ollama Error", "Ollama is not running.\nStart it by running: `ollama serve`.")
+        ui(messagebox.showerror, "Ollama Error", "Ollama is not running.\nStart it by running: `ollama serve`.")
         return ""
     except Exception as e:
-        messagebox.showerror("LLM Error", f"Failed to call Ollama:\n{e}")
+        ui(messagebox.showerror, "LLM Error", f"Failed to call Ollama:\n{e}")
         return ""
 
 
-def set_ui_state(disabled=True):
-    state = tk.DISABLED if disabled else tk.NORMAL
-    for child in button_frame.winfo_children():
-        child.config(state=state)
+def stream_ollama(session, prompt, options=None, format=None):
+    import requests
+
+    try:
+        yield from session.stream(prompt, options=options, format=format)
+    except requests.exceptions.ConnectionError:
+        ui(messagebox.showerror, "Ollama Error", "Ollama is not running.\nStart it by running: `ollama serve`.")
+    except Exception as e:
+        ui(messagebox.showerror, "LLM Error", f"Failed to call Ollama:\n{e}")
+
+
+def log_trace(trace):
+    if trace.spans:
+        chat_log.insert(tk.END, f"[System] {trace.summary()}\n", "system")
+        chat_log.see(tk.END)
+
+
+def generation_job(cancelled, file_path, ocr_text, prompt, label, session=None):
+    # Without a session the prompt starts a new one for the receipt
+    session = session or new_session(file_path)
+    trace = Trace(file_path)
+    with trace.activate():
+        line_items = stream_csv_rows(cancelled, session, ocr_text, prompt, label)
+    ui(generation_finished, file_path, line_items, trace)
+
+
+def start_stream_block(label):
+    chat_log.insert(tk.END, f"{label}:\n", "llm")
+    chat_log.mark_set("llm_stream", chat_log.index("end-1c"))
+    chat_log.insert(tk.END, "\n[CSV Preview]:\n" + csv_line(COLUMNS), "llm")
+    chat_log.mark_set("csv_stream", chat_log.index("end-1c"))
+
+
+def stream_csv_rows(cancelled, session, ocr_text, prompt, label):
+    # Streams the raw response into the [LLM] block and appends each CSV row
+    # to the preview block as soon as the item's closing brace arrives.
+    ui(start_stream_block, label)
+
+    parser = llm.JSONItemStream()
+    chunks = []
+    line_items = []
+    # ITEMS_SCHEMA keeps the answer to a valid item array, capped at what the receipt can hold
+    options = {"num_predict": max_item_tokens(ocr_text)} if ocr_text else None
+    with span("llm"), contextlib.closing(stream_ollama(session, prompt, options=options,
+                                                       format=ITEMS_SCHEMA)) as stream:
+        for chunk in stream:
+            if cancelled():
+                # Closing the stream drops the connection, which stops Ollama generating
+                ui(chat_log.insert, tk.END, "\n[System] Generation cancelled.\n", "system")
+                return []
+            chunks.append(chunk)
+            ui(chat_log.insert, "llm_stream", chunk, "llm")
+            for item in parser.feed(chunk):
+                line_item = LineItem.from_parsed(item)
+                if products is not None:
+                    products.normalize_items([line_item])
+                if categories is not None:
+                    categories.categorize_items([line_item])
+                line_items.append(line_item)
+                ui(chat_log.insert, "csv_stream", csv_line(line_item.as_row()), "llm")
+            ui(chat_log.see, tk.END)
+
+    # Fall back to the forgiving whole-response parser if no item came through intact
+    if not line_items and chunks:
+        with span("parse"):
+            line_items = items_from_parsed(safe_json_parse("".join(chunks)))
+            if products is not None:
+                products.normalize_items(line_items)
+            if categories is not None:
+                categories.categorize_items(line_items)
+        for line_item in line_items:
+            ui(chat_log.insert, "csv_stream", csv_line(line_item.as_row()), "llm")
+    ui(chat_log.insert, tk.END, "\n")
+    return line_items
+
+
+def generation_finished(file_path, line_items, trace):
+    log_trace(trace)
+    if line_items:
+        generated_items[file_path] = line_items
+    update_buttons()
 
 
 def send_prompt():
@@ -242,24 +389,21 @@ def send_prompt():
     chat_log.insert(tk.END, f"\n[You]:\n{prompt}\n\n", "user")
     chat_log.insert(tk.END, "[System] Sending to LLM...\n", "system")
     chat_log.see(tk.END)
-    set_ui_state(True)
+    submit(llm_pool, chat_job, prompt)
 
-    def run_llm():
-        try:
-            response = call_ollama(prompt)
-            chat_log.insert(tk.END, f"[LLM]:\n{response}\n", "llm")
-        except Exception as e:
-            chat_log.insert(tk.END, f"[Error]: {e}\n", "error")
-        finally:
-            set_ui_state(False)
-            chat_log.see(tk.END)
 
-    threading.Thread(target=run_llm, daemon=True).start()
+def chat_job(cancelled, prompt):
+    trace = Trace()
+    with trace.activate(), span("llm"):
+        response = call_ollama(prompt)
+    if cancelled():
+        return
+    ui(chat_log.insert, tk.END, f"[LLM]:\n{response}\n", "llm")
+    ui(log_trace, trace)
 
 
 def export_generated_csv():
-    global generated_df
-    if generated_df is None:
+    if not generated_items:
         messagebox.showwarning("Export Error", "No CSV data available to export.")
         return
 
@@ -270,13 +414,26 @@ def export_generated_csv():
         return
 
     try:
-        generated_df.to_csv(save_path, index=False)
+        if len(generated_items) == 1:
+            write_items(save_path, next(iter(generated_items.values())))
+        else:
+            # Several queued receipts go in one file with a source column
+            with ItemWriter(save_path, extra_columns=["source"]) as writer:
+                for file_path, line_items in generated_items.items():
+                    writer.write_all(line_items, source=file_path)
         messagebox.showinfo("Success", f"CSV saved:\n{save_path}")
         chat_log.insert(tk.END, f"[System] CSV exported to:\n{save_path}\n", "system")
     except Exception as e:
         messagebox.showerror("Export Error", f"Failed to save CSV:\n{e}")
 
 
+def on_close():
+    cancel_work()
+    ocr_pool.shutdown(wait=False, cancel_futures=True)
+    llm_pool.shutdown(wait=False, cancel_futures=True)
+    app.destroy()
+
+
 # --- GUI Layout ---
 app = tk.Tk()
 app.title("LLM Receipt Chat Interface")
@@ -303,6 +460,9 @@ prompt_entry.bind("<Command-Return>", handle_cmd_enter)
 button_frame = tk.Frame(app)
 button_frame.pack(pady=5)
 
+select_button = tk.Button(button_frame, text="Add Images", command=select_receipt_image)
+select_button.pack(side=tk.LEFT, padx=5)  # stays enabled so images can be queued while others run
+
 generate_button = tk.Button(button_frame, text="Generate CSV", command=generate_csv_workflow)
 generate_button.pack(side=tk.LEFT, padx=5)
 generate_button.config(state=tk.NORMAL)  # Allow generate button, but it checks for OCR internally
@@ -315,4 +475,11 @@ refine_button = tk.Button(button_frame, text="Refine Prompt", command=refine_pro
 refine_button.pack(side=tk.LEFT, padx=5)
 refine_button.config(state=tk.DISABLED)  # Disabled until OCR text ready
 
+cancel_button = tk.Button(button_frame, text="Cancel", command=cancel_work)
+cancel_button.pack(side=tk.LEFT, padx=5)
+cancel_button.config(state=tk.DISABLED)  # Enabled while OCR or generation is running
+
+app.protocol("WM_DELETE_WINDOW", on_close)
+app.after(UI_POLL_MS, drain_ui_queue)
+app.after(100, lambda: preload_in_background(then=categories.warm_up if categories else None))
 app.mainloop()
@@ -1,55 +1,39 @@
 
 import tkinter as tk
 from tkinter import filedialog, messagebox
-import pytesseract
-from PIL import Image
-import pandas as pd
-import json
 import os
-import re
-from llama_cpp import Llama
+import sys
+
+from slipscanner import ocr
+from slipscanner.backends import LlamaCppBackend
+from slipscanner.chunking import DEFAULT_CHUNKING
+from slipscanner.cli import gui_ocr, gui_options
+from slipscanner.items import write_items
+from slipscanner.receipt import parse_receipt_text
+from slipscanner.startup import preload_in_background
+from slipscanner.tracing import Trace
 
 # --- Load LLM ---
-llm = Llama(model_path="models/phi-2.Q4_K_M.gguf")  # Adjust path to your model file
+# Uses a running `python3 -m slipscanner llama-server` if there is one, otherwise
+# the model is loaded in the background once the window is up. Output is held to
+# a JSON item array by a GBNF grammar (schema.ITEMS_GBNF), so no stop sequence is
+# needed and max_tokens is sized to the receipt.
+MODEL_PATH = "models/phi-2.Q4_K_M.gguf"  # Adjust path to your model file
+backend = LlamaCppBackend(MODEL_PATH)
 
 # Optional: Set Tesseract path if needed
-# pytesseract.pytesseract.tesseract_cmd = "/opt/homebrew/bin/tesseract"  # macOS/Homebrew example
-
+# ocr.configure_tesseract("/opt/homebrew/bin/tesseract")  # macOS/Homebrew example
 
-def safe_json_parse(response):
-    try:
-        # Fix common LLM mistakes
-        cleaned = response.strip()
+options = gui_options()
+llm_cache, trim = options["llm_cache"], options["trim"]
+products, categories = options["products"], options["categories"]
 
-        # Remove trailing commas inside objects or arrays
-        cleaned = re.sub(r',\s*([\]}])', r'\1', cleaned)
+# Long slips are sent as overlapping windows of lines so they fit phi-2's context, pass --no-chunk for one prompt
+chunking = None if "--no-chunk" in sys.argv else DEFAULT_CHUNKING
 
-        # Remove stray quotation-comma combinations
-        cleaned = re.sub(r'"\s*,\s*"', '", "', cleaned)
-
-        return json.loads(cleaned)
-    except Exception as e:
-        messagebox.showerror("Parse Error", f"Could not decode LLM output:\n{e}\n\nRaw output:\n{response}")
-        return []
 
 # --- OCR + Cleaning ---
-def extract_text_from_image(image_path):
-    try:
-        img = Image.open(image_path)
-        text = pytesseract.image_to_string(img)
-        return text
-    except Exception as e:
-        messagebox.showerror("OCR Error", f"Failed to extract text from image:\n{e}")
-        return ""
-
-# --- LLM Parsing ---
-def call_llama(prompt):
-    try:
-        output = llm(prompt, max_tokens=512, stop=["\n\n"])
-        return output["choices"][0]["text"].strip()
-    except Exception as e:
-        messagebox.showerror("LLM Error", f"Failed to process with LLM:\n{e}")
-        return ""
+extract_text_from_image = gui_ocr(options, messagebox.showerror)
 
 # --- Prompt Template ---
 def generate_prompt(text):
@@ -83,27 +67,25 @@ def process_receipt(image_path):
     if not ocr_text:
         return []
 
-    # Limit to ~400 tokens (rough estimate)
-    # ocr_text = ' '.join(ocr_text.split()[:400])
-
-    prompt = generate_prompt(ocr_text)
-    llm_response = call_llama(prompt)
-
     try:
-        parsed = json.loads(llm_response)
-        items = [[item.get("description", ""), "", "", item.get("price", 0)] for item in parsed]
-        return items
+        return parse_receipt_text(ocr_text, backend, llm_cache=llm_cache, trim=trim, prompt=generate_prompt,
+                                  chunking=chunking, products=products, categories=categories)
+    except ValueError as e:
+        messagebox.showerror("Parse Error", f"Could not decode LLM output:\n{e}")
     except Exception as e:
-        messagebox.showerror("Parse Error", f"Could not decode LLM output:\n{e}\n\nRaw output:\n{llm_response}")
-        return []
+        messagebox.showerror("LLM Error", f"Failed to process with LLM:\n{e}")
+    return []
 
 # --- GUI Setup ---
 def select_image():
-    file_path = filedialog.askopenfilename(filetypes=[("Image files", "*.jpg *.jpeg *.png")])
+    file_path = filedialog.askopenfilename(filetypes=[("Image files", "*.jpg *.jpeg *.png *.tif *.tiff *.pdf")])
     if not file_path:
         return
 
-    items = process_receipt(file_path)
+    trace = Trace(file_path)
+    with trace.activate():
+        items = process_receipt(file_path)
+    status.config(text=trace.summary())
     if not items:
         return
 
@@ -113,14 +95,13 @@ def select_image():
     if not save_path:
         return
 
-    df = pd.DataFrame(items, columns=["description", "category", "units", "price"])
-    df.to_csv(save_path, index=False)
+    write_items(save_path, items)
     messagebox.showinfo("Success", f"CSV saved:\n{save_path}")
 
 # --- GUI Window ---
 app = tk.Tk()
 app.title("Receipt to CSV (with Local LLM)")
-app.geometry("320x160")
+app.geometry("320x190")
 
 label = tk.Label(app, text="Convert a receipt image to structured CSV using local LLM.", wraplength=280)
 label.pack(pady=20)
@@ -128,4 +109,8 @@ label.pack(pady=20)
 button = tk.Button(app, text="Select Receipt Image", command=select_image)
 button.pack()
 
+status = tk.Label(app, text="", fg="gray", wraplength=300)
+status.pack(pady=10)
+
+app.after(100, lambda: preload_in_background(then=backend.warm_up))
 app.mainloop()